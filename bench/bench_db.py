@@ -0,0 +1,96 @@
+# bench/bench_db.py — ops/sec на типичных чтениях: соединение на вызов vs пул (WAL)
+# Запуск из корня проекта: python -m bench.bench_db
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import db.database as database
+from db.pool import ConnectionPool
+
+USERS = 2000
+SECONDS = 1.5
+
+
+class LegacyPool:
+    """Старое поведение: новое соединение с rollback-журналом на каждый вызов."""
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            yield conn.cursor()
+            conn.commit()
+
+
+def _seed():
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        database.init_db()
+        for uid in range(1, USERS + 1):
+            database.add_user(uid, f"user{uid}")
+            if uid % 2:
+                database.activate_subscription(uid, "MONTH")
+                database.set_autotrade_paid(uid, 30)
+
+
+def _ops_per_sec(fn) -> float:
+    n = 0
+    uid = 1
+    started = time.perf_counter()
+    deadline = started + SECONDS
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            fn(uid)
+            uid = uid % USERS + 1
+        n += 100
+    return n / (time.perf_counter() - started)
+
+
+CASES = {
+    "get_subscription_expiry": database.get_subscription_expiry,
+    "autotrade_paid": database.autotrade_paid,
+    "autotrade_enabled": database.autotrade_enabled,
+    "get_user_settings": database.get_user_settings,
+    "user profile (1 query)": database._load_user_profile,
+}
+
+
+def run(label: str, pool) -> dict:
+    database._db_pool = pool
+    _seed()
+    print(f"\n== {label} ==")
+    res = {}
+    for name, fn in CASES.items():
+        res[name] = _ops_per_sec(fn)
+        print(f"{name:<26} {res[name]:>10.0f} ops/s")
+    return res
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = run("connect-per-call, rollback journal", LegacyPool(os.path.join(tmp, "legacy.db")))
+        pool = ConnectionPool(os.path.join(tmp, "pooled.db"))
+        pooled = run("pool + WAL + statement cache", pool)
+        pool.close_all()
+
+    print("\n== speedup ==")
+    for name in CASES:
+        print(f"{name:<26} x{pooled[name] / legacy[name]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench/bench_levels.py — проверка тика: обход всех сделок vs индекс уровней TP/SL
+# Запуск из корня проекта: python -m bench.bench_levels
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.level_index import LevelIndex
+
+TRADES = 10_000
+SYMBOLS = 200
+TICKS = 20_000
+
+
+def _make_trades():
+    rnd = random.Random(42)
+    trades = []
+    for i in range(TRADES):
+        sym = f"SYM{i % SYMBOLS}USDT"
+        entry = 100.0
+        pos = rnd.choice(("LONG", "SHORT"))
+        tp_pct, sl_pct = rnd.uniform(0.01, 0.06), rnd.uniform(0.005, 0.03)
+        if pos == "LONG":
+            tp, sl = entry * (1 + tp_pct), entry * (1 - sl_pct)
+        else:
+            tp, sl = entry * (1 - tp_pct), entry * (1 + sl_pct)
+        trades.append({"signal_id": f"{sym}:{i}", "symbol": sym, "position": pos, "tp": tp, "sl": sl})
+    return trades
+
+
+def _ticks():
+    rnd = random.Random(7)
+    # цена около entry: большинство тиков ничего не задевают, как в жизни
+    return [(f"SYM{rnd.randrange(SYMBOLS)}USDT", rnd.gauss(100.0, 0.3)) for _ in range(TICKS)]
+
+
+def _linear(trades, ticks):
+    by_symbol = {}
+    for t in trades:
+        by_symbol.setdefault(t["symbol"], []).append(t)
+    hits = 0
+    t0 = time.perf_counter()
+    for sym, price in ticks:
+        for t in by_symbol[sym]:
+            if t["position"] == "LONG":
+                hit = price >= t["tp"] or price <= t["sl"]
+            else:
+                hit = price <= t["tp"] or price >= t["sl"]
+            hits += hit
+    return time.perf_counter() - t0, hits
+
+
+def _indexed(trades, ticks):
+    levels = {}
+    for t in trades:
+        levels.setdefault(t["symbol"], LevelIndex()).add(t)
+    hits = 0
+    t0 = time.perf_counter()
+    for sym, price in ticks:
+        hits += len(levels[sym].crossed(price))
+    return time.perf_counter() - t0, hits
+
+
+def main():
+    trades, ticks = _make_trades(), _ticks()
+    print(f"{TRADES} сделок, {SYMBOLS} монет, {TICKS} тиков")
+    dt_lin, h_lin = _linear(trades, ticks)
+    dt_idx, h_idx = _indexed(trades, ticks)
+    assert h_lin == h_idx, (h_lin, h_idx)
+    print(f"  обход всех   : {TICKS / dt_lin:12.0f} тиков/с")
+    print(f"  индекс bisect: {TICKS / dt_idx:12.0f} тиков/с  (x{dt_lin / dt_idx:.1f}, срабатываний {h_idx})")
+
+
+if __name__ == "__main__":
+    main()
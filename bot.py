@@ -1,54 +1,58 @@
-from utils.logging_setup import setup_logging
+from utils.logging_setup import setup_logging, stop_logging, log_event
 setup_logging()
 import asyncio
 import datetime
 from aiogram import Bot, Dispatcher
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from utils.trade_tracker import add_open_trade, check_open_trades
+from utils.trade_tracker import add_open_trade, check_open_trades, check_open_trades_intrabar
 import pytz
 from db.database import init_db
+from db.async_database import shutdown as shutdown_db
+from db.log_sink import log_sink
 
 
 
 from config import (
     BOT_TOKEN,
     ADMIN_CHAT_ID,
-    CHANNEL_ID,
     MAX_SIGNALS_PER_RUN,
-    SIGNAL_INTERVAL_MINUTES
+    SIGNAL_INTERVAL_MINUTES,
+    TRADE_CHECK_MODE
 )
 
 from core.bybit_api import BybitAPI
 from core.filters import filter_by_volume, apply_all_filters
+from core import model_registry
 from core.signal_generator import generate_signal
 from core.risk_manager import evaluate_risk
 from utils.format_text import format_signal_text
 from utils.used_tracker import load_used_today, save_used_today, clear_used_today
 from handlers import setup_routers
 from core.news import news_cache
+from core.delivery import signal_delivery
 from apscheduler.triggers.interval import IntervalTrigger
-from utils.dataset_logger import log_signal_row, make_signal_id
+from utils.dataset_logger import log_signal_row, log_features, make_signal_id
 import logging
 
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
+logger = logging.getLogger("app.scan")
 
 async def auto_signal_job(bot: Bot):
-    print(f"\n🔄 [{datetime.datetime.now().strftime('%H:%M:%S')}] Запуск анализа рынка...")
+    started = datetime.datetime.now()
+    log_event(logger, "scan.start", "Запуск анализа рынка")
 
     api = BybitAPI()
     used_symbols = load_used_today()
+    # версия модели фиксируется на весь скан — переобучение посреди скана её не подменит
+    bundle = model_registry.current()
 
     try:
         all_pairs = api.get_usdt_pairs()
-        print(f"📊 Всего валютных пар: {len(all_pairs)}")
-
         filtered = filter_by_volume(all_pairs)
-        print(f"✅ После фильтра объёма: {len(filtered)}")
-
         valid = apply_all_filters(filtered, api.get_ohlcv)
-        print(f"🔍 Прошли все фильтры: {len(valid)}\n")
+        log_event(logger, "scan.universe", pairs=len(all_pairs), by_volume=len(filtered), valid=len(valid))
 
         sent = 0
         for pair in valid:
@@ -56,13 +60,12 @@ async def auto_signal_job(bot: Bot):
                 symbol = pair["symbol"]
 
                 if symbol in used_symbols:
-                    print(f"→ {symbol} — ⏩ Уже отправлялся сегодня — пропуск")
+                    log_event(logger, "scan.skip", symbol=symbol, reason="used_today")
                     continue
 
-                print(f"→ Анализ пары: {symbol}")
                 ohlcv = api.get_ohlcv(symbol, interval="60", limit=300)
                 if not ohlcv:
-                    print("  ⚠️ Нет свечей — пропуск")
+                    log_event(logger, "scan.skip", symbol=symbol, reason="no_candles")
                     continue
 
                 # новостной фактор
@@ -73,16 +76,19 @@ async def auto_signal_job(bot: Bot):
                     symbol,
                     ohlcv,
                     fetcher=api.get_ohlcv,
-                    news_score_provider=news_provider
+                    news_score_provider=news_provider,
+                    bundle=bundle
                 )
 
                 if signal.get("position") == "NONE":
-                    print(f"  ⏹️ Нет сигнала — пропуск ({signal.get('reason','')})")
+                    log_event(logger, "scan.skip", symbol=symbol, reason="no_signal",
+                              detail=signal.get("reason", ""))
                     continue
 
                 signal = evaluate_risk(signal)
                 if "❌" in signal.get("quality", ""):
-                    print(f"  ❌ Плохой сигнал (rr: {signal.get('rr_ratio')}) — пропуск")
+                    log_event(logger, "scan.skip", symbol=symbol, reason="bad_quality",
+                              rr=signal.get("rr_ratio"))
                     continue
 
                 # ID сигнала и лог в датасет
@@ -102,33 +108,34 @@ async def auto_signal_job(bot: Bot):
                     "timeframe": "15m",
                     "extras": signal.get("reasons", []),
                 })
+                if signal.get("features"):
+                    log_features(signal_id, signal["features"])
 
                 # лог в наш файл (не роняем при ошибке)
                 try:
                     from utils.logger import log_signal
                     log_signal(signal)
                 except Exception as e:
-                    print(f"⚠️ log_signal error: {e}")
+                    logger.warning("log_signal error", extra={"event": "scan.log_error", "symbol": symbol, "error": str(e)})
 
                 # формируем текст (с фоллбеком только при ошибке)
                 try:
                     text = format_signal_text(signal)
                 except Exception as e:
-                    print(f"⚠️ format_signal_text error: {e}")
+                    logger.warning("format_signal_text error", extra={"event": "scan.format_error", "symbol": symbol, "error": str(e)})
                     text = (
                         f"📈 {signal.get('symbol')} {signal.get('position')}\n"
                         f"entry: {signal.get('entry')}  tp: {signal.get('tp')}  sl: {signal.get('sl')}\n"
                         f"RR: {signal.get('rr_ratio')}  score: {signal.get('score')}"
                     )
 
-                print(f"  ✅ Сигнал найден (rr: {signal.get('rr_ratio')}) — отправка...")
+                log_event(logger, "scan.signal", symbol=symbol, signal_id=signal_id,
+                          position=signal["position"], rr=signal.get("rr_ratio"), score=signal.get("score"))
 
-                # отправка
-                await bot.send_message(chat_id=ADMIN_CHAT_ID, text=text, parse_mode="HTML")
-                try:
-                    await bot.send_message(chat_id=CHANNEL_ID, text=text, parse_mode="HTML")
-                except Exception as e:
-                    print(f"⚠️ Ошибка отправки в канал: {e}")
+                # отправка: канал, админ и подписчики — параллельно, с лимитами Telegram
+                report = await signal_delivery.deliver_signal(bot, text)
+                log_event(logger, "scan.delivered", symbol=symbol, signal_id=signal_id,
+                          sent=report["sent"], total=report["total"], elapsed=round(report["elapsed"], 2))
 
                 # учёт и ограничение количества
                 add_open_trade(signal)
@@ -140,14 +147,15 @@ async def auto_signal_job(bot: Bot):
                     break
 
             except Exception as e:
-                print(f"⚠️ Ошибка при обработке {pair}: {e}")
+                logger.warning("symbol error", extra={"event": "scan.symbol_error",
+                                                      "symbol": pair.get("symbol"), "error": str(e)})
                 continue
 
-        if sent == 0:
-            print("😕 Подходящих сигналов не найдено.")
+        log_event(logger, "scan.done", sent=sent,
+                  elapsed=round((datetime.datetime.now() - started).total_seconds(), 1))
 
     except Exception as e:
-        print(f"❌ Ошибка автоанализа: {e}")
+        logger.error("scan failed", extra={"event": "scan.error", "error": str(e)})
         try:
             await bot.send_message(chat_id=ADMIN_CHAT_ID, text=f"⚠️ Ошибка автоанализа:\n{e}")
         except Exception:
@@ -201,7 +209,7 @@ def setup_scheduler(bot: Bot):
 
     # проверка открытых сделок каждые 2 мин
     scheduler.add_job(
-        lambda: check_open_trades(get_price),
+        check_trades_job,
         trigger=IntervalTrigger(minutes=2),
         id="check_open_trades",
         replace_existing=True
@@ -218,7 +226,8 @@ def setup_scheduler(bot: Bot):
     # автопереобучение в 01:00 МСК
     from train.auto_retrain import auto_retrain
     scheduler.add_job(
-        lambda: asyncio.create_task(auto_retrain(bot)),
+        auto_retrain,  # корутина: обучение идёт в отдельном процессе, loop не блокируется
+        args=[bot],
         trigger=CronTrigger(hour=1, minute=0, timezone=pytz.timezone('Europe/Moscow')),
         id="auto_retrain",
         replace_existing=True
@@ -238,7 +247,12 @@ async def main():
     setup_scheduler(bot)
     # не запускаем вручную auto_signal_job — пусть идёт по расписанию
     # await auto_signal_job(bot)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        log_sink.close()  # дописываем буфер логов сигналов/сделок
+        shutdown_db()  # дожидаемся записей, стоящих в очереди потока БД
+        stop_logging()  # дописываем очередь логов
 
 
 def get_price(symbol: str) -> float:
@@ -249,6 +263,17 @@ def get_price(symbol: str) -> float:
     return 0.0
 
 
+def check_trades_job():
+    if TRADE_CHECK_MODE == "intrabar":
+        api = BybitAPI()
+        check_open_trades_intrabar(
+            lambda symbol, start_ms: api.get_ohlcv_range(symbol, start_ms, interval="1"),
+            api.get_recent_trades,
+        )
+    else:
+        check_open_trades(get_price)
+
+
 if __name__ == "__main__":
     init_db()  # создаём БД и файлы, если их ещё нет
     asyncio.run(main())  # запускаем бота
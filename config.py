@@ -16,3 +16,7 @@ SIGNAL_INTERVAL_MINUTES = int(os.getenv("SIGNAL_INTERVAL_MINUTES", "15"))
 
 VOLUME_MIN = int(os.getenv("VOLUME_MIN", "100000000"))
 VOLUME_MAX = int(os.getenv("VOLUME_MAX", "300000000"))
+
+# Проверка TP/SL: "intrabar" — по high/low минутных свечей с прошлой проверки,
+# "close" — по последней цене (как раньше)
+TRADE_CHECK_MODE = os.getenv("TRADE_CHECK_MODE", "intrabar")
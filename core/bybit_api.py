@@ -1,8 +1,17 @@
+import time
 from pybit.unified_trading import HTTP
 from typing import List, Dict
 from config import BYBIT_API_KEY, BYBIT_API_SECRET
 from pybit.unified_trading import HTTP
 
+INTERVAL_MS = {"D": 86_400_000, "W": 7 * 86_400_000}
+
+
+def interval_ms(interval) -> int:
+    """Длина свечи Bybit в мс: "1", "60", "D", ..."""
+    return INTERVAL_MS.get(str(interval)) or int(interval) * 60_000
+
+
 class BybitAPI:
     def __init__(self):
         self.session = HTTP(api_key=BYBIT_API_KEY, api_secret=BYBIT_API_SECRET, testnet=False)
@@ -40,3 +49,40 @@ class BybitAPI:
             limit=limit
         )
         return result.get("result", {}).get("list", [])
+
+    def get_ohlcv_range(self, symbol: str, start_ms: int, end_ms: int = None,
+                        interval="1", limit=1000) -> List[List]:
+        """
+        Свечи с start_ms (включительно) до end_ms / текущего момента, по возрастанию времени.
+        Bybit отдаёт максимум `limit` свечей за запрос, причём самые новые до `end` —
+        поэтому каждое окно задаём явно: [start, start + limit свечей) и листаем вперёд.
+        """
+        out: List[List] = []
+        step = interval_ms(interval)
+        stop = int(end_ms) if end_ms is not None else int(time.time() * 1000)
+        start = int(start_ms)
+        while start <= stop:
+            end = min(start + limit * step - 1, stop)
+            result = self.session.get_kline(category="linear", symbol=symbol, interval=interval,
+                                            start=start, end=end, limit=limit)
+            chunk = result.get("result", {}).get("list", [])
+            chunk = sorted(chunk, key=lambda c: int(c[0]))  # Bybit: новые первыми
+            out.extend(c for c in chunk
+                       if start <= int(c[0]) <= end and (not out or int(c[0]) > int(out[-1][0])))
+            start = end + 1   # пустое окно (пропуск торгов, до листинга) — просто идём дальше
+        return out
+
+    def get_ohlcv_before(self, symbol: str, end_ms: int, interval="1", limit=1000) -> List[List]:
+        """Одна страница: до `limit` свечей с временем <= end_ms, по возрастанию времени."""
+        result = self.session.get_kline(category="linear", symbol=symbol, interval=interval,
+                                        end=int(end_ms), limit=limit)
+        chunk = result.get("result", {}).get("list", [])
+        return sorted(chunk, key=lambda c: int(c[0]))  # Bybit: новые первыми
+
+    def get_recent_trades(self, symbol: str, limit=1000) -> List[Dict]:
+        """Последние сделки ленты (тики): [{"time": ms, "price": float}, ...] по возрастанию."""
+        result = self.session.get_public_trade_history(category="linear", symbol=symbol, limit=limit)
+        rows = result.get("result", {}).get("list", [])
+        ticks = [{"time": int(r["time"]), "price": float(r["price"])} for r in rows]
+        ticks.sort(key=lambda t: t["time"])
+        return ticks
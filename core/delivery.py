@@ -0,0 +1,193 @@
+# core/delivery.py — параллельная рассылка сигналов с учётом лимитов Telegram
+import asyncio
+import csv
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+
+logger = logging.getLogger(__name__)
+
+# ---- Лимиты Telegram ----
+GLOBAL_RATE  = 30.0        # сообщений/сек на бота в целом
+PRIVATE_RATE = 1.0         # в один личный чат — не чаще 1/сек
+GROUP_RATE   = 20.0 / 60   # в группу/канал — 20 сообщений в минуту
+
+MAX_RETRIES = 3            # попыток на сетевые/серверные ошибки
+BACKOFF_BASE = 1.0         # сек, растёт как 1, 2, 4...
+MAX_CONCURRENCY = 50       # одновременных запросов к Bot API
+
+DEAD_LETTER_FILE = "delivery_dead_letters.csv"
+DEAD_LETTER_FIELDS = ["ts", "chat_id", "error", "attempts", "text"]
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity.
+    acquire() ждёт, пока появится токен; pause() блокирует ведро (retry_after).
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def idle(self) -> bool:
+        """Ведро полное и не заблокировано — его можно выкинуть из кэша."""
+        now = time.monotonic()
+        self._refill(now)
+        return now >= self._blocked_until and self._tokens >= self.capacity
+
+
+_dead_letter_lock = threading.Lock()
+
+
+def _write_dead_letter(row: Dict):
+    """Строка в DEAD_LETTER_FILE (из пула потоков; замок — чтобы строки не перемешались)."""
+    try:
+        with _dead_letter_lock:
+            new = not os.path.exists(DEAD_LETTER_FILE)
+            with open(DEAD_LETTER_FILE, "a", newline="", encoding="utf-8") as f:
+                w = csv.DictWriter(f, fieldnames=DEAD_LETTER_FIELDS)
+                if new:
+                    w.writeheader()
+                w.writerow(row)
+    except Exception as e:
+        logger.warning(f"dead letter write error: {e}")
+
+
+def _chat_rate(chat_id: int) -> float:
+    # отрицательные id — группы и каналы
+    return GROUP_RATE if chat_id < 0 else PRIVATE_RATE
+
+
+class SignalDelivery:
+    def __init__(self):
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats: Dict[int, TokenBucket] = {}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(_chat_rate(chat_id), 1.0)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        # не копим ведра по всем когда-либо виденным чатам
+        for chat_id in [cid for cid, b in self._chats.items() if b.idle()]:
+            self._chats.pop(chat_id, None)
+
+    async def _send_one(self, bot: Bot, chat_id: int, text: str, parse_mode: Optional[str]) -> bool:
+        error = ""
+        for attempt in range(1, MAX_RETRIES + 1):
+            # сначала лимит чата, потом глобальный — чтобы не жечь глобальные токены в ожидании
+            await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                return True
+            except TelegramRetryAfter as e:
+                # flood-wait у Telegram — на весь бот: паузим и чат, и общий лимит
+                error = f"retry_after={e.retry_after}"
+                self._chat_bucket(chat_id).pause(float(e.retry_after))
+                self._global.pause(float(e.retry_after))
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # бот заблокирован / чат не найден / кривой HTML — повтор не поможет
+                error = str(e)
+                await self._dead_letter(chat_id, error, attempt, text)
+                return False
+            except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+                error = str(e)
+                await asyncio.sleep(BACKOFF_BASE * (2 ** (attempt - 1)))
+            except Exception as e:
+                error = str(e)
+                await self._dead_letter(chat_id, error, attempt, text)
+                return False
+        await self._dead_letter(chat_id, error, MAX_RETRIES, text)
+        return False
+
+    async def _dead_letter(self, chat_id: int, error: str, attempts: int, text: str):
+        logger.warning(f"delivery failed: chat={chat_id} attempts={attempts} error={error}")
+        # запись CSV — в пуле потоков, event loop на диск не ждёт
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _write_dead_letter, {
+            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "chat_id": chat_id,
+            "error": error,
+            "attempts": attempts,
+            "text": text[:200],
+        })
+
+    async def fanout(self, bot: Bot, chat_ids: Iterable[int], text: str,
+                     parse_mode: Optional[str] = "HTML") -> Dict:
+        """
+        Рассылает text во все chat_ids параллельно, соблюдая лимиты.
+        Возвращает отчёт: total / sent / failed / elapsed (сек).
+        """
+        # уникальные, без нулевых (незаданный id в .env) и в исходном порядке
+        targets: List[int] = list(dict.fromkeys(int(c) for c in chat_ids if c))
+        started = time.monotonic()
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+        async def worker(chat_id: int) -> bool:
+            async with sem:
+                return await self._send_one(bot, chat_id, text, parse_mode)
+
+        results = await asyncio.gather(*(worker(cid) for cid in targets))
+        self._prune()
+
+        sent = sum(1 for ok in results if ok)
+        return {
+            "total": len(targets),
+            "sent": sent,
+            "failed": len(targets) - sent,
+            "elapsed": time.monotonic() - started,
+        }
+
+    async def deliver_signal(self, bot: Bot, text: str) -> Dict:
+        """Канал, админ и все пользователи с активной подпиской."""
+        from config import ADMIN_CHAT_ID, CHANNEL_ID
+        from db.async_database import get_active_subscriber_ids
+
+        try:
+            subscribers = await get_active_subscriber_ids()
+        except Exception as e:
+            logger.warning(f"subscribers lookup error: {e}")
+            subscribers = []
+        return await self.fanout(bot, [CHANNEL_ID, ADMIN_CHAT_ID, *subscribers], text)
+
+
+# создаём глобальный экземпляр
+signal_delivery = SignalDelivery()
@@ -0,0 +1,110 @@
+# core/features.py — единый реестр фичей модели (инференс, переобучение, сбор датасета)
+#
+# Индикаторы считаются одной функцией compute_indicators(); фичи — из строки/таблицы
+# индикаторов по реестру FEATURES. Направленные фичи разворачиваются для SHORT,
+# поэтому одна модель оценивает «успех сигнала» для обеих сторон.
+# Фичи, посчитанные в момент сигнала, сохраняются с signal_id (таблица signal_features)
+# и при переобучении берутся оттуда как есть — индикаторы заново не считаются.
+from typing import Callable, Dict, List, NamedTuple, Union
+
+import pandas as pd
+from ta.momentum import RSIIndicator
+from ta.trend import ADXIndicator, EMAIndicator, MACD
+from ta.volatility import AverageTrueRange, BollingerBands
+from ta.volume import MFIIndicator, OnBalanceVolumeIndicator, VolumeWeightedAveragePrice
+
+FEATURE_VERSION = 1   # менять при любом изменении реестра — старые строки не смешиваются
+MAX_VOL_RATIO = 20.0
+
+Frame = Union[pd.Series, pd.DataFrame]
+
+
+def compute_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """Все индикаторы, которые нужны правилам generate_signal и фичам. df: open/high/low/close/volume."""
+    df["ema50"]  = EMAIndicator(close=df["close"], window=50).ema_indicator()
+    df["ema200"] = EMAIndicator(close=df["close"], window=200).ema_indicator()
+    macd = MACD(close=df["close"], window_fast=12, window_slow=26, window_sign=9)
+    df["macd"]        = macd.macd()
+    df["macd_signal"] = macd.macd_signal()
+    df["macd_hist"]   = df["macd"] - df["macd_signal"]
+    df["rsi"]   = RSIIndicator(close=df["close"], window=14).rsi()
+    df["atr"]   = AverageTrueRange(high=df["high"], low=df["low"], close=df["close"], window=14).average_true_range()
+    df["adx"]   = ADXIndicator(high=df["high"], low=df["low"], close=df["close"], window=14).adx()
+    df["mfi"]   = MFIIndicator(high=df["high"], low=df["low"], close=df["close"], volume=df["volume"], window=14).money_flow_index()
+    df["obv"]   = OnBalanceVolumeIndicator(close=df["close"], volume=df["volume"]).on_balance_volume()
+    vwap        = VolumeWeightedAveragePrice(high=df["high"], low=df["low"], close=df["close"], volume=df["volume"], window=20)
+    df["vwap"]  = vwap.volume_weighted_average_price()
+    bb          = BollingerBands(close=df["close"], window=20, window_dev=2)
+    df["bb_high"] = bb.bollinger_hband()
+    df["bb_low"]  = bb.bollinger_lband()
+    df["bb_bw"] = (df["bb_high"] - df["bb_low"]) / (df["close"] + 1e-9)
+    df["vol_ma20"]  = df["volume"].rolling(20, min_periods=20).mean()
+    df["vol_z"]     = (df["volume"] - df["vol_ma20"]) / (df["vol_ma20"].rolling(100).std(ddof=0) + 1e-9)
+    df["vol_ratio"] = df["volume"] / (df["vol_ma20"] + 1e-9)
+    return df
+
+
+class Feature(NamedTuple):
+    name: str
+    fn: Callable[[Frame], Frame]   # работает и со строкой (Series), и с таблицей (DataFrame)
+    signed: bool                   # True — для SHORT меняем знак (отклонение от 0 / от 50)
+    center: float = 0.0
+
+
+def _clip(x, hi):
+    # у numpy-скаляра тоже есть .clip, но без upper= — различаем по типу pandas
+    return x.clip(upper=hi) if isinstance(x, (pd.Series, pd.DataFrame)) else min(hi, x)
+
+
+FEATURES: List[Feature] = [
+    Feature("ema50_dist",     lambda f: f["close"] / f["ema50"] - 1.0, True),
+    Feature("ema200_dist",    lambda f: f["close"] / f["ema200"] - 1.0, True),
+    Feature("ema_spread",     lambda f: f["ema50"] / f["ema200"] - 1.0, True),
+    Feature("macd_norm",      lambda f: f["macd"] / f["close"], True),
+    Feature("macd_hist_norm", lambda f: f["macd_hist"] / f["close"], True),
+    Feature("rsi",            lambda f: f["rsi"], True, 50.0),
+    Feature("mfi",            lambda f: f["mfi"], True, 50.0),
+    Feature("adx",            lambda f: f["adx"], False),
+    Feature("atr_pct",        lambda f: f["atr"] / f["close"], False),
+    Feature("bb_bw",          lambda f: f["bb_bw"], False),
+    Feature("vwap_dist",      lambda f: f["close"] / f["vwap"] - 1.0, True),
+    Feature("vol_ratio",      lambda f: _clip(f["vol_ratio"], MAX_VOL_RATIO), False),
+    Feature("vol_z",          lambda f: f["vol_z"], False),
+]
+
+FEATURE_NAMES: List[str] = [f.name for f in FEATURES]
+
+
+def _side_sign(side) -> Union[float, pd.Series]:
+    if isinstance(side, pd.Series):
+        return side.astype(str).str.upper().map({"SHORT": -1.0}).fillna(1.0)
+    return -1.0 if str(side).upper() == "SHORT" else 1.0
+
+
+def feature_values(row: pd.Series, side: str) -> Dict[str, float]:
+    """Фичи одной строки индикаторов (момент сигнала) для стороны side."""
+    sign = _side_sign(side)
+    out = {}
+    for f in FEATURES:
+        v = float(f.fn(row))
+        out[f.name] = f.center + sign * (v - f.center) if f.signed else v
+    return out
+
+
+def feature_frame(ind: pd.DataFrame, side="LONG") -> pd.DataFrame:
+    """Фичи по всей таблице индикаторов (сбор датасета). side — строка или Series сторон."""
+    sign = _side_sign(side)
+    out = pd.DataFrame(index=ind.index)
+    for f in FEATURES:
+        v = f.fn(ind).astype(float)
+        out[f.name] = f.center + sign * (v - f.center) if f.signed else v
+    return out
+
+
+def to_matrix(values) -> pd.DataFrame:
+    """dict / список dict / DataFrame -> таблица ровно с FEATURE_NAMES в порядке реестра."""
+    df = pd.DataFrame([values]) if isinstance(values, dict) else pd.DataFrame(values)
+    for name in FEATURE_NAMES:
+        if name not in df.columns:
+            df[name] = float("nan")
+    return df[FEATURE_NAMES].astype(float)
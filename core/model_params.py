@@ -0,0 +1,48 @@
+# core/model_params.py — гиперпараметры модели сигналов и порог вероятности
+#
+# Значения по умолчанию — прежние константы; подобранные train/model_search.py
+# лежат в model/model_params.json и читаются обучением (train_model, retrain_worker).
+# При регистрации версии параметры вместе с порогом prob_threshold копируются в её
+# манифест (core/model_registry.py) — инференс берёт порог оттуда.
+import json
+import os
+from typing import Dict
+
+PARAMS_PATH = os.path.join("model", "model_params.json")
+
+DEFAULT_PARAMS = {
+    "hidden_layer_sizes": [64, 32],
+    "activation": "relu",
+    "alpha": 1e-4,
+    "learning_rate_init": 1e-3,
+    "prob_threshold": 0.60,
+}
+
+# ключи, которые уходят в MLPClassifier
+MLP_KEYS = ("hidden_layer_sizes", "activation", "alpha", "learning_rate_init")
+
+
+def load_params() -> Dict:
+    try:
+        with open(PARAMS_PATH, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except Exception:
+        saved = {}
+    return {**DEFAULT_PARAMS, **{k: v for k, v in saved.items() if k in DEFAULT_PARAMS}}
+
+
+def save_params(params: Dict, **extra):
+    """Сохранить подобранные параметры (extra — справочная информация: метрики, дата поиска)."""
+    os.makedirs(os.path.dirname(PARAMS_PATH), exist_ok=True)
+    tmp = PARAMS_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**load_params(), **params, **extra}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, PARAMS_PATH)
+
+
+def mlp_kwargs(params: Dict = None) -> Dict:
+    """Аргументы MLPClassifier из параметров (hidden_layer_sizes — кортеж)."""
+    p = params or load_params()
+    kw = {k: p[k] for k in MLP_KEYS}
+    kw["hidden_layer_sizes"] = tuple(kw["hidden_layer_sizes"])
+    return kw
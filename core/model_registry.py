@@ -0,0 +1,242 @@
+# core/model_registry.py — версии модели сигналов и атомарное переключение
+#
+# model/registry/
+#   v0001/ signal_model.pkl, scaler.pkl, manifest.json   — версия целиком (пишется в tmp-папку и переименовывается)
+#   CURRENT                                             — имя активной версии (замена через os.replace)
+#   history.json                                        — порядок активаций, для отката
+#
+# Бот держит одну ссылку на неизменяемый ModelBundle (модель + скейлер + манифест).
+# Скан берёт бандл один раз в начале (current()) и передаёт его в generate_signal —
+# переключение версии посреди скана его не затрагивает, а пары «новая модель +
+# старый скейлер» не бывает. Выставление версии проходит проверки: точность на
+# валидации и задержка инференса (p95 на одну строку).
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from core.features import FEATURE_NAMES, FEATURE_VERSION, to_matrix
+from core.model_params import load_params
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = os.path.join("model", "registry")
+CURRENT_FILE = os.path.join(REGISTRY_DIR, "CURRENT")
+HISTORY_FILE = os.path.join(REGISTRY_DIR, "history.json")
+LEGACY_MODEL = os.path.join("model", "signal_model.pkl")   # до реестра модель лежала здесь
+LEGACY_SCALER = os.path.join("model", "scaler.pkl")
+
+PROMOTE_MIN_ACC = float(os.getenv("PROMOTE_MIN_ACC", "0.5"))
+LATENCY_BUDGET_MS = float(os.getenv("MODEL_LATENCY_MS", "5"))
+LATENCY_RUNS = 200
+
+
+class ModelBundle(NamedTuple):
+    version: str
+    model: object
+    scaler: object
+    manifest: Dict
+
+    @property
+    def prob_threshold(self) -> float:
+        return float(self.manifest.get("params", {}).get("prob_threshold", load_params()["prob_threshold"]))
+
+
+def _version_dir(version: str) -> str:
+    return os.path.join(REGISTRY_DIR, version)
+
+
+def _read_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def _write_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def versions() -> List[str]:
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    return sorted(d for d in os.listdir(REGISTRY_DIR) if d.startswith("v") and d[1:].isdigit())
+
+
+def manifest(version: str) -> Dict:
+    return _read_json(os.path.join(_version_dir(version), "manifest.json"), {})
+
+
+def current_version() -> Optional[str]:
+    try:
+        with open(CURRENT_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+# ---------- загрузка и горячая замена ----------
+
+def load(version: Optional[str]) -> Optional[ModelBundle]:
+    """Бандл версии; version=None — модель из model/ времён до реестра (если есть)."""
+    if version:
+        d = _version_dir(version)
+        return ModelBundle(version, joblib.load(os.path.join(d, "signal_model.pkl")),
+                           joblib.load(os.path.join(d, "scaler.pkl")), manifest(version))
+    if os.path.exists(LEGACY_MODEL) and os.path.exists(LEGACY_SCALER):
+        return ModelBundle("legacy", joblib.load(LEGACY_MODEL), joblib.load(LEGACY_SCALER), {})
+    return None
+
+
+def feature_mismatch(bundle: ModelBundle) -> str:
+    """Почему бандл не примет фичи реестра ('' — примет): модель до реестра училась на других колонках."""
+    names = getattr(bundle.scaler, "feature_names_in_", None)
+    if names is not None and list(names) != FEATURE_NAMES:
+        return f"фичи скейлера {list(names)} не совпадают с реестром {FEATURE_NAMES}"
+    n = getattr(bundle.scaler, "n_features_in_", None)
+    if n is not None and n != len(FEATURE_NAMES):
+        return f"скейлер ждёт {n} фичей, в реестре {len(FEATURE_NAMES)}"
+    return ""
+
+
+_current: Optional[ModelBundle] = None
+_loaded = False
+
+
+def current() -> Optional[ModelBundle]:
+    """Активный бандл (None — модели нет, работаем только по правилам)."""
+    global _loaded
+    if not _loaded:
+        reload()
+    return _current
+
+
+def reload() -> Optional[ModelBundle]:
+    """Перечитать CURRENT и подменить ссылку одним присваиванием; уже начатые сканы держат старый бандл."""
+    global _current, _loaded
+    try:
+        bundle = load(current_version())
+    except Exception as e:
+        logger.warning(f"Model reload failed, keeping {getattr(_current, 'version', None)}: {e}")
+        _loaded = True
+        return _current
+    mismatch = feature_mismatch(bundle) if bundle else ""
+    if mismatch:
+        # проверяем один раз здесь, а не исключением на каждой монете в generate_signal
+        logger.error(f"Model {bundle.version} DISABLED, signals use rules only: {mismatch}. "
+                     f"Fill signal_features (python -m train.backfill_features) and run /retrain full")
+        bundle = None
+    _current, _loaded = bundle, True
+    if bundle:
+        logger.info(f"Model {bundle.version} loaded")
+    elif not mismatch:
+        logger.warning("No model in registry, fallback to rules only")
+    return bundle
+
+
+# ---------- регистрация и выставление ----------
+
+def measure_latency(model, scaler, runs: int = LATENCY_RUNS) -> float:
+    """p95 (мс) одного предсказания как в generate_signal: одна строка фичей -> scaler -> predict_proba."""
+    row = to_matrix({n: 0.0 for n in FEATURE_NAMES})
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        model.predict_proba(scaler.transform(row))
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    return float(np.percentile(timings, 95))
+
+
+def register(model, scaler, metrics: Dict, params: Optional[Dict] = None, **info) -> str:
+    """Сохранить новую версию (пока не активна). metrics: acc, samples, mode, ...; info — в манифест как есть."""
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    existing = versions()
+    version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+    tmp = _version_dir(version) + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    joblib.dump(model, os.path.join(tmp, "signal_model.pkl"))
+    joblib.dump(scaler, os.path.join(tmp, "scaler.pkl"))
+    man = {
+        "version": version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "feature_version": FEATURE_VERSION,
+        "features": list(getattr(scaler, "feature_names_in_", FEATURE_NAMES)),
+        "params": params or load_params(),
+        "metrics": {**metrics, "latency_p95_ms": round(measure_latency(model, scaler), 3)},
+        **info,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(man, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, _version_dir(version))
+    return version
+
+
+def check_gates(version: str) -> Tuple[bool, str]:
+    m = manifest(version)
+    metrics = m.get("metrics", {})
+    if m.get("features") != FEATURE_NAMES:
+        return False, "набор фичей не совпадает с реестром"
+    acc = metrics.get("acc")
+    if acc is None:
+        return False, "нет точности на валидации"
+    if acc < PROMOTE_MIN_ACC:
+        return False, f"точность {acc:.2%} < {PROMOTE_MIN_ACC:.0%}"
+    latency = metrics.get("latency_p95_ms")
+    if latency is None or latency > LATENCY_BUDGET_MS:
+        return False, f"задержка p95 {latency} мс > бюджета {LATENCY_BUDGET_MS:g} мс"
+    return True, "ok"
+
+
+def activate(version: str, **info):
+    """Атомарно сделать версию активной (без проверок точности — для отката). info — в history.json."""
+    if not os.path.isdir(_version_dir(version)):
+        raise ValueError(f"нет версии {version}")
+    history = _read_json(HISTORY_FILE, [])
+    history.append({"version": version, "at": datetime.now().isoformat(timespec="seconds"), **info})
+    _write_atomic(HISTORY_FILE, json.dumps(history[-100:], ensure_ascii=False))
+    _write_atomic(CURRENT_FILE, version)
+
+
+def promote(version: str) -> Tuple[bool, str]:
+    ok, reason = check_gates(version)
+    if ok:
+        activate(version)
+    return ok, reason
+
+
+def rollback(version: Optional[str] = None) -> Optional[str]:
+    """
+    Вернуть указанную версию или ту, что была активна до текущей. None — откатываться некуда.
+    Без аргумента идём по истории активаций назад и пропускаем версии, с которых уже
+    откатывались (после v3 → v2 следующий откат — на v1, а не снова на v3).
+    Версию, которая не примет фичи реестра, не активируем — ValueError.
+    """
+    cur = current_version()
+    if version is None:
+        skip = {cur}
+        for h in reversed(_read_json(HISTORY_FILE, [])):
+            if h.get("rolled_back_from"):
+                skip.add(h["rolled_back_from"])
+            if h["version"] not in skip:
+                version = h["version"]
+                break
+        else:
+            return None
+    if not os.path.isdir(_version_dir(version)):
+        raise ValueError(f"нет версии {version}")
+    mismatch = feature_mismatch(load(version))
+    if mismatch:
+        raise ValueError(f"версия {version} не подходит: {mismatch}")
+    activate(version, rolled_back_from=cur)
+    return version
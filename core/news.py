@@ -1,14 +1,20 @@
 import re
+import html
 import asyncio
+import itertools
+import logging
 import aiohttp
 import time
-from typing import Dict, List
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
 
 RSS_FEEDS = [
     "https://www.coindesk.com/arc/outboundfeeds/rss/?outputType=xml",
     "https://cointelegraph.com/rss",
     "https://www.theblock.co/rss",
 ]
+MAX_ITEMS = 150   # заголовков с ленты — не увлекаться
 
 # очень простой лексикон; позже можно заменить на VADER/TextBlob
 POS_WORDS = {"partnership", "integration", "launch", "upgrade", "approval", "etf", "listing",
@@ -42,39 +48,109 @@ def _sentiment(text: str) -> float:
     raw = (pos - neg) / max(1, pos + neg)
     return max(0.0, min(1.0, 0.5 + 0.5 * raw))
 
+# ---- разбор RSS/Atom: заголовок + ключ (guid/id, иначе ссылка) ----
+_ITEM_RE = re.compile(r"<(item|entry)\b.*?</\1>", re.I | re.S)
+_CDATA_RE = re.compile(r"<!\[CDATA\[(.*?)\]\]>", re.S)
+
+def _tag(block: str, name: str) -> str:
+    m = re.search(rf"<{name}\b[^>]*>(.*?)</{name}>", block, flags=re.I | re.S)
+    return m.group(1) if m else ""
+
+def _text(raw: str) -> str:
+    raw = _CDATA_RE.sub(lambda m: m.group(1), raw)   # CDATA раскрываем до вырезания тегов
+    return html.unescape(re.sub(r"<.*?>", "", raw, flags=re.S)).strip()
+
+def parse_items(text: str, limit: int = MAX_ITEMS) -> List[Tuple[str, str]]:
+    """[(ключ, заголовок)] в порядке ленты; ключ — guid/id, иначе ссылка, иначе сам заголовок."""
+    out = []
+    for m in itertools.islice(_ITEM_RE.finditer(text), limit):
+        block = m.group(0)
+        title = _text(_tag(block, "title"))
+        if not title:
+            continue
+        link = _text(_tag(block, "link"))
+        if not link:   # Atom: <link href="..."/>
+            href = re.search(r"<link\b[^>]*href=[\"']([^\"']+)", block, flags=re.I)
+            link = href.group(1) if href else ""
+        key = _text(_tag(block, "guid")) or _text(_tag(block, "id")) or link or title
+        out.append((key, title))
+    return out
+
+def _score_title(title: str) -> List[Tuple[str, float]]:
+    """[(символ, тональность)] для монет, которые упомянуты в заголовке."""
+    t = _clean(title)
+    syms = [sym for sym, keys in SYMBOL_MAP.items() if any(k in t for k in keys)]
+    if not syms:
+        return []
+    s = _sentiment(t)
+    return [(sym, s) for sym in syms]
+
 class NewsCache:
+    """
+    Ленты качаются параллельно условными запросами (ETag / If-Modified-Since):
+    неизменившаяся лента — ответ 304 без тела, берём её прошлый список заголовков.
+    Каждый заголовок оценивается один раз (кэш по guid/ссылке, одна новость из
+    нескольких лент считается один раз); скор монеты — среднее по заголовкам,
+    которые сейчас есть в лентах.
+    """
     def __init__(self):
         self._scores: Dict[str, float] = {}
         self._last_update = 0
+        self._feeds: Dict[str, Dict] = {}                    # url -> etag, modified, keys (текущие заголовки)
+        self._items: Dict[str, List[Tuple[str, float]]] = {}   # ключ заголовка -> [(символ, тональность)]
 
     def score(self, symbol: str) -> float:
         return float(self._scores.get(symbol, 0.5))
 
+    async def _fetch(self, sess: aiohttp.ClientSession, url: str) -> str:
+        """Обновить ленту; 'new' / 'not_modified' / 'error' (при ошибке остаются прошлые заголовки)."""
+        feed = self._feeds.setdefault(url, {"etag": None, "modified": None, "keys": []})
+        headers = {}
+        if feed["etag"]:
+            headers["If-None-Match"] = feed["etag"]
+        if feed["modified"]:
+            headers["If-Modified-Since"] = feed["modified"]
+        try:
+            async with sess.get(url, headers=headers) as r:
+                if r.status == 304:
+                    return "not_modified"
+                if r.status != 200:
+                    return "error"
+                text = await r.text()
+                feed["etag"] = r.headers.get("ETag")
+                feed["modified"] = r.headers.get("Last-Modified")
+        except Exception:
+            return "error"
+        feed["keys"] = []
+        for key, title in parse_items(text):
+            if key not in self._items:
+                self._items[key] = _score_title(title)
+            feed["keys"].append(key)
+        return "new"
+
     async def refresh(self, timeout: int = 10):
         now = time.time()
         if now - self._last_update < 60:  # антиспам обновлений
             return
         self._last_update = now
 
-        scores: Dict[str, List[float]] = {sym: [] for sym in SYMBOL_MAP}
+        known = len(self._items)
         async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as sess:
-            for url in RSS_FEEDS:
-                try:
-                    async with sess.get(url) as r:
-                        text = await r.text()
-                except Exception:
-                    continue
-                # простенький парс — ищем <title>...</title>
-                titles = re.findall(r"<title>(.*?)</title>", text, flags=re.I | re.S)
-                for title in titles[:150]:  # не увлекаться
-                    t = _clean(re.sub("<.*?>", "", title))
-                    s = _sentiment(t)
-                    for sym, keys in SYMBOL_MAP.items():
-                        if any(k in t for k in keys):
-                            scores.setdefault(sym, []).append(s)
+            results = await asyncio.gather(*(self._fetch(sess, url) for url in RSS_FEEDS))
 
+        current = {k for feed in self._feeds.values() for k in feed["keys"]}
+        scored = len(self._items) - known
+        # выпавшие из всех лент заголовки больше не нужны
+        self._items = {k: v for k, v in self._items.items() if k in current}
+
+        scores: Dict[str, List[float]] = {sym: [] for sym in SYMBOL_MAP}
+        for key in current:
+            for sym, s in self._items[key]:
+                scores[sym].append(s)
         # усредним; если новостей нет — 0.5
         self._scores = {sym: (sum(vals)/len(vals) if vals else 0.5) for sym, vals in scores.items()}
+        logger.info(f"News refresh: {results.count('new')} updated, {results.count('not_modified')} not modified, "
+                    f"{results.count('error')} failed; {scored} new headlines scored, {len(current)} in feeds")
 
 # создаём глобальный экземпляр
 news_cache = NewsCache()
@@ -1,5 +1,7 @@
 # core/risk_manager.py
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+
+import numpy as np
 
 DEFAULT_SETTINGS = {
     "risk_pct": 1.0,          # риск на сделку в %
@@ -8,6 +10,30 @@ DEFAULT_SETTINGS = {
     "position_mode": "ONEWAY",
 }
 
+# Цели под 1H: ориентир 3–4%, но не ближе 2*ATR, чтобы на «тихих» инструментах цель не была слишком маленькой.
+PCT_TP = 0.035   # 3.5% средняя цель
+PCT_SL = 0.015   # 1.5% защитный стоп (RR около 2)
+ATR_TP = 2.0
+ATR_SL = 1.0
+
+
+def tp_sl_levels(entry, atr, side: str, pct_tp: float = PCT_TP, pct_sl: float = PCT_SL) -> Tuple:
+    """
+    TP/SL по правилам generate_signal. entry/atr — числа или numpy-массивы
+    (разметка истории в train/labeler.py считает уровни сразу для всех баров).
+    pct_tp/pct_sl — подобранные цели из core/strategy_params.py.
+    """
+    if side == "LONG":
+        tp = np.maximum(entry * (1 + pct_tp), entry + ATR_TP * atr)
+        sl = np.minimum(entry * (1 - pct_sl), entry - ATR_SL * atr)
+    else:
+        tp = np.minimum(entry * (1 - pct_tp), entry - ATR_TP * atr)
+        sl = np.maximum(entry * (1 + pct_sl), entry + ATR_SL * atr)
+    if np.ndim(tp) == 0:
+        return float(tp), float(sl)
+    return tp, sl
+
+
 def evaluate_risk(signal: Dict, user_settings: Optional[Dict] = None) -> Dict:
     """
     Дополняет сигнал расчётом RR и безопасными дефолтами.
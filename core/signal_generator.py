@@ -4,33 +4,28 @@ from typing import List, Dict, Callable, Optional
 
 import numpy as np
 import pandas as pd
-from ta.trend import EMAIndicator, MACD, ADXIndicator
-from ta.momentum import RSIIndicator
-from ta.volatility import AverageTrueRange, BollingerBands
-from ta.volume import MFIIndicator, OnBalanceVolumeIndicator, VolumeWeightedAveragePrice
-import joblib
+from ta.trend import EMAIndicator
 import torch
 
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+from core.features import MAX_VOL_RATIO, compute_indicators, feature_values, to_matrix
+from core import model_registry
+from core.risk_manager import tp_sl_levels
+from core.strategy_params import DEFAULT_PARAMS, load_params as load_strategy
+
+logger = logging.getLogger(__name__)  # настройка вывода — utils/logging_setup
 
 # ---- Настройки под 1H ----
 BASE_TF = "60"       # 1H
 MTF_TF  = "240"      # 4H подтверждение тренда
-PROB_THRESHOLD = 0.60
-SCORE_THRESHOLD = 75   # чуть выше, т.к. хотим избирательность на 1H
 MIN_CANDLES    = 260   # чтобы уверенно считать EMA200/RSI/BB и т.д.
-MAX_VOL_RATIO  = 20.0
-
-# ---- Модель (опционально) ----
-try:
-    scaler = joblib.load("model/scaler.pkl")
-    model  = joblib.load("model/signal_model.pkl")
-    _model_ok = True
-    logger.info("Models loaded: scaler.pkl, signal_model.pkl")
-except Exception as e:
-    _model_ok = False
-    logger.warning(f"Models not loaded, fallback to rules only: {e}")
+# веса, порог, ADX и фибо по умолчанию; рабочие (подобранные train/walk_forward.py) — load_strategy()
+SCORE_THRESHOLD = DEFAULT_PARAMS["score_threshold"]
+ADX_MIN         = DEFAULT_PARAMS["adx_min"]
+FIB_LOOKBACK    = DEFAULT_PARAMS["fib_lookback"]
+WEIGHTS         = DEFAULT_PARAMS["weights"]
+
+# ---- Модель (опционально) — активная версия из реестра core/model_registry.py ----
+model_registry.current()
 
 def _normalize_ohlcv(ohlcv_raw):
     out = []
@@ -51,40 +46,87 @@ def _normalize_ohlcv(ohlcv_raw):
         out.append([ts, o, h, l, c, v])
     return out
 
-def _fib_pullback_score(close, swing_low, swing_high, side: str) -> float:
-    if swing_high <= swing_low:
-        return 0.0
-    fib382 = swing_high - 0.382 * (swing_high - swing_low)
-    fib500 = swing_high - 0.500 * (swing_high - swing_low)
-    fib618 = swing_high - 0.618 * (swing_high - swing_low)
+def _fib_pullback_score(close, swing_low, swing_high, side: str):
+    """Близость к зоне отката 0.382–0.618; числа или массивы (бэктест считает по всем барам сразу)."""
+    close, swing_low, swing_high = (np.asarray(a, dtype=float) for a in (close, swing_low, swing_high))
+    rng = swing_high - swing_low
     if side == "SHORT":
-        fib382 = swing_low + 0.382 * (swing_high - swing_low)
-        fib500 = swing_low + 0.500 * (swing_high - swing_low)
-        fib618 = swing_low + 0.618 * (swing_high - swing_low)
-    lo, hi = (min(fib618, fib382), max(fib618, fib382))
-    if close < lo or close > hi:
-        band = abs(close - fib500) / (abs(hi - lo) + 1e-9)
-        return float(max(0.0, 1.0 - band*2.0))
-    return 1.0
+        fib382 = swing_low + 0.382 * rng
+        fib500 = swing_low + 0.500 * rng
+        fib618 = swing_low + 0.618 * rng
+    else:
+        fib382 = swing_high - 0.382 * rng
+        fib500 = swing_high - 0.500 * rng
+        fib618 = swing_high - 0.618 * rng
+    lo, hi = np.minimum(fib618, fib382), np.maximum(fib618, fib382)
+    band = np.abs(close - fib500) / (np.abs(hi - lo) + 1e-9)
+    out = np.where((close < lo) | (close > hi), np.maximum(0.0, 1.0 - band * 2.0), 1.0)
+    out = np.where(swing_high <= swing_low, 0.0, out)
+    return float(out) if out.ndim == 0 else out
+
+
+def candidate_sides(df: pd.DataFrame) -> pd.Series:
+    """Направление по каждому бару: LONG (EMA50>EMA200 и MACD выше сигнальной), SHORT — наоборот, иначе None."""
+    long_ = (df["ema50"] > df["ema200"]) & (df["macd"] > df["macd_signal"])
+    short = (df["ema50"] < df["ema200"]) & (df["macd"] < df["macd_signal"])
+    return pd.Series(np.select([long_, short], ["LONG", "SHORT"], None), index=df.index)
+
+
+def fib_scores(df: pd.DataFrame, side: str, lookback: int = FIB_LOOKBACK) -> np.ndarray:
+    """Фибо-откат по всем барам: свинг — high/low за последние lookback баров."""
+    swing_high = df["high"].rolling(lookback, min_periods=1).max()
+    swing_low = df["low"].rolling(lookback, min_periods=1).min()
+    return _fib_pullback_score(df["close"].values, swing_low.values, swing_high.values, side)
+
+
+def score_components(df: pd.DataFrame, side: str, mtf_up=None,
+                     adx_min: float = ADX_MIN, fib_lookback: int = FIB_LOOKBACK) -> pd.DataFrame:
+    """
+    Слагаемые скоринга (0..1) по всем барам для стороны side; score = сумма с весами WEIGHTS.
+    mtf_up — 4H EMA50>EMA200: bool, Series по барам (NaN — неизвестно) или None.
+    """
+    long_ = side == "LONG"
+    close = df["close"]
+    c = pd.DataFrame(index=df.index)
+    c["trend"] = 1.0
+    c["macd"] = df["macd_hist"] > 0 if long_ else df["macd_hist"] < 0
+    c["adx"] = df["adx"] >= adx_min
+    c["rsi"] = df["rsi"] > 50 if long_ else df["rsi"] < 50
+    c["vwap"] = close > df["vwap"] if long_ else close < df["vwap"]
+    c["volume"] = (df["vol_ratio"].clip(upper=MAX_VOL_RATIO) > 1.5) | (df["vol_z"] > 1.0)
+    squeeze = df["bb_bw"] < df["bb_bw"].rolling(200).median() * 0.8
+    c["bb"] = squeeze & (close > df["bb_high"] if long_ else close < df["bb_low"])
+    c["fib"] = fib_scores(df, side, fib_lookback)
+    if mtf_up is None:
+        c["mtf"] = 0.0
+    elif isinstance(mtf_up, pd.Series):
+        c["mtf"] = mtf_up.eq(long_)
+    else:
+        c["mtf"] = bool(mtf_up) == long_
+    return c.astype(float)
+
+
+def rule_score(components: pd.DataFrame, weights: Dict[str, float] = None) -> pd.Series:
+    w = weights or WEIGHTS
+    return components[list(w)].mul(pd.Series(w)).sum(axis=1)
+
 
 def reload_model():
-    global scaler, model, _model_ok
-    try:
-        scaler = joblib.load("model/scaler.pkl")
-        model  = joblib.load("model/signal_model.pkl")
-        _model_ok = True
-        logger.info("Models reloaded from disk.")
-    except Exception as e:
-        _model_ok = False
-        logger.warning(f"Reload failed: {e}")
+    """Подхватить активную версию из реестра; сканы, начатые раньше, доработают на своей."""
+    return model_registry.reload()
 
 def generate_signal(
     symbol: str,
     ohlcv: List[List],
     fetcher: Optional[Callable[[str, str, int], List[List]]] = None,
-    news_score_provider: Optional[Callable[[str], float]] = None
+    news_score_provider: Optional[Callable[[str], float]] = None,
+    bundle: Optional[model_registry.ModelBundle] = None
 ) -> Dict:
-    """Базовый анализ на 1H, подтверждение тренда по 4H, цель 3–4%."""
+    """
+    Базовый анализ на 1H, подтверждение тренда по 4H, цель 3–4%.
+    bundle — версия модели, взятая в начале скана; по умолчанию текущая.
+    """
+    bundle = bundle or model_registry.current()
     try:
         norm = _normalize_ohlcv(ohlcv)
         if not norm or len(norm) < MIN_CANDLES:
@@ -94,25 +136,8 @@ def generate_signal(
         df = df.sort_values("timestamp")
         df[["open","high","low","close","volume"]] = df[["open","high","low","close","volume"]].astype(float)
 
-        # ==== Индикаторы (1H) ====
-        df["ema50"]  = EMAIndicator(close=df["close"], window=50).ema_indicator()
-        df["ema200"] = EMAIndicator(close=df["close"], window=200).ema_indicator()
-        macd = MACD(close=df["close"], window_fast=12, window_slow=26, window_sign=9)
-        df["macd"]        = macd.macd()
-        df["macd_signal"] = macd.macd_signal()
-        df["macd_hist"]   = df["macd"] - df["macd_signal"]
-        df["rsi"]   = RSIIndicator(close=df["close"], window=14).rsi()
-        df["atr"]   = AverageTrueRange(high=df["high"], low=df["low"], close=df["close"], window=14).average_true_range()
-        df["adx"]   = ADXIndicator(high=df["high"], low=df["low"], close=df["close"], window=14).adx()
-        df["mfi"]   = MFIIndicator(high=df["high"], low=df["low"], close=df["close"], volume=df["volume"], window=14).money_flow_index()
-        df["obv"]   = OnBalanceVolumeIndicator(close=df["close"], volume=df["volume"]).on_balance_volume()
-        vwap        = VolumeWeightedAveragePrice(high=df["high"], low=df["low"], close=df["close"], volume=df["volume"], window=20)
-        df["vwap"]  = vwap.volume_weighted_average_price()
-        bb          = BollingerBands(close=df["close"], window=20, window_dev=2)
-        df["bb_bw"] = (bb.bollinger_hband() - bb.bollinger_lband()) / (df["close"] + 1e-9)
-        df["vol_ma20"]  = df["volume"].rolling(20, min_periods=20).mean()
-        df["vol_z"]     = (df["volume"] - df["vol_ma20"]) / (df["vol_ma20"].rolling(100).std(ddof=0) + 1e-9)
-        df["vol_ratio"] = df["volume"] / (df["vol_ma20"] + 1e-9)
+        # ==== Индикаторы (1H) — общий реестр core/features.py ====
+        df = compute_indicators(df)
 
         latest = df.iloc[-1]
 
@@ -128,52 +153,14 @@ def generate_signal(
                 mtf_ok = (ema50_h4 > ema200_h4)
 
         # ==== Кандидат направления ====
-        trend_up   = latest["ema50"] > latest["ema200"]
-        trend_down = latest["ema50"] < latest["ema200"]
-        macd_bull  = latest["macd"]  > latest["macd_signal"]
-        macd_bear  = latest["macd"]  < latest["macd_signal"]
-
-        candidate = "LONG" if (trend_up and macd_bull) else ("SHORT" if (trend_down and macd_bear) else None)
+        candidate = candidate_sides(df.iloc[-1:]).iloc[-1]
         if candidate is None:
             return {"symbol": symbol, "position": "NONE", "reason": "no_consensus"}
 
-        # ==== Фибо-откат на 1H ====
-        lookback = 180
-        swing_high = float(df["high"].iloc[-lookback:].max())
-        swing_low  = float(df["low"].iloc[-lookback:].min())
-        fib_score  = _fib_pullback_score(float(latest["close"]), swing_low, swing_high, candidate)
-
-        # ==== Скоринг ====
-        score = 0.0
-        weights = {
-            "trend": 25,  "macd": 15, "adx": 10, "rsi": 10,
-            "vwap": 10,   "volume": 10, "bb": 5, "fib": 10, "mtf": 5
-        }
-
-        score += weights["trend"]
-        if (candidate == "LONG" and latest["macd_hist"] > 0) or (candidate == "SHORT" and latest["macd_hist"] < 0):
-            score += weights["macd"]
-        if latest["adx"] >= 18:
-            score += weights["adx"]
-        if (candidate == "LONG" and latest["rsi"] > 50) or (candidate == "SHORT" and latest["rsi"] < 50):
-            score += weights["rsi"]
-        if (candidate == "LONG" and latest["close"] > latest["vwap"]) or (candidate == "SHORT" and latest["close"] < latest["vwap"]):
-            score += weights["vwap"]
-
-        vol_ratio = min(MAX_VOL_RATIO, float(latest["vol_ratio"]))
-        if vol_ratio > 1.5 or float(latest["vol_z"]) > 1.0:
-            score += weights["volume"]
-
-        bb_now = float(latest["bb_bw"])
-        bb_med = float(df["bb_bw"].rolling(200).median().iloc[-1])
-        if bb_now < bb_med * 0.8:
-            if (candidate == "LONG" and latest["close"] > bb.bollinger_hband().iloc[-1]) or \
-               (candidate == "SHORT" and latest["close"] < bb.bollinger_lband().iloc[-1]):
-                score += weights["bb"]
-
-        score += weights["fib"] * float(fib_score)
-        if mtf_ok is not None and ((candidate == "LONG" and mtf_ok) or (candidate == "SHORT" and not mtf_ok)):
-            score += weights["mtf"]
+        # ==== Скоринг: тренд, MACD, ADX, RSI, VWAP, объём, BB-сжатие, фибо-откат (1H), 4H ====
+        strategy = load_strategy()
+        components = score_components(df, candidate, mtf_ok, strategy["adx_min"], strategy["fib_lookback"])
+        score = float(rule_score(components.iloc[-1:], strategy["weights"]).iloc[-1])
 
         # ==== Новостной бонус (по желанию) ====
         if news_score_provider:
@@ -182,50 +169,38 @@ def generate_signal(
             score = min(100.0, score)
 
         # ==== Модель (если есть) ====
+        # фичи из общего реестра; они же уходят в БД вместе с signal_id для переобучения
+        features = feature_values(latest, candidate)
         nn_prob = None
-        if _model_ok:
+        if bundle is not None:
             try:
-                feat_names = ["close","ema50","ema200","macd","macd_signal","rsi","vol_ratio"]
-                X = pd.DataFrame([[ 
-                    latest["close"], latest["ema50"], latest["ema200"],
-                    latest["macd"], latest["macd_signal"], latest["rsi"], vol_ratio
-                ]], columns=feat_names)
-                if hasattr(scaler, "feature_names_in_"):
-                    for col in scaler.feature_names_in_:
-                        if col not in X.columns:
-                            X[col] = 0.0
-                    X = X[scaler.feature_names_in_]
-                X_scaled = scaler.transform(X)
-                with torch.no_grad():
-                    pred = model(torch.tensor(X_scaled, dtype=torch.float32))
-                    try: pred = pred.sigmoid()
-                    except Exception: pass
-                    nn_prob = float(pred.squeeze().item())
-                if nn_prob < PROB_THRESHOLD:
+                prob_threshold = bundle.prob_threshold
+                X_scaled = bundle.scaler.transform(to_matrix(features))
+                if hasattr(bundle.model, "predict_proba"):
+                    nn_prob = float(bundle.model.predict_proba(X_scaled)[0, -1])
+                else:
+                    with torch.no_grad():
+                        pred = bundle.model(torch.tensor(X_scaled, dtype=torch.float32))
+                        try: pred = pred.sigmoid()
+                        except Exception: pass
+                        nn_prob = float(pred.squeeze().item())
+                if nn_prob < prob_threshold:
                     return {"symbol": symbol, "position": "NONE", "reason": f"low_prob:{nn_prob:.3f}"}
-                score += 10.0 * (nn_prob - PROB_THRESHOLD) / max(1e-6, 1 - PROB_THRESHOLD)
+                score += 10.0 * (nn_prob - prob_threshold) / max(1e-6, 1 - prob_threshold)
                 score = min(100.0, score)
             except Exception as e:
                 logger.warning(f"NN skipped: {e}")
                 nn_prob = None
 
         # ==== Финальное решение ====
-        if score < SCORE_THRESHOLD:
+        if score < strategy["score_threshold"]:
             return {"symbol": symbol, "position": "NONE", "reason": f"low_score:{score:.1f}"}
 
         entry = float(latest["close"])
         atr   = float(latest["atr"]) if not math.isnan(latest["atr"]) else 0.0
 
-        # Цели под 1H: держим ориентир 3–4%,
-        # но ещё сравниваем с 2*ATR, чтобы на «тихих» инструментах цель не была слишком маленькой.
-        pct_tp = 0.035   # 3.5% средняя цель
-        pct_sl = 0.015   # 1.5% защитный стоп (RR около 2)
-        if candidate == "LONG":
-            tp = max(entry * (1 + pct_tp), entry + 2 * atr)
-            sl = min(entry * (1 - pct_sl), entry - 1 * atr)
-        else:
-            tp = min(entry * (1 - pct_tp), entry - 2 * atr)
-            sl = max(entry * (1 + pct_sl), entry + 1 * atr)
+        # Цели: 3.5% / 1.5% (или подобранные), но не ближе 2 / 1 ATR (core/risk_manager.py — те же правила у разметки истории)
+        tp, sl = tp_sl_levels(entry, atr, candidate, strategy["pct_tp"], strategy["pct_sl"])
 
         out = {
             "symbol": symbol,
@@ -236,6 +211,8 @@ def generate_signal(
             "confidence": round((nn_prob or 0.8) * 100, 2),
             "score": round(score, 1),
             "timeframe": "1H",
+            "features": features,
+            "model_version": bundle.version if bundle else None,
         }
         logger.info(f"[{symbol}] {candidate} score={score:.1f} entry={out['entry']} tp={out['tp']} sl={out['sl']}")
         return out
@@ -0,0 +1,57 @@
+# core/strategy_params.py — веса скоринга, порог и цели TP/SL правил generate_signal
+#
+# Значения по умолчанию — прежние ручные константы; подобранные
+# train/walk_forward.py лежат в model/strategy_params.json. generate_signal
+# читает их на каждом символе, поэтому файл перечитывается только при смене mtime.
+import json
+import os
+from typing import Dict, Optional
+
+from core.risk_manager import PCT_SL, PCT_TP
+
+PARAMS_PATH = os.path.join("model", "strategy_params.json")
+
+DEFAULT_PARAMS = {
+    "weights": {
+        "trend": 25,  "macd": 15, "adx": 10, "rsi": 10,
+        "vwap": 10,   "volume": 10, "bb": 5, "fib": 10, "mtf": 5
+    },
+    "score_threshold": 75,   # чуть выше, т.к. хотим избирательность на 1H
+    "adx_min": 18,           # ADX от этого значения — тренд есть
+    "fib_lookback": 180,     # баров 1H для свинга фибо-отката
+    "pct_tp": PCT_TP,
+    "pct_sl": PCT_SL,
+}
+
+_cache: Dict = {"mtime": None, "params": None}
+
+
+def _merge(saved: Dict) -> Dict:
+    params = {**DEFAULT_PARAMS, **{k: v for k, v in saved.items() if k in DEFAULT_PARAMS}}
+    params["weights"] = {**DEFAULT_PARAMS["weights"],
+                         **{k: v for k, v in (saved.get("weights") or {}).items() if k in DEFAULT_PARAMS["weights"]}}
+    return params
+
+
+def load_params() -> Dict:
+    try:
+        mtime: Optional[float] = os.path.getmtime(PARAMS_PATH)
+    except OSError:
+        mtime = None
+    if _cache["params"] is None or _cache["mtime"] != mtime:
+        try:
+            with open(PARAMS_PATH, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception:
+            saved = {}
+        _cache.update(mtime=mtime, params=_merge(saved))
+    return _cache["params"]
+
+
+def save_params(params: Dict, **extra):
+    """Сохранить подобранные параметры (extra — справочная информация: окна, метрики, дата)."""
+    os.makedirs(os.path.dirname(PARAMS_PATH), exist_ok=True)
+    tmp = PARAMS_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**_merge(params), **extra}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, PARAMS_PATH)
@@ -0,0 +1,81 @@
+# db/async_database.py — async-обёртка над db/database.py для хэндлеров aiogram
+#
+# Все запросы уходят в один выделенный поток БД (ThreadPoolExecutor с одним
+# воркером = поток + очередь запросов), event loop никогда не ждёт SQLite.
+# Имена те же, что в db.database, только awaitable:
+#     from db.async_database import has_active_subscription
+#     ok = await has_active_subscription(user_id)
+# Несколько мелких запросов — за один заход в поток БД:
+#     paid, settings = await batch(
+#         (autotrade_paid, user_id),
+#         (get_user_settings, user_id),
+#     )
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+
+from db import database
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run(fn: Callable, *args, **kwargs) -> Any:
+    """Выполнить любую синхронную функцию в потоке БД."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _wrap(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+def _run_batch(calls: List[Tuple]) -> List[Any]:
+    out = []
+    for fn, *args in calls:
+        # можно передавать и async-обёртки из этого модуля, и исходные функции
+        out.append(getattr(fn, "__wrapped__", fn)(*args))
+    return out
+
+
+async def batch(*calls: Tuple) -> List[Any]:
+    """Пачка вызовов (fn, *args) за одну поездку в поток БД; результаты в том же порядке."""
+    return await run(_run_batch, list(calls))
+
+
+def shutdown():
+    _executor.shutdown(wait=True)
+
+
+# ---------- awaitable-эквиваленты db.database ----------
+init_db = _wrap(database.init_db)
+add_user = _wrap(database.add_user)
+has_active_subscription = _wrap(database.has_active_subscription)
+get_subscription_expiry = _wrap(database.get_subscription_expiry)
+get_active_subscriber_ids = _wrap(database.get_active_subscriber_ids)
+get_autotrade_user_ids = _wrap(database.get_autotrade_user_ids)
+activate_subscription = _wrap(database.activate_subscription)
+autotrade_paid = _wrap(database.autotrade_paid)
+set_autotrade_paid = _wrap(database.set_autotrade_paid)
+autotrade_enabled = _wrap(database.autotrade_enabled)
+toggle_autotrade = _wrap(database.toggle_autotrade)
+set_api_keys = _wrap(database.set_api_keys)
+get_api_keys = _wrap(database.get_api_keys)
+prefetch_autotrade_keys = _wrap(database.prefetch_autotrade_keys)
+delete_api_keys = _wrap(database.delete_api_keys)
+get_user_settings = _wrap(database.get_user_settings)
+update_user_settings = _wrap(database.update_user_settings)
+_get_user_profile = _wrap(database.get_user_profile)
+
+
+async def get_user_profile(user_id: int) -> dict:
+    # попадание в кэш профиля отдаём сразу, без похода в поток БД
+    cached = database.peek_user_profile(user_id)
+    if cached is not None:
+        return cached
+    return await _get_user_profile(user_id)
+
+get_user_profile.__wrapped__ = database.get_user_profile
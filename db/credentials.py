@@ -0,0 +1,137 @@
+# db/credentials.py — кэш расшифрованных API-ключей (TTL + LRU + затирание)
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Iterable, Optional, Tuple
+
+CRED_TTL = 300        # сек — сколько держим ключи в памяти
+CRED_MAX_USERS = 512  # сверх лимита выкидываем давно не использованных (LRU)
+
+
+class _Secret:
+    """
+    Строка в изменяемом буфере, чтобы при выселении затереть байты нулями.
+    Важно: str, который отдаёт reveal(), Python затереть не даст — вызывающий
+    код должен держать его как можно меньше (использовать и отпустить).
+    """
+    __slots__ = ("_buf",)
+
+    def __init__(self, text: str):
+        self._buf = bytearray(text.encode())
+
+    def reveal(self) -> str:
+        return self._buf.decode()
+
+    def wipe(self):
+        self._buf[:] = bytes(len(self._buf))
+
+
+class _Entry:
+    __slots__ = ("enc", "key", "secret", "expires_at")
+
+    def __init__(self, enc: Optional[Tuple[str, str]], expires_at: float):
+        self.enc = enc          # (api_key, api_secret) в зашифрованном виде, None = ключей нет
+        self.key: Optional[_Secret] = None
+        self.secret: Optional[_Secret] = None
+        self.expires_at = expires_at
+
+    def wipe(self):
+        for s in (self.key, self.secret):
+            if s is not None:
+                s.wipe()
+        self.key = self.secret = None
+        self.enc = None
+
+
+class CredentialCache:
+    """
+    user_id -> ключи. Шифротекст берётся из БД (по одному или пачкой через prefetch),
+    расшифровка — лениво, при первом get(). После TTL/выселения/invalidate
+    расшифрованные байты затираются; истёкшие записи выметаются на каждом
+    get/prefetch, а не только когда к ним снова обратятся.
+    """
+    def __init__(self, ttl: float = CRED_TTL, max_users: int = CRED_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # TTL у всех один — очередь записей в порядке создания = в порядке истечения
+        self._expiry: "deque[Tuple[int, _Entry]]" = deque()
+        self._epoch = 0   # растёт на invalidate/clear — загрузка, начатая раньше, в кэш не попадёт
+        self._lock = threading.Lock()
+
+    def _put(self, user_id: int, enc: Optional[Tuple[str, str]]):
+        old = self._entries.pop(user_id, None)
+        if old is not None:
+            old.wipe()
+        entry = _Entry(enc, time.monotonic() + self.ttl)
+        self._entries[user_id] = entry
+        self._expiry.append((user_id, entry))
+        while len(self._entries) > self.max_users:
+            _, evicted = self._entries.popitem(last=False)
+            evicted.wipe()
+
+    def _sweep(self, now: float):
+        """Затереть и убрать все истёкшие записи (O(числа истёкших))."""
+        while self._expiry and self._expiry[0][1].expires_at <= now:
+            user_id, entry = self._expiry.popleft()
+            if self._entries.get(user_id) is entry:
+                del self._entries[user_id]
+            entry.wipe()
+
+    @staticmethod
+    def _reveal(entry: _Entry, decrypt: Callable[[str], str]):
+        if entry.enc is None and entry.key is None:
+            return None, None
+        if entry.key is None:
+            entry.key = _Secret(decrypt(entry.enc[0]))
+            entry.secret = _Secret(decrypt(entry.enc[1]))
+            entry.enc = None  # шифротекст больше не нужен
+        return entry.key.reveal(), entry.secret.reveal()
+
+    def get(self, user_id: int,
+            load_encrypted: Callable[[int], Optional[Tuple[str, str]]],
+            decrypt: Callable[[str], str]):
+        """(api_key, api_secret) или (None, None), если ключей нет."""
+        while True:
+            with self._lock:
+                self._sweep(time.monotonic())
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    self._entries.move_to_end(user_id)
+                    return self._reveal(entry, decrypt)
+                epoch = self._epoch
+            # запрос в БД — без общего замка: промах одного пользователя не держит остальных
+            enc = load_encrypted(user_id)
+            with self._lock:
+                if self._epoch == epoch:
+                    self._put(user_id, enc)
+                    return self._reveal(self._entries[user_id], decrypt)
+            # пока читали, ключи сменили или удалили (invalidate) — читаем заново
+
+    def prefetch(self, rows: Iterable[Tuple[int, str, str]]) -> int:
+        """Положить в кэш шифротексты пачкой (без расшифровки). Уже закэшированных не трогаем."""
+        n = 0
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            for user_id, enc_key, enc_secret in rows:
+                if user_id in self._entries:
+                    continue
+                self._put(user_id, (enc_key, enc_secret))
+                n += 1
+        return n
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._epoch += 1
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                entry.wipe()
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            for entry in self._entries.values():
+                entry.wipe()
+            self._entries.clear()
+            self._expiry.clear()
@@ -1,10 +1,13 @@
 # db/database.py — расширенная версия (подписки + автоторговля + настройки)
 
-import sqlite3
 import os
+import time
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
 
+from db.pool import ConnectionPool
+from db.credentials import CredentialCache
+
 DB_FILE = "database.db"
 KEY_FILE = "db_secret.key"
 
@@ -25,20 +28,46 @@ def decrypt(token: str) -> str:
     return fernet.decrypt(token.encode()).decode()
 
 # ----------------- Вспомогательное -----------------
-def _connect():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+_db_pool = None
+
+def _pool() -> ConnectionPool:
+    """Пул создаётся лениво — при первом обращении к БД."""
+    global _db_pool
+    if _db_pool is None:
+        _db_pool = ConnectionPool(DB_FILE)
+    return _db_pool
+
+def connection():
+    """Соединение из пула на время блока (для чтений): `with connection() as conn: ...`."""
+    return _pool().connection()
+
+def transaction():
+    """Запись одной транзакцией: `with transaction() as c: c.execute(...)`."""
+    return _pool().transaction()
+
+def _parse_ts(val):
+    if not val:
+        return None
+    try:
+        return datetime.strptime(val, "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return None
+
+def _to_epoch(dt):
+    return int(dt.timestamp()) if dt else None
+
+def _from_epoch(ts):
+    return datetime.fromtimestamp(ts) if ts else None
 
 def _column_exists(cursor, table: str, col: str) -> bool:
     cursor.execute(f"PRAGMA table_info({table})")
     return any(r[1] == col for r in cursor.fetchall())
 
 # ----------------- Инициализация / миграции -----------------
-def init_db():
-    conn = _connect()
-    c = conn.cursor()
+# Версия схемы хранится в PRAGMA user_version; каждая миграция применяется
+# ровно один раз, в своей транзакции. Новые изменения — только новой функцией в конце MIGRATIONS.
 
+def _m1_base_schema(c):
     # users (твоя текущая схема + мягкие миграции)
     c.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -50,7 +79,7 @@ def init_db():
             trading_enabled INTEGER DEFAULT 0
         )
     """)
-    # добавим безопасно новые колонки при необходимости
+    # совсем старые базы (до user_version) могли быть без этих колонок
     if not _column_exists(c, "users", "subscription_type"):
         c.execute("ALTER TABLE users ADD COLUMN subscription_type TEXT")
     if not _column_exists(c, "users", "subscription_end"):
@@ -104,44 +133,169 @@ def init_db():
         )
     """)
 
-    conn.commit()
-    conn.close()
+
+def _m2_epoch_expiry(c):
+    """Сроки подписки/автоторговли как int (unix time) + индексы под выборку аудитории."""
+    c.execute("ALTER TABLE users ADD COLUMN subscription_end_ts INTEGER")
+    c.execute("ALTER TABLE autotrade_addon ADD COLUMN paid_until_ts INTEGER")
+
+    c.execute("SELECT user_id, subscription_end FROM users WHERE subscription_end IS NOT NULL")
+    for r in c.fetchall():
+        ts = _to_epoch(_parse_ts(r["subscription_end"]))
+        c.execute("UPDATE users SET subscription_end_ts = ? WHERE user_id = ?", (ts, r["user_id"]))
+    c.execute("SELECT user_id, paid_until FROM autotrade_addon WHERE paid_until IS NOT NULL")
+    for r in c.fetchall():
+        ts = _to_epoch(_parse_ts(r["paid_until"]))
+        c.execute("UPDATE autotrade_addon SET paid_until_ts = ? WHERE user_id = ?", (ts, r["user_id"]))
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_sub_end_ts ON users(subscription_end_ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_addon_enabled_paid ON autotrade_addon(is_enabled, paid_until_ts)")
+
+
+def _m3_history_tables(c):
+    """История сигналов и сделок (раньше — signals_log.csv / trades_log.csv) + разовый импорт CSV."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS signals (
+            signal_id TEXT PRIMARY KEY,
+            ts TEXT,                -- 'YYYY-MM-DD HH:MM:SS'
+            symbol TEXT,
+            position TEXT,
+            entry REAL, sl REAL, tp REAL,
+            score REAL, confidence REAL, rr_ratio REAL,
+            timeframe TEXT,
+            extras TEXT,            -- JSON
+            leverage REAL, risk_pct REAL,
+            quality TEXT
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS trades (
+            signal_id TEXT PRIMARY KEY,
+            symbol TEXT,
+            position TEXT,
+            entry REAL, tp REAL, sl REAL,
+            risk_pct REAL, leverage REAL, rr_ratio REAL,
+            opened_at TEXT,
+            closed_at TEXT,         -- 'YYYY-MM-DD HH:MM:SS'
+            status TEXT,            -- TP|SL|MANUAL
+            closed_price REAL,
+            pnl_pct REAL,
+            rr_real REAL,
+            notes TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_signals_symbol_ts ON signals(symbol, ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol ON trades(symbol)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_closed_at ON trades(closed_at)")
+
+    from db.import_logs import import_csv_logs
+    import_csv_logs(c)
+
+
+def _m4_signal_features(c):
+    """Фичи модели, посчитанные в момент сигнала (core/features.py), — для переобучения без пересчёта."""
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS signal_features (
+            signal_id TEXT PRIMARY KEY,
+            ts TEXT,                -- 'YYYY-MM-DD HH:MM:SS'
+            version INTEGER,        -- FEATURE_VERSION реестра
+            features TEXT           -- JSON {имя: значение}
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_signal_features_ts ON signal_features(ts)")
+
+
+def _m5_change_seq(c):
+    """
+    seq — номер последнего изменения строки (растёт при каждой вставке и обновлении):
+    выгрузка в датасет (train/dataset.sync_history) идёт по нему, а не по ts/closed_at —
+    задним числом закрытые сделки и дополненные сигналы тоже попадают в выгрузку.
+    """
+    for table in ("signals", "trades", "signal_features"):
+        c.execute(f"ALTER TABLE {table} ADD COLUMN seq INTEGER")
+        c.execute(f"UPDATE {table} SET seq = rowid")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_seq ON {table}(seq)")
+        bump = f"UPDATE {table} SET seq = (SELECT COALESCE(MAX(seq), 0) + 1 FROM {table}) WHERE rowid = NEW.rowid"
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_seq_ins AFTER INSERT ON {table} BEGIN {bump}; END")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_seq_upd AFTER UPDATE ON {table} "
+                  f"WHEN NEW.seq IS OLD.seq BEGIN {bump}; END")
+
+
+def _m6_trade_levels_from_signals(c):
+    """Импортированные сделки без entry/sl/… (старая раскладка trades_log.csv) — дополнить из signals."""
+    from db.import_logs import fill_trades_from_signals
+    fill_trades_from_signals(c)
+
+
+MIGRATIONS = [
+    _m1_base_schema,
+    _m2_epoch_expiry,
+    _m3_history_tables,
+    _m4_signal_features,
+    _m5_change_seq,
+    _m6_trade_levels_from_signals,
+]
+
+def init_db():
+    with _pool().connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for n, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+        with transaction() as c:
+            migrate(c)
+            c.execute(f"PRAGMA user_version = {n}")
+        print(f"🛠 Миграция БД #{n}: {migrate.__name__}")
     print("✅ База данных и таблицы инициализированы")
 
 # ----------------- Пользователи -----------------
 def add_user(user_id: int, username: str):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
-    if c.fetchone() is None:
-        c.execute("""
-            INSERT INTO users (user_id, username, join_date, subscription_type, subscription_end, trading_enabled)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, username, _now(), "none", None, 0))
-        # создать базовые записи под настройки/автоторговлю
-        c.execute("INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,))
-        c.execute("INSERT OR IGNORE INTO autotrade_addon (user_id, paid_until, is_enabled) VALUES (?, ?, ?)",
-                  (user_id, None, 0))
-        conn.commit()
-        print(f"👤 Пользователь {username} добавлен в базу.")
-    conn.close()
+    with transaction() as c:
+        c.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
+        if c.fetchone() is None:
+            c.execute("""
+                INSERT INTO users (user_id, username, join_date, subscription_type, subscription_end, trading_enabled)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user_id, username, _now(), "none", None, 0))
+            # создать базовые записи под настройки/автоторговлю
+            c.execute("INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,))
+            c.execute("INSERT OR IGNORE INTO autotrade_addon (user_id, paid_until, is_enabled) VALUES (?, ?, ?)",
+                      (user_id, None, 0))
+            print(f"👤 Пользователь {username} добавлен в базу.")
+    invalidate_user_profile(user_id)
 
 def has_active_subscription(user_id: int) -> bool:
-    end = get_subscription_expiry(user_id)
-    return (end is not None) and (end > datetime.now())
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM users WHERE user_id = ? AND subscription_end_ts > ?",
+                  (user_id, int(time.time())))
+        return c.fetchone() is not None
 
 def get_subscription_expiry(user_id: int):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT subscription_end FROM users WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    if row and row["subscription_end"]:
-        try:
-            return datetime.strptime(row["subscription_end"], "%Y-%m-%d %H:%M:%S")
-        except Exception:
-            return None
-    return None
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT subscription_end_ts FROM users WHERE user_id = ?", (user_id,))
+        row = c.fetchone()
+    return _from_epoch(row["subscription_end_ts"]) if row else None
+
+# ----------------- Аудитория (массовые выборки по индексам) -----------------
+def get_active_subscriber_ids() -> list:
+    """Все user_id с действующей подпиской — один range scan по idx_users_sub_end_ts."""
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT user_id FROM users WHERE subscription_end_ts > ?", (int(time.time()),))
+        return [r["user_id"] for r in c.fetchall()]
+
+def get_autotrade_user_ids() -> list:
+    """Включили автоторговлю, оплатили её и имеют активную подписку — по idx_addon_enabled_paid."""
+    now = int(time.time())
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT a.user_id
+            FROM autotrade_addon a
+            JOIN users u ON u.user_id = a.user_id
+            WHERE a.is_enabled = 1 AND a.paid_until_ts > ? AND u.subscription_end_ts > ?
+        """, (now, now))
+        return [r["user_id"] for r in c.fetchall()]
 
 # ----------------- Подписки (сигналы) -----------------
 def _now() -> str:
@@ -168,120 +322,187 @@ def activate_subscription(user_id: int, plan: str, amount: float = 0.0):
     start = datetime.now()
     end = start + delta
 
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("""
-        UPDATE users
-        SET subscription_type = ?, subscription_end = ?
-        WHERE user_id = ?
-    """, (plan, end.strftime("%Y-%m-%d %H:%M:%S"), user_id))
+    with transaction() as c:
+        c.execute("""
+            UPDATE users
+            SET subscription_type = ?, subscription_end = ?, subscription_end_ts = ?
+            WHERE user_id = ?
+        """, (plan, end.strftime("%Y-%m-%d %H:%M:%S"), _to_epoch(end), user_id))
 
-    c.execute("""
-        INSERT INTO payments (user_id, amount, tariff, start_date, end_date)
-        VALUES (?, ?, ?, ?, ?)
-    """, (user_id, amount, tariff_label, start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")))
-    conn.commit()
-    conn.close()
+        c.execute("""
+            INSERT INTO payments (user_id, amount, tariff, start_date, end_date)
+            VALUES (?, ?, ?, ?, ?)
+        """, (user_id, amount, tariff_label, start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")))
+    invalidate_user_profile(user_id)
 
 # ----------------- Автоторговля: оплата и тумблер -----------------
 def autotrade_paid(user_id: int) -> bool:
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT paid_until FROM autotrade_addon WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    if row and row["paid_until"]:
-        try:
-            return datetime.strptime(row["paid_until"], "%Y-%m-%d %H:%M:%S") > datetime.now()
-        except Exception:
-            return False
-    return False
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM autotrade_addon WHERE user_id = ? AND paid_until_ts > ?",
+                  (user_id, int(time.time())))
+        return c.fetchone() is not None
 
 def set_autotrade_paid(user_id: int, days: int):
     """Оплатить автоторговлю на N дней (напр., days=30)."""
     start = datetime.now()
     end = start + timedelta(days=days)
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO autotrade_addon (user_id, paid_until, is_enabled) VALUES (?, ?, ?)",
-              (user_id, None, 0))
-    c.execute("UPDATE autotrade_addon SET paid_until = ? WHERE user_id = ?",
-              (end.strftime("%Y-%m-%d %H:%M:%S"), user_id))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO autotrade_addon (user_id, paid_until, is_enabled) VALUES (?, ?, ?)",
+                  (user_id, None, 0))
+        c.execute("UPDATE autotrade_addon SET paid_until = ?, paid_until_ts = ? WHERE user_id = ?",
+                  (end.strftime("%Y-%m-%d %H:%M:%S"), _to_epoch(end), user_id))
+    invalidate_user_profile(user_id)
 
 def autotrade_enabled(user_id: int) -> bool:
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT is_enabled FROM autotrade_addon WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT is_enabled FROM autotrade_addon WHERE user_id = ?", (user_id,))
+        row = c.fetchone()
     return bool(row and row["is_enabled"])
 
 def toggle_autotrade(user_id: int, enable: bool):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO autotrade_addon (user_id, paid_until, is_enabled) VALUES (?, ?, ?)",
-              (user_id, None, 0))
-    c.execute("UPDATE autotrade_addon SET is_enabled = ? WHERE user_id = ?", (1 if enable else 0, user_id))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO autotrade_addon (user_id, paid_until, is_enabled) VALUES (?, ?, ?)",
+                  (user_id, None, 0))
+        c.execute("UPDATE autotrade_addon SET is_enabled = ? WHERE user_id = ?", (1 if enable else 0, user_id))
+    invalidate_user_profile(user_id)
 
 # ----------------- API ключи (Bybit) -----------------
+_credentials = CredentialCache()
+
 def set_api_keys(user_id: int, api_key: str, api_secret: str):
-    conn = _connect()
-    c = conn.cursor()
-    enc_key = encrypt(api_key)
-    enc_secret = encrypt(api_secret)
-    c.execute("""
-        INSERT OR REPLACE INTO api_keys (user_id, api_key, api_secret, created_at)
-        VALUES (?, ?, ?, ?)
-    """, (user_id, enc_key, enc_secret, _now()))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        enc_key = encrypt(api_key)
+        enc_secret = encrypt(api_secret)
+        c.execute("""
+            INSERT OR REPLACE INTO api_keys (user_id, api_key, api_secret, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, enc_key, enc_secret, _now()))
+    _credentials.invalidate(user_id)
     print(f"🔑 API ключи сохранены для пользователя {user_id}")
 
+def _load_encrypted_keys(user_id: int):
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT api_key, api_secret FROM api_keys WHERE user_id = ?", (user_id,))
+        row = c.fetchone()
+    return (row["api_key"], row["api_secret"]) if row else None
+
 def get_api_keys(user_id: int):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT api_key, api_secret FROM api_keys WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        return decrypt(row["api_key"]), decrypt(row["api_secret"])
-    return None, None
+    """Из кэша (TTL/LRU); в БД и Fernet идём только на промахе."""
+    return _credentials.get(user_id, _load_encrypted_keys, decrypt)
+
+def prefetch_autotrade_keys() -> int:
+    """Перед сканом: шифротексты ключей всей автоторговой аудитории одним запросом."""
+    now = int(time.time())
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT k.user_id, k.api_key, k.api_secret
+            FROM autotrade_addon a
+            JOIN users u    ON u.user_id = a.user_id
+            JOIN api_keys k ON k.user_id = a.user_id
+            WHERE a.is_enabled = 1 AND a.paid_until_ts > ? AND u.subscription_end_ts > ?
+        """, (now, now))
+        rows = [(r["user_id"], r["api_key"], r["api_secret"]) for r in c.fetchall()]
+    return _credentials.prefetch(rows)
 
 def delete_api_keys(user_id: int):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("DELETE FROM api_keys WHERE user_id = ?", (user_id,))
-    c.execute("UPDATE users SET trading_enabled = 0 WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("DELETE FROM api_keys WHERE user_id = ?", (user_id,))
+        c.execute("UPDATE users SET trading_enabled = 0 WHERE user_id = ?", (user_id,))
+    _credentials.invalidate(user_id)
     print(f"❌ API ключи удалены для пользователя {user_id}")
 
 # ----------------- Настройки пользователя (риск/плечо/режимы) -----------------
 def get_user_settings(user_id: int) -> dict:
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM user_settings WHERE user_id = ?", (user_id,))
+        row = c.fetchone()
     if not row:
         return {"risk_pct": 1.0, "leverage": 5, "margin_mode": "ISOLATED", "position_mode": "ONEWAY"}
     return dict(row)
 
 def update_user_settings(user_id: int, *, risk_pct=None, leverage=None, margin_mode=None, position_mode=None):
-    conn = _connect()
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,))
-    if risk_pct is not None:
-        c.execute("UPDATE user_settings SET risk_pct = ? WHERE user_id = ?", (float(risk_pct), user_id))
-    if leverage is not None:
-        c.execute("UPDATE user_settings SET leverage = ? WHERE user_id = ?", (int(leverage), user_id))
-    if margin_mode is not None:
-        c.execute("UPDATE user_settings SET margin_mode = ? WHERE user_id = ?", (str(margin_mode), user_id))
-    if position_mode is not None:
-        c.execute("UPDATE user_settings SET position_mode = ? WHERE user_id = ?", (str(position_mode), user_id))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO user_settings (user_id) VALUES (?)", (user_id,))
+        if risk_pct is not None:
+            c.execute("UPDATE user_settings SET risk_pct = ? WHERE user_id = ?", (float(risk_pct), user_id))
+        if leverage is not None:
+            c.execute("UPDATE user_settings SET leverage = ? WHERE user_id = ?", (int(leverage), user_id))
+        if margin_mode is not None:
+            c.execute("UPDATE user_settings SET margin_mode = ? WHERE user_id = ?", (str(margin_mode), user_id))
+        if position_mode is not None:
+            c.execute("UPDATE user_settings SET position_mode = ? WHERE user_id = ?", (str(position_mode), user_id))
+    invalidate_user_profile(user_id)
+
+# ----------------- Профиль пользователя (кэш для меню) -----------------
+PROFILE_TTL = 60  # сек; записи выше сбрасывают кэш явно, TTL — страховка
+
+DEFAULT_SETTINGS = {"risk_pct": 1.0, "leverage": 5, "margin_mode": "ISOLATED", "position_mode": "ONEWAY"}
+
+_profile_cache: dict = {}  # user_id -> (expires_at, profile)
+
+def _load_user_profile(user_id: int) -> dict:
+    """Подписка, доплата за автоторговлю и настройки — одним запросом."""
+    with _pool().connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT u.subscription_type, u.subscription_end_ts,
+                   a.paid_until_ts, a.is_enabled,
+                   s.risk_pct, s.leverage, s.margin_mode, s.position_mode
+            FROM (SELECT ? AS uid) q
+            LEFT JOIN users u           ON u.user_id = q.uid
+            LEFT JOIN autotrade_addon a ON a.user_id = q.uid
+            LEFT JOIN user_settings s   ON s.user_id = q.uid
+        """, (user_id,))
+        row = c.fetchone()
+
+    now = datetime.now()
+    sub_end = _from_epoch(row["subscription_end_ts"])
+    paid_until = _from_epoch(row["paid_until_ts"])
+    settings = dict(DEFAULT_SETTINGS)
+    if row["risk_pct"] is not None:
+        settings = {k: row[k] for k in DEFAULT_SETTINGS}
+    return {
+        "user_id": user_id,
+        "subscription_type": row["subscription_type"],
+        "subscription_end": sub_end,
+        "has_subscription": bool(sub_end and sub_end > now),
+        "autotrade_paid_until": paid_until,
+        "autotrade_paid": bool(paid_until and paid_until > now),
+        "autotrade_enabled": bool(row["is_enabled"]),
+        "settings": settings,
+    }
+
+def get_user_profile(user_id: int) -> dict:
+    """
+    Профиль для отрисовки меню. Кэшируется на PROFILE_TTL, но не дольше,
+    чем до ближайшего истечения подписки/автоторговли — флаги не протухают.
+    """
+    cached = peek_user_profile(user_id)
+    if cached is not None:
+        return cached
+
+    now = time.monotonic()
+    profile = _load_user_profile(user_id)
+    ttl = float(PROFILE_TTL)
+    for end in (profile["subscription_end"], profile["autotrade_paid_until"]):
+        if end:
+            left = (end - datetime.now()).total_seconds()
+            if left > 0:
+                ttl = min(ttl, left)
+    _profile_cache[user_id] = (now + ttl, profile)
+    return profile
+
+def peek_user_profile(user_id: int):
+    """Профиль из кэша без запроса в БД (None — промах или протух)."""
+    hit = _profile_cache.get(user_id)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    return None
+
+def invalidate_user_profile(user_id: int):
+    _profile_cache.pop(user_id, None)
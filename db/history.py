@@ -0,0 +1,192 @@
+# db/history.py — история сигналов и сделок в SQLite (таблицы signals / trades)
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from db.database import connection, transaction
+
+# колонки таблиц (порядок = порядок в CREATE TABLE, см. миграцию в db/database.py)
+SIGNAL_COLUMNS = [
+    "signal_id", "ts", "symbol", "position", "entry", "sl", "tp",
+    "score", "confidence", "rr_ratio", "timeframe", "extras",
+    "leverage", "risk_pct", "quality",
+]
+TRADE_COLUMNS = [
+    "signal_id", "symbol", "position", "entry", "tp", "sl", "risk_pct", "leverage", "rr_ratio",
+    "opened_at", "closed_at", "status", "closed_price", "pnl_pct", "rr_real", "notes",
+]
+
+FEATURE_COLUMNS = ["signal_id", "ts", "version", "features"]
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def norm_ts(val) -> Optional[str]:
+    """Любая дата из логов -> 'YYYY-MM-DD HH:MM:SS' (сортируется как строка, работает с индексом)."""
+    if val is None or val == "":
+        return None
+    if isinstance(val, datetime):
+        return val.strftime(TS_FORMAT)
+    try:
+        return datetime.fromisoformat(str(val)).strftime(TS_FORMAT)
+    except Exception:
+        try:
+            return datetime.strptime(str(val), TS_FORMAT).strftime(TS_FORMAT)
+        except Exception:
+            return None
+
+
+def _signal_values(row: Dict) -> Dict:
+    out = {k: row[k] for k in SIGNAL_COLUMNS if row.get(k) is not None and row.get(k) != ""}
+    if "ts" in out:
+        out["ts"] = norm_ts(out["ts"])
+    if "extras" in out and not isinstance(out["extras"], str):
+        out["extras"] = json.dumps(out["extras"], ensure_ascii=False)
+    return out
+
+
+def _trade_values(row: Dict) -> Dict:
+    out = {k: None if row.get(k) == "" else row.get(k) for k in TRADE_COLUMNS}
+    out["opened_at"] = norm_ts(out["opened_at"])
+    out["closed_at"] = norm_ts(out["closed_at"])
+    return out
+
+
+# ---------- запись ----------
+
+def upsert_signal(row: Dict, cursor=None):
+    """
+    Вставка/дополнение сигнала по signal_id: пишутся только переданные непустые поля,
+    поэтому разные места (датасет, текстовый лог) дополняют одну и ту же строку.
+    """
+    vals = _signal_values(row)
+    if not vals.get("signal_id"):
+        raise ValueError("signal_id is required")
+    cols = list(vals)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c != "signal_id") or "signal_id = signal_id"
+    sql = (
+        f"INSERT INTO signals ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+        f"ON CONFLICT(signal_id) DO UPDATE SET {updates}"
+    )
+    if cursor is not None:
+        cursor.execute(sql, [vals[c] for c in cols])
+        return
+    with transaction() as c:
+        c.execute(sql, [vals[c] for c in cols])
+
+
+def insert_trade(row: Dict, cursor=None):
+    """
+    Закрытая сделка. Повторное закрытие того же signal_id обновляет строку, но пустые
+    поля новой записи старые не затирают: строка трекера (position/entry/tp/sl/...) и
+    строка датасета (без них) дополняют друг друга в любом порядке.
+    """
+    vals = _trade_values(row)
+    updates = ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in TRADE_COLUMNS if c != "signal_id")
+    sql = (
+        f"INSERT INTO trades ({', '.join(TRADE_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(TRADE_COLUMNS))}) "
+        f"ON CONFLICT(signal_id) DO UPDATE SET {updates}"
+    )
+    if cursor is not None:
+        cursor.execute(sql, [vals[c] for c in TRADE_COLUMNS])
+        return
+    with transaction() as c:
+        c.execute(sql, [vals[c] for c in TRADE_COLUMNS])
+
+
+def upsert_features(row: Dict, cursor=None):
+    """Фичи сигнала (signal_id, ts, version, features — dict или JSON)."""
+    feats = row.get("features")
+    vals = (
+        row["signal_id"], norm_ts(row.get("ts")), row.get("version"),
+        feats if isinstance(feats, str) else json.dumps(feats),
+    )
+    sql = "INSERT OR REPLACE INTO signal_features (signal_id, ts, version, features) VALUES (?, ?, ?, ?)"
+    if cursor is not None:
+        cursor.execute(sql, vals)
+        return
+    with transaction() as c:
+        c.execute(sql, vals)
+
+
+# ---------- чтение ----------
+
+def count_trades() -> int:
+    with connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+
+def trade_changes(after_seq: int = 0) -> List[Dict]:
+    """Сделки, вставленные или изменённые после after_seq (seq — db/database._m5_change_seq), по порядку."""
+    with connection() as conn:
+        rows = conn.execute("SELECT * FROM trades WHERE seq > ? ORDER BY seq", (after_seq,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def iter_trades(since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict]:
+    """Сделки по closed_at в [since, until) — range scan по idx_trades_closed_at."""
+    sql = "SELECT * FROM trades WHERE closed_at IS NOT NULL"
+    args: List = []
+    if since:
+        sql += " AND closed_at >= ?"
+        args.append(norm_ts(since))
+    if until:
+        sql += " AND closed_at < ?"
+        args.append(norm_ts(until))
+    sql += " ORDER BY closed_at"
+    with connection() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    for r in rows:
+        yield dict(r)
+
+
+def recent_outcomes(limit: int = 1000) -> List[Dict]:
+    """
+    Последние закрытые сделки с известным PnL: entry, sl, pnl_pct (для симуляции риска).
+    Пустые entry/sl сделки берём из её сигнала — у импортированных из старых логов их нет.
+    """
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT COALESCE(t.entry, s.entry) AS entry, COALESCE(t.sl, s.sl) AS sl, t.pnl_pct "
+            "FROM trades t LEFT JOIN signals s ON s.signal_id = t.signal_id "
+            "WHERE t.closed_at IS NOT NULL AND t.pnl_pct IS NOT NULL "
+            "ORDER BY t.closed_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def trades_for_symbol(symbol: str, limit: int = 100) -> List[Dict]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM trades WHERE symbol = ? ORDER BY closed_at DESC LIMIT ?", (symbol, limit)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def signals_for_symbol(symbol: str, limit: int = 100) -> List[Dict]:
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT * FROM signals WHERE symbol = ? ORDER BY ts DESC LIMIT ?", (symbol, limit)
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def training_rows(since: Optional[str] = None) -> List[Dict]:
+    """
+    Сигналы с известным исходом (signals ⋈ trades по signal_id) — для переобучения.
+    Колонки сигнала как есть + исход сделки: status, closed_price, pnl_pct, closed_at.
+    """
+    sql = """
+        SELECT s.*, t.status, t.closed_price, t.pnl_pct, t.closed_at
+        FROM trades t
+        JOIN signals s ON s.signal_id = t.signal_id
+    """
+    args: List = []
+    if since:
+        sql += " WHERE t.closed_at >= ?"
+        args.append(norm_ts(since))
+    sql += " ORDER BY t.closed_at"
+    with connection() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return [dict(r) for r in rows]
@@ -0,0 +1,138 @@
+# db/import_logs.py — разовый перенос signals_log.csv / trades_log.csv в SQLite
+#
+# Вызывается миграцией, создающей таблицы signals/trades (один раз), и может
+# быть запущен вручную: python -m db.import_logs [signals.csv] [trades.csv]
+# Повторный запуск безопасен — строки дополняются/перезаписываются по signal_id.
+import csv
+import os
+import sys
+
+SIGNALS_CSV = "signals_log.csv"
+TRADES_CSV = "trades_log.csv"
+
+# Раскладки, которые когда-либо писались в эти файлы
+DATASET_SIGNAL_FIELDS = [   # utils/dataset_logger.log_signal_row
+    "signal_id", "ts", "symbol", "position", "entry", "sl", "tp",
+    "score", "confidence", "rr_ratio", "timeframe", "extras",
+]
+TEXT_SIGNAL_FIELDS = [      # utils/logger.log_signal (без signal_id)
+    "datetime", "symbol", "position", "entry", "tp", "sl",
+    "leverage", "risk", "rr_ratio", "quality",
+]
+DATASET_TRADE_FIELDS = [    # utils/dataset_logger.log_trade_row
+    "signal_id", "symbol", "opened_at", "closed_at", "close_price",
+    "result", "pnl_pct", "rr_real", "notes",
+]
+TRACKER_TRADE_FIELDS = [    # utils/trade_tracker._append_trade_log
+    "signal_id", "symbol", "position", "entry", "tp", "sl", "risk_pct", "leverage", "rr_ratio",
+    "opened_at", "closed_at", "status", "closed_price", "pnl_pct",
+]
+
+
+def _is_header(row) -> bool:
+    return bool(row) and row[0] in ("signal_id", "datetime")
+
+
+def import_signals(c, path: str = SIGNALS_CSV) -> int:
+    """
+    В файле вперемешку две раскладки без заголовков. Строка текстового лога
+    пишется сразу за строкой датасета того же сигнала — ей и дополняем.
+    """
+    from db.history import upsert_signal
+
+    if not os.path.exists(path):
+        return 0
+    n = 0
+    last_by_symbol = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for raw in csv.reader(f):
+            if not raw or _is_header(raw):
+                continue
+            if len(raw) == len(DATASET_SIGNAL_FIELDS):
+                row = dict(zip(DATASET_SIGNAL_FIELDS, raw))
+                last_by_symbol[row["symbol"]] = row["signal_id"]
+            elif len(raw) == len(TEXT_SIGNAL_FIELDS):
+                txt = dict(zip(TEXT_SIGNAL_FIELDS, raw))
+                sid = last_by_symbol.pop(txt["symbol"], None)
+                row = {
+                    "signal_id": sid or f"{txt['symbol']}:legacy:{txt['datetime']}",
+                    "leverage": txt["leverage"],
+                    "risk_pct": txt["risk"],
+                    "quality": txt["quality"],
+                }
+                if sid is None:
+                    # осиротевшая строка — сохраняем целиком
+                    row.update({k: txt[k] for k in ("symbol", "position", "entry", "tp", "sl", "rr_ratio")})
+                    row["ts"] = txt["datetime"]
+            else:
+                continue
+            upsert_signal(row, cursor=c)
+            n += 1
+    return n
+
+
+def import_trades(c, path: str = TRADES_CSV) -> int:
+    from db.history import insert_trade
+
+    if not os.path.exists(path):
+        return 0
+    n = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        for raw in csv.reader(f):
+            if not raw or _is_header(raw):
+                continue
+            if len(raw) == len(TRACKER_TRADE_FIELDS):
+                row = dict(zip(TRACKER_TRADE_FIELDS, raw))
+            elif len(raw) == len(DATASET_TRADE_FIELDS):
+                d = dict(zip(DATASET_TRADE_FIELDS, raw))
+                row = {
+                    "signal_id": d["signal_id"],
+                    "symbol": d["symbol"],
+                    "opened_at": d["opened_at"],
+                    "closed_at": d["closed_at"],
+                    "closed_price": d["close_price"],
+                    # в notes лежит TP/SL, в result — WIN/LOSS
+                    "status": d["notes"] if d["notes"] in ("TP", "SL", "MANUAL") else d["result"],
+                    "pnl_pct": d["pnl_pct"],
+                    "rr_real": d["rr_real"],
+                    "notes": d["notes"],
+                }
+            else:
+                continue
+            insert_trade(row, cursor=c)
+            n += 1
+    return n
+
+
+# поля сделки, которые в старом trades_log.csv (раскладка датасета) не писались, но есть у сигнала
+TRADE_FIELDS_FROM_SIGNAL = ("position", "entry", "tp", "sl", "rr_ratio", "leverage", "risk_pct")
+
+
+def fill_trades_from_signals(c) -> int:
+    """Пустые поля сделок дополнить из строки сигнала с тем же signal_id (заполненные не трогаем)."""
+    sets = ", ".join(
+        f"{col} = COALESCE({col}, (SELECT s.{col} FROM signals s WHERE s.signal_id = trades.signal_id))"
+        for col in TRADE_FIELDS_FROM_SIGNAL
+    )
+    missing = " OR ".join(f"{col} IS NULL" for col in TRADE_FIELDS_FROM_SIGNAL)
+    c.execute(f"UPDATE trades SET {sets} WHERE ({missing}) "
+              f"AND EXISTS (SELECT 1 FROM signals s WHERE s.signal_id = trades.signal_id)")
+    return c.rowcount
+
+
+def import_csv_logs(c, signals_path: str = SIGNALS_CSV, trades_path: str = TRADES_CSV):
+    ns = import_signals(c, signals_path)
+    nt = import_trades(c, trades_path)
+    fill_trades_from_signals(c)
+    print(f"📥 Импорт логов: сигналов {ns}, сделок {nt}")
+    return ns, nt
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from db.database import init_db, transaction
+
+    init_db()
+    args = sys.argv[1:]
+    with transaction() as cur:
+        import_csv_logs(cur, *(args[:2]))
@@ -0,0 +1,163 @@
+# db/log_sink.py — буферизованная запись логов (сигналы, сделки, фичи) в SQLite фоновым потоком
+#
+# Вызывающий код только кладёт строку в очередь (не ждёт диска). Писатель собирает
+# пачку и пишет её одной транзакцией: когда набралось BATCH_SIZE строк или прошло
+# FLUSH_INTERVAL секунд. flush() дожидается записи всего, что уже в очереди;
+# close() вызывается при остановке бота (и через atexit на всякий случай).
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from db.database import transaction
+from db.history import (
+    FEATURE_COLUMNS, SIGNAL_COLUMNS, TRADE_COLUMNS, insert_trade, upsert_features, upsert_signal,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0  # сек
+
+
+class Stream:
+    """Схема потока: допустимые колонки + как строка пишется в БД."""
+    def __init__(self, name: str, columns: List[str], writer: Callable, required=("signal_id",)):
+        self.name = name
+        self.columns = frozenset(columns)
+        self.writer = writer
+        self.required = tuple(required)
+
+    def validate(self, row: Dict) -> Dict:
+        extra = set(row) - self.columns
+        if extra:
+            raise ValueError(f"{self.name}: unknown columns {sorted(extra)}")
+        missing = [k for k in self.required if not row.get(k)]
+        if missing:
+            raise ValueError(f"{self.name}: missing {missing}")
+        return dict(row)
+
+
+STREAMS = {
+    "signals": Stream("signals", SIGNAL_COLUMNS, upsert_signal),
+    "trades": Stream("trades", TRADE_COLUMNS, insert_trade),
+    "features": Stream("features", FEATURE_COLUMNS, upsert_features, required=("signal_id", "features")),
+}
+
+_STOP = object()
+_FLUSH = object()  # обрывает сбор пачки, не дожидаясь FLUSH_INTERVAL
+
+
+class LogSink:
+    def __init__(self, streams: Dict[str, Stream] = None,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.streams = streams or STREAMS
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self._hooks: Dict[str, List[Callable[[List[Dict]], None]]] = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- public api ----------
+
+    def write(self, stream: str, row: Dict):
+        """Проверить строку по схеме потока и поставить в очередь. Не блокирует."""
+        if stream not in self.streams:
+            raise ValueError(f"unknown log stream: {stream}")
+        item = (stream, self.streams[stream].validate(row))
+        self._ensure_started()
+        self._queue.put(item)
+
+    def after_write(self, stream: str, hook: Callable[[List[Dict]], None]):
+        """hook(rows) вызывается писателем после коммита пачки — со строками этого потока."""
+        self._hooks.setdefault(stream, []).append(hook)
+
+    def flush(self):
+        """Дождаться записи всего, что уже поставлено в очередь."""
+        if self._thread is not None:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    # ---------- писатель ----------
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                return
+            if first is _FLUSH:
+                self._queue.task_done()
+                continue
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP or item is _FLUSH:
+                    stop = item is _STOP
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[Tuple[str, Dict]]):
+        try:
+            with transaction() as c:
+                for stream, row in batch:
+                    self.streams[stream].writer(row, cursor=c)
+            written = batch
+        except Exception as e:
+            # пачка откатилась — пишем по одной, чтобы битая строка не утянула остальные
+            logger.warning(f"log_sink: batch of {len(batch)} rows failed ({e}), writing one by one")
+            written = []
+            for stream, row in batch:
+                try:
+                    with transaction() as c:
+                        self.streams[stream].writer(row, cursor=c)
+                    written.append((stream, row))
+                except Exception as e1:
+                    logger.error(f"log_sink: {stream} row lost: {e1} {row}")
+        for stream, hooks in self._hooks.items():
+            rows = [row for s, row in written if s == stream]
+            if not rows:
+                continue
+            for hook in hooks:
+                try:
+                    hook(rows)
+                except Exception as e:
+                    logger.exception(f"log_sink hook {stream}: {e}")
+
+
+# создаём глобальный экземпляр
+log_sink = LogSink()
+atexit.register(log_sink.close)
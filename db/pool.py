@@ -0,0 +1,97 @@
+# db/pool.py — пул долгоживущих соединений SQLite (WAL + тюнинг прагм)
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+POOL_SIZE = 4
+CACHED_STATEMENTS = 256   # кэш подготовленных запросов на соединение
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # читатели не блокируют писателя и наоборот
+    "PRAGMA synchronous=NORMAL",    # в WAL безопасно, fsync только на чекпоинте
+    "PRAGMA cache_size=-8000",      # ~8 МБ страничного кэша на соединение
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+
+class ConnectionPool:
+    """
+    Небольшой пул соединений. Соединения живут всё время работы процесса,
+    поэтому sqlite3 переиспользует подготовленные запросы (statement cache)
+    вместо повторного парсинга SQL на каждый вызов.
+    Соединения в autocommit (isolation_level=None): одиночные чтения
+    не открывают транзакцию, записи идут через transaction().
+    """
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _new_conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        for p in PRAGMAS:
+            conn.execute(p)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._new_conn()
+                except Exception:
+                    self._created -= 1
+                    raise
+        # все заняты — ждём, пока кто-нибудь вернёт
+        return self._idle.get()
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            # кто-то вышел с исключением посреди транзакции
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE … COMMIT, откат при исключении. Отдаёт курсор."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn.cursor()
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
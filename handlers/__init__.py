@@ -9,10 +9,13 @@ from .stats import router as stats_router
 
 # админ-команды для выдачи подписки/автоторговли (из admin_sub.py)
 from .admin_sub import router as admin_router
+# админ-команды модели (/retrain, /cancel_retrain)
+from .admin_model import router as admin_model_router
 
 def setup_routers(dp: Dispatcher):
     """Подключаем все роутеры бота (порядок важен только для перехватчиков)."""
     dp.include_router(admin_router)     # /sub_week, /sub_month, /auto_on, ...
+    dp.include_router(admin_model_router)  # /retrain, /cancel_retrain
     dp.include_router(start_router)     # /start и меню
     dp.include_router(signals_router)   # раздел «Сигналы»
     dp.include_router(stats_router)     # статистика
@@ -0,0 +1,75 @@
+# handlers/admin_model.py — админ-команды модели: переобучение, отмена, версии и откат
+from aiogram import Bot, Router
+from aiogram.filters import Command
+from aiogram.types import Message
+import asyncio
+
+from core import model_registry
+from core.signal_generator import reload_model
+from handlers.admin_sub import _is_admin
+from train.auto_retrain import auto_retrain, cancel_retrain, retrain_running
+
+router = Router()
+
+
+@router.message(Command("retrain"))
+async def retrain_now(message: Message, bot: Bot):
+    if not _is_admin(message.from_user.id):
+        return
+    if retrain_running():
+        await message.answer("⏳ Переобучение уже идёт. Отменить: /cancel_retrain")
+        return
+    # /retrain full — полное переобучение, иначе дообучение на новых сделках
+    full = "full" in (message.text or "").split()[1:]
+    # не ждём окончания — прогресс придёт отдельными сообщениями
+    asyncio.create_task(auto_retrain(bot, full=full))
+
+
+@router.message(Command("cancel_retrain"))
+async def cancel_retrain_cmd(message: Message):
+    if not _is_admin(message.from_user.id):
+        return
+    if cancel_retrain():
+        await message.answer("🛑 Останавливаю переобучение…")
+    else:
+        await message.answer("Переобучение сейчас не запущено.")
+
+
+def _version_line(version: str, current: str) -> str:
+    m = model_registry.manifest(version)
+    metrics = m.get("metrics", {})
+    acc = f"{metrics['acc']:.2%}" if metrics.get("acc") is not None else "—"
+    mark = "▶️" if version == current else "▫️"
+    return (f"{mark} {version} {m.get('created_at', '')} {metrics.get('mode', '')} "
+            f"acc {acc}, p95 {metrics.get('latency_p95_ms', '—')} мс")
+
+
+@router.message(Command("models"))
+async def list_models(message: Message):
+    if not _is_admin(message.from_user.id):
+        return
+    versions = model_registry.versions()[-10:]
+    if not versions:
+        await message.answer("Реестр моделей пуст.")
+        return
+    current = model_registry.current_version()
+    lines = [_version_line(v, current) for v in reversed(versions)]
+    await message.answer("🧠 Версии модели (последние 10):\n" + "\n".join(lines) + "\n\nОткат: /rollback [версия]")
+
+
+@router.message(Command("rollback"))
+async def rollback_model(message: Message):
+    if not _is_admin(message.from_user.id):
+        return
+    # /rollback — на предыдущую активную, /rollback v0003 — на указанную
+    args = (message.text or "").split()[1:]
+    try:
+        version = model_registry.rollback(args[0] if args else None)
+    except ValueError as e:
+        await message.answer(f"⚠️ {e}")
+        return
+    if version is None:
+        await message.answer("Откатываться некуда — активных версий до текущей не было.")
+        return
+    reload_model()
+    await message.answer(f"⏪ Активна версия {version}. Новые сканы используют её.")
@@ -2,12 +2,9 @@
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
-# handlers/admin_sub.py
-from db.database import activate_subscription, set_autotrade_paid, toggle_autotrade, add_user
-
 from config import ADMIN_CHAT_ID
-from db.database import (
-    activate_subscription, set_autotrade_paid, toggle_autotrade
+from db.async_database import (
+    activate_subscription, set_autotrade_paid, toggle_autotrade, add_user
 )
 
 router = Router()
@@ -24,8 +21,8 @@ async def sub_week(message: Message):
     if not _is_admin(message.from_user.id): return
     uid = _target_user_id(message)
     uname = message.reply_to_message.from_user.username if message.reply_to_message else message.from_user.username
-    add_user(uid, uname or "")              # ← гарантируем, что user есть
-    activate_subscription(uid, "WEEK", 0.0)
+    await add_user(uid, uname or "")              # ← гарантируем, что user есть
+    await activate_subscription(uid, "WEEK", 0.0)
     await message.answer(f"✅ Выдал подписку на 1 неделю пользователю {uid}")
 
 
@@ -34,8 +31,8 @@ async def sub_month(message: Message):
     if not _is_admin(message.from_user.id): return
     uid = _target_user_id(message)
     uname = message.reply_to_message.from_user.username if message.reply_to_message else message.from_user.username
-    add_user(uid, uname or "")
-    activate_subscription(uid, "MONTH", amount=0.0)
+    await add_user(uid, uname or "")
+    await activate_subscription(uid, "MONTH", amount=0.0)
     await message.answer(f"✅ Выдал подписку на 1 месяц пользователю {uid}")
 
 @router.message(Command("sub_quarter"))
@@ -43,8 +40,8 @@ async def sub_quarter(message: Message):
     if not _is_admin(message.from_user.id): return
     uid = _target_user_id(message)
     uname = message.reply_to_message.from_user.username if message.reply_to_message else message.from_user.username
-    add_user(uid, uname or "")
-    activate_subscription(uid, "QUARTER", amount=0.0)
+    await add_user(uid, uname or "")
+    await activate_subscription(uid, "QUARTER", amount=0.0)
     await message.answer(f"✅ Выдал подписку на 3 месяца пользователю {uid}")
 
 @router.message(Command("auto_pay30"))
@@ -52,7 +49,7 @@ async def auto_pay30(message: Message):
     if not _is_admin(message.from_user.id):
         return
     uid = _target_user_id(message)
-    set_autotrade_paid(uid, days=30)
+    await set_autotrade_paid(uid, days=30)
     await message.answer(f"✅ Оплачена автоторговля на 30 дней для {uid}")
 
 @router.message(Command("auto_on"))
@@ -60,7 +57,7 @@ async def auto_on(message: Message):
     if not _is_admin(message.from_user.id):
         return
     uid = _target_user_id(message)
-    toggle_autotrade(uid, True)
+    await toggle_autotrade(uid, True)
     await message.answer(f"▶️ Автоторговля включена для {uid}")
 
 @router.message(Command("auto_off"))
@@ -68,5 +65,5 @@ async def auto_off(message: Message):
     if not _is_admin(message.from_user.id):
         return
     uid = _target_user_id(message)
-    toggle_autotrade(uid, False)
+    await toggle_autotrade(uid, False)
     await message.answer(f"⏸ Автоторговля выключена для {uid}")
@@ -1,13 +1,16 @@
 # handlers/autotrade.py
+import asyncio
+
 from aiogram import Router, F
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 
-from db.database import (
-    has_active_subscription, autotrade_paid, autotrade_enabled,
-    get_user_settings, update_user_settings, set_api_keys
+from db.async_database import (
+    get_user_profile, update_user_settings, set_api_keys, toggle_autotrade, run as db_run
 )
+from db.history import recent_outcomes
+from utils import risk_sim
 
 router = Router()
 
@@ -17,9 +20,9 @@ def back_btn():
         [InlineKeyboardButton(text="⬅️ В меню", callback_data="main_menu")]
     ])
 
-def autotrade_menu_kb(user_id: int) -> InlineKeyboardMarkup:
-    paid = autotrade_paid(user_id)
-    enabled = autotrade_enabled(user_id)
+def autotrade_menu_kb(profile: dict) -> InlineKeyboardMarkup:
+    paid = profile["autotrade_paid"]
+    enabled = profile["autotrade_enabled"]
     kb = []
 
     if paid:
@@ -34,6 +37,7 @@ def autotrade_menu_kb(user_id: int) -> InlineKeyboardMarkup:
             InlineKeyboardButton(text="📦 Маржа", callback_data="margin_toggle"),
             InlineKeyboardButton(text="🔀 Режим позиции", callback_data="position_toggle"),
         ])
+        kb.append([InlineKeyboardButton(text="🎲 Симуляция риска", callback_data="risk_sim")])
     else:
         kb.append([InlineKeyboardButton(text="💳 Оплатить автоторговлю", callback_data="autotrade_pay_stub")])
 
@@ -52,10 +56,10 @@ class LeverageForm(StatesGroup):
     value = State()
 
 # ---------- утилиты ----------
-def format_settings_text(user_id: int) -> str:
-    s = get_user_settings(user_id)
-    paid = autotrade_paid(user_id)
-    enabled = autotrade_enabled(user_id)
+def format_settings_text(profile: dict) -> str:
+    s = profile["settings"]
+    paid = profile["autotrade_paid"]
+    enabled = profile["autotrade_enabled"]
     lines = [
         "🤖 <b>Автоторговля</b>",
         f"Статус оплаты: {'✅ оплачена' if paid else '❌ не оплачена'}",
@@ -74,7 +78,8 @@ def format_settings_text(user_id: int) -> str:
 @router.callback_query(F.data == "trading_menu")
 async def show_autotrade_menu(callback: CallbackQuery):
     user_id = callback.from_user.id
-    if not has_active_subscription(user_id):
+    profile = await get_user_profile(user_id)
+    if not profile["has_subscription"]:
         await callback.message.edit_text(
             "Чтобы пользоваться автоторговлей, нужна активная подписка на сигналы.\n"
             "Оформите её в «💹 Получить сигналы».",
@@ -84,8 +89,8 @@ async def show_autotrade_menu(callback: CallbackQuery):
         return
 
     await callback.message.edit_text(
-        format_settings_text(user_id),
-        reply_markup=autotrade_menu_kb(user_id),
+        format_settings_text(profile),
+        reply_markup=autotrade_menu_kb(profile),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -101,14 +106,14 @@ async def autotrade_pay_stub(callback: CallbackQuery):
     await callback.answer()
 
 # ---------- вкл/выкл (будет работать после оплаты) ----------
-from db.database import toggle_autotrade
 @router.callback_query(F.data == "auto_enable")
 async def auto_enable(callback: CallbackQuery):
     user_id = callback.from_user.id
-    toggle_autotrade(user_id, True)
+    await toggle_autotrade(user_id, True)
+    profile = await get_user_profile(user_id)
     await callback.message.edit_text(
-        format_settings_text(user_id),
-        reply_markup=autotrade_menu_kb(user_id),
+        format_settings_text(profile),
+        reply_markup=autotrade_menu_kb(profile),
         parse_mode="HTML"
     )
     await callback.answer("Автоторговля включена")
@@ -116,10 +121,11 @@ async def auto_enable(callback: CallbackQuery):
 @router.callback_query(F.data == "auto_disable")
 async def auto_disable(callback: CallbackQuery):
     user_id = callback.from_user.id
-    toggle_autotrade(user_id, False)
+    await toggle_autotrade(user_id, False)
+    profile = await get_user_profile(user_id)
     await callback.message.edit_text(
-        format_settings_text(user_id),
-        reply_markup=autotrade_menu_kb(user_id),
+        format_settings_text(profile),
+        reply_markup=autotrade_menu_kb(profile),
         parse_mode="HTML"
     )
     await callback.answer("Автоторговля выключена")
@@ -146,7 +152,7 @@ async def api_secret_entered(message: Message, state: FSMContext):
     data = await state.get_data()
     key = data.get("api_key")
     secret = message.text.strip()
-    set_api_keys(message.from_user.id, key, secret)
+    await set_api_keys(message.from_user.id, key, secret)
     await state.clear()
     await message.answer("✅ Ключи сохранены. Вернитесь в «🤖 Автоторговля» для управления.", reply_markup=back_btn())
 
@@ -165,7 +171,7 @@ async def risk_save(message: Message, state: FSMContext):
     except Exception:
         await message.answer("⚠️ Введите число от 0.1 до 10. Пример: 1.0")
         return
-    update_user_settings(message.from_user.id, risk_pct=val)
+    await update_user_settings(message.from_user.id, risk_pct=val)
     await state.clear()
     await message.answer("✅ Риск сохранён. Откройте «🤖 Автоторговля», чтобы увидеть изменения.", reply_markup=back_btn())
 
@@ -184,7 +190,7 @@ async def leverage_save(message: Message, state: FSMContext):
     except Exception:
         await message.answer("⚠️ Введите целое число от 1 до 50.")
         return
-    update_user_settings(message.from_user.id, leverage=lev)
+    await update_user_settings(message.from_user.id, leverage=lev)
     await state.clear()
     await message.answer("✅ Плечо сохранено. Откройте «🤖 Автоторговля», чтобы увидеть изменения.", reply_markup=back_btn())
 
@@ -192,21 +198,42 @@ async def leverage_save(message: Message, state: FSMContext):
 @router.callback_query(F.data == "margin_toggle")
 async def margin_toggle(callback: CallbackQuery):
     user_id = callback.from_user.id
-    s = get_user_settings(user_id)
+    s = (await get_user_profile(user_id))["settings"]
     new_mode = "CROSS" if s["margin_mode"] == "ISOLATED" else "ISOLATED"
-    update_user_settings(user_id, margin_mode=new_mode)
+    await update_user_settings(user_id, margin_mode=new_mode)
+    profile = await get_user_profile(user_id)
     await callback.message.edit_text(
-        format_settings_text(user_id), reply_markup=autotrade_menu_kb(user_id), parse_mode="HTML"
+        format_settings_text(profile), reply_markup=autotrade_menu_kb(profile), parse_mode="HTML"
     )
     await callback.answer(f"Маржа: {new_mode}")
 
 @router.callback_query(F.data == "position_toggle")
 async def position_toggle(callback: CallbackQuery):
     user_id = callback.from_user.id
-    s = get_user_settings(user_id)
+    s = (await get_user_profile(user_id))["settings"]
     new_mode = "HEDGE" if s["position_mode"] == "ONEWAY" else "ONEWAY"
-    update_user_settings(user_id, position_mode=new_mode)
+    await update_user_settings(user_id, position_mode=new_mode)
+    profile = await get_user_profile(user_id)
     await callback.message.edit_text(
-        format_settings_text(user_id), reply_markup=autotrade_menu_kb(user_id), parse_mode="HTML"
+        format_settings_text(profile), reply_markup=autotrade_menu_kb(profile), parse_mode="HTML"
     )
     await callback.answer(f"Режим позиции: {new_mode}")
+
+# ---------- симуляция риска по истории сделок ----------
+@router.callback_query(F.data == "risk_sim")
+async def risk_simulation(callback: CallbackQuery):
+    await callback.answer("Считаю…")
+    profile = await get_user_profile(callback.from_user.id)
+    s = profile["settings"]
+    rows = await db_run(recent_outcomes, risk_sim.HISTORY)
+    # NumPy — в пуле по умолчанию: поток БД и event loop не занимаем
+    res = await asyncio.get_running_loop().run_in_executor(
+        None, risk_sim.simulate_settings, rows, s["risk_pct"], s["leverage"]
+    )
+    await callback.message.edit_text(
+        risk_sim.format_report(res),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="⬅️ К настройкам", callback_data="trading_menu")]
+        ]),
+        parse_mode="HTML"
+    )
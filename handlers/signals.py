@@ -7,6 +7,7 @@ from aiogram.filters import Command
 
 from core.bybit_api import BybitAPI
 from core.filters import filter_by_volume, apply_all_filters
+from core import model_registry
 from core.signal_generator import generate_signal
 from core.risk_manager import evaluate_risk
 from utils.format_text import format_signal_text
@@ -50,13 +51,14 @@ async def _scan_and_render(limit: int = 3) -> str:
 
     sent = 0
     chunks: list[str] = []
+    bundle = model_registry.current()  # одна версия модели на весь скан
     for pair in final_pairs:
         # 15m или 60? — оставляю твоё 60 как было
         ohlcv = api.get_ohlcv(pair["symbol"], interval="60", limit=220)  # 220, чтобы хватало на EMA200
         if not ohlcv:
             continue
 
-        signal = generate_signal(pair["symbol"], ohlcv)
+        signal = generate_signal(pair["symbol"], ohlcv, bundle=bundle)
         signal = evaluate_risk(signal)
 
         # Пропускаем плохие сигналы
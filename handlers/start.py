@@ -1,10 +1,7 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from handlers.stats import get_period_keyboard  # твой существующий клавиатурный хелпер
-from db.database import (
-    has_active_subscription, get_subscription_expiry,
-    autotrade_paid, autotrade_enabled
-)
+from db.async_database import get_user_profile
 from datetime import datetime
 
 router = Router()
@@ -33,8 +30,8 @@ def signals_tariffs_kb() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="⬅️ В меню", callback_data="main_menu")]
     ])
 
-def signals_subscribed_kb(user_id: int) -> InlineKeyboardMarkup:
-    paid = autotrade_paid(user_id)
+def signals_subscribed_kb(profile: dict) -> InlineKeyboardMarkup:
+    paid = profile["autotrade_paid"]
     kb = [
         [
             InlineKeyboardButton(
@@ -77,8 +74,9 @@ async def go_main_menu(callback: CallbackQuery):
 async def show_signals_entry(callback: CallbackQuery):
     user_id = callback.from_user.id
 
-    if has_active_subscription(user_id):
-        expiry = get_subscription_expiry(user_id)
+    profile = await get_user_profile(user_id)
+    if profile["has_subscription"]:
+        expiry = profile["subscription_end"]
         text = (
             "✅ Подписка на сигналы активна.\n"
             f"⏳ Действует до: <b>{_format_expiry(expiry)}</b>\n\n"
@@ -86,7 +84,7 @@ async def show_signals_entry(callback: CallbackQuery):
             "Дополнительно вы можете подключить автоторговлю:"
         )
         # по твоему запросу — отправляем НОВОЕ сообщение
-        await callback.message.answer(text, reply_markup=signals_subscribed_kb(user_id), parse_mode="HTML")
+        await callback.message.answer(text, reply_markup=signals_subscribed_kb(profile), parse_mode="HTML")
     else:
         text = (
             "📡 Чтобы бот присылал вам сигналы, нужно оформить подписку из вариантов ниже.\n\n"
@@ -6,9 +6,11 @@ from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 import os
 
+from db.async_database import run
+from utils.stats_rollup import stats_rollup
+
 router = Router()
 
-TRADES_FILE  = "trades_log.csv"    # новый формат (из utils/trade_tracker.py)
 SIGNALS_FILE = "signals_log.csv"   # старый формат (если вдруг есть)
 
 # ---------- helpers ----------
@@ -33,27 +35,6 @@ def _safe_float(v, default=0.0):
 
 # ---------- loaders ----------
 
-def _load_from_trades(days: int):
-    """trades_log.csv: считаем по closed_at и pnl_pct."""
-    if not os.path.exists(TRADES_FILE):
-        return None
-
-    cutoff = datetime.now() - timedelta(days=days)
-    rows = []
-    with open(TRADES_FILE, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            dt = _parse_dt(row.get("closed_at"))
-            if not dt or dt < cutoff:
-                continue
-            rows.append({
-                "pnl_pct": _safe_float(row.get("pnl_pct")),
-                "rr_ratio": _safe_float(row.get("rr_ratio")),
-                "status": row.get("status", ""),
-                "symbol": row.get("symbol", ""),
-            })
-    return rows
-
 def _load_from_signals(days: int):
     """signals_log.csv: совместимость со старым форматом."""
     if not os.path.exists(SIGNALS_FILE):
@@ -78,16 +59,16 @@ def _load_from_signals(days: int):
 # ---------- stats ----------
 
 def calculate_stats(days: int) -> str:
-    # 1) пробуем новый формат
-    rows = _load_from_trades(days)
-    if rows is not None:
-        total = len(rows)
+    # 1) новый формат — агрегаты по дням (обновляются в close_trade), окно — последние days × 24 ч
+    if stats_rollup.available():
+        agg = stats_rollup.query(days)
+        total = agg["count"]
         if total == 0:
             return f"📊 За последние {days} дн. закрытых сделок нет."
-        positive = sum(1 for r in rows if r["pnl_pct"] > 0)
-        negative = sum(1 for r in rows if r["pnl_pct"] < 0)
-        avg_rr   = sum(r["rr_ratio"] for r in rows) / total if total else 0.0
-        win_rate = (positive / total) * 100 if total else 0.0
+        positive = agg["wins"]
+        negative = agg["losses"]
+        avg_rr   = agg["sum_rr"] / total
+        win_rate = (positive / total) * 100
         return (
             f"📊 Статистика за {days} дн. (по закрытым сделкам)\n\n"
             f"Всего закрытых: {total}\n"
@@ -137,6 +118,7 @@ async def cmd_stats(message: types.Message):
 @router.callback_query(F.data.startswith("stats_"))
 async def callback_stats(callback: types.CallbackQuery):
     days = int(callback.data.split("_")[1])
-    text = calculate_stats(days)
+    # агрегаты могут пересобираться из БД — не на event loop
+    text = await run(calculate_stats, days)
     await callback.message.edit_text(text, reply_markup=get_period_keyboard())
     await callback.answer()
@@ -0,0 +1,237 @@
+# train/backfill.py — историческая загрузка свечей по всем линейным USDT-парам Bybit
+#
+# Запуск из корня проекта:
+#   python -m train.backfill --since 2024-01-01 [--interval 15] [--workers 8] [--rps 10]
+#                            [--max-requests N] [--symbols BTCUSDT,ETHUSDT]
+# Каждая монета листается назад страницами по PAGE_LIMIT свечей до даты --since
+# (или до листинга). Монеты качаются параллельно, все потоки делят общий
+# лимит запросов (--rps, --max-requests). Страницы сливаются в train/candle_store.py
+# без дублей; чекпоинт обновляется только после записи, поэтому после
+# прерывания повторный запуск продолжает с места остановки и докачивает
+# свечи, появившиеся с прошлого раза.
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.bybit_api import interval_ms
+from train import candle_store
+
+PAGE_LIMIT = 1000     # максимум свечей за запрос у Bybit
+FLUSH_PAGES = 20      # страниц в памяти до записи на диск и чекпоинта
+RETRIES = 5
+REPORT_EVERY = 10.0   # сек между строками прогресса
+
+
+class RequestBudget:
+    """Общий для всех потоков лимит: не больше rps запросов в секунду и max_requests всего."""
+
+    def __init__(self, rps: float, max_requests: Optional[int] = None):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.max_requests = max_requests
+        self.used = 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Дождаться своей очереди. False — бюджет запросов исчерпан."""
+        with self._lock:
+            if self.max_requests is not None and self.used >= self.max_requests:
+                return False
+            self.used += 1
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+        return True
+
+
+def _num(x) -> str:
+    return f"{x:,.0f}".replace(",", " ")
+
+
+class Stats:
+    def __init__(self, total_symbols: int):
+        self.total = total_symbols
+        self.finished = 0
+        self.candles = 0
+        self.errors: Dict[str, str] = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, n: int):
+        with self._lock:
+            self.candles += n
+
+    def rate(self) -> float:
+        return self.candles / max(time.monotonic() - self.started, 1e-9)
+
+    def line(self) -> str:
+        return (f"📥 {self.finished}/{self.total} монет, {_num(self.candles)} новых свечей, "
+                f"{_num(self.rate())} св/с")
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+_local = threading.local()
+
+
+def _api():
+    # у каждого потока своя HTTP-сессия
+    if not hasattr(_local, "api"):
+        from core.bybit_api import BybitAPI
+        _local.api = BybitAPI()
+    return _local.api
+
+
+def _fetch_page(symbol: str, interval: str, end_ms: int, budget: RequestBudget) -> List[List]:
+    delay = 1.0
+    for attempt in range(RETRIES):
+        if not budget.acquire():
+            raise BudgetExhausted()
+        try:
+            return _api().get_ohlcv_before(symbol, end_ms, interval=interval, limit=PAGE_LIMIT)
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(delay)   # в т.ч. ответ «слишком много запросов» — ждём и повторяем
+            delay *= 2
+    return []
+
+
+def _page_back(symbol: str, interval: str, end_ms: int, stop_ms: int,
+               budget: RequestBudget, on_pages) -> Optional[int]:
+    """
+    Листать назад от end_ms, пока не дойдём до stop_ms (или начала истории).
+    on_pages(frame) вызывается каждые FLUSH_PAGES страниц; возвращает
+    время самой старой полученной свечи или None, если свечей не было.
+    """
+    pages, oldest = [], None
+    while end_ms >= stop_ms:
+        chunk = _fetch_page(symbol, interval, end_ms, budget)
+        chunk = [c for c in chunk if int(c[0]) <= end_ms]
+        if not chunk:
+            break
+        pages.extend(chunk)
+        oldest = int(chunk[0][0])
+        if len(pages) >= FLUSH_PAGES * PAGE_LIMIT:
+            on_pages(candle_store.to_frame(pages))
+            pages = []
+        if len(chunk) < PAGE_LIMIT:
+            break   # дошли до листинга
+        end_ms = oldest - 1
+    if pages:
+        on_pages(candle_store.to_frame(pages))
+    return oldest
+
+
+def backfill_symbol(symbol: str, interval: str, since_ms: int,
+                    budget: RequestBudget, stats: Stats) -> Dict:
+    step = interval_ms(interval)
+    now_ms = int(time.time() * 1000)
+    last_closed = (now_ms // step - 1) * step   # текущая свеча ещё не закрыта
+    cp = candle_store.load_state(interval).get(symbol, {})
+
+    # 1) докачка новых свечей после прошлого запуска: пишем одним куском,
+    #    чтобы «newest» в чекпоинте никогда не перепрыгнул дыру
+    if cp.get("newest") is not None and cp["newest"] < last_closed:
+        fresh = []
+        _page_back(symbol, interval, last_closed, cp["newest"] + step, budget, fresh.append)
+        if fresh:
+            df = pd.concat(fresh)
+            stats.add(candle_store.merge(symbol, interval, df[df["timestamp"] <= last_closed]))
+        cp = candle_store.update_state(interval, symbol, newest=last_closed)
+
+    # 2) история назад до since_ms; после каждой записи сдвигаем «oldest»
+    if cp.get("done") and cp.get("since", since_ms) <= since_ms:
+        return cp
+    end_ms = cp["oldest"] - step if cp.get("oldest") is not None else last_closed
+
+    def flush(df: pd.DataFrame):
+        nonlocal cp
+        df = df[(df["timestamp"] >= since_ms) & (df["timestamp"] <= last_closed)]
+        if df.empty:
+            return
+        stats.add(candle_store.merge(symbol, interval, df))
+        fields = {"oldest": int(df["timestamp"].min())}
+        if cp.get("newest") is None:
+            fields["newest"] = int(df["timestamp"].max())
+        cp = candle_store.update_state(interval, symbol, **fields)
+
+    _page_back(symbol, interval, end_ms, since_ms, budget, flush)
+    # сюда доходим только без исключений: история до since_ms (или листинга) загружена
+    return candle_store.update_state(interval, symbol, done=True, since=since_ms)
+
+
+def universe() -> List[str]:
+    """Все линейные USDT-фьючерсы."""
+    return sorted(p["symbol"] for p in _api().get_usdt_pairs())
+
+
+def run(since: str, interval: str = "15", workers: int = 8, rps: float = 10.0,
+        max_requests: Optional[int] = None, symbols: Optional[List[str]] = None) -> Stats:
+    since_ms = int(datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+    symbols = symbols or universe()
+    budget = RequestBudget(rps, max_requests)
+    stats = Stats(len(symbols))
+    print(f"🚀 Бэкфилл {len(symbols)} монет, интервал {interval}, с {since}, "
+          f"{workers} потоков, до {rps:g} запросов/с")
+
+    stop = threading.Event()
+
+    def reporter():
+        while not stop.wait(REPORT_EVERY):
+            print(stats.line())
+
+    threading.Thread(target=reporter, daemon=True).start()
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(backfill_symbol, s, interval, since_ms, budget, stats): s for s in symbols}
+        for fut in as_completed(futures):
+            symbol = futures[fut]
+            try:
+                fut.result()
+            except BudgetExhausted:
+                exhausted = True
+            except Exception as e:
+                stats.errors[symbol] = str(e)
+            else:
+                stats.finished += 1
+    stop.set()
+
+    elapsed = time.monotonic() - stats.started
+    print(f"✅ Готово за {elapsed:.0f} с: {stats.line()}, запросов: {budget.used}")
+    if exhausted:
+        print("⏸ Бюджет запросов исчерпан — запустите ещё раз, загрузка продолжится с чекпоинта.")
+    for symbol, err in sorted(stats.errors.items()):
+        print(f"⚠️ {symbol}: {err}")
+    return stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Историческая загрузка свечей Bybit (linear USDT)")
+    p.add_argument("--since", required=True, help="дата начала истории, YYYY-MM-DD (UTC)")
+    p.add_argument("--interval", default="15", help="таймфрейм Bybit: 1, 5, 15, 60, 240, D, ...")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--rps", type=float, default=10.0, help="общий лимит запросов в секунду")
+    p.add_argument("--max-requests", type=int, default=None, help="остановиться после N запросов")
+    p.add_argument("--symbols", default="", help="через запятую; по умолчанию — все USDT-пары")
+    args = p.parse_args(argv)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] or None
+    stats = run(args.since, args.interval, args.workers, args.rps, args.max_requests, symbols)
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
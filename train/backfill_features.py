@@ -0,0 +1,111 @@
+# train/backfill_features.py — разовое восстановление фичей для старых сигналов
+#
+# Фичи пишутся в signal_features только с момента появления реестра core/features.py,
+# поэтому у истории сигналов их нет, и переобучению (MIN_SAMPLES примеров с фичами)
+# долго не из чего учиться. Здесь фичи считаются заново по сохранённым свечам
+# (train/candle_store.py, сначала: python -m train.backfill --interval 60 --since ...):
+# для каждого сигнала берётся последняя закрытая к его ts свеча. Вживую бот видел
+# ещё и незакрытую — её финальные значения брать нельзя (заглядывание вперёд),
+# так что фичи близки к живым, но не совпадают с ними в точности.
+#
+# Запуск из корня проекта:
+#   python -m train.backfill_features [--interval 60] [--symbols BTCUSDT,...]
+# Трогает только сигналы без фичей текущей FEATURE_VERSION; повторный запуск безопасен.
+import argparse
+import os
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.features import FEATURE_NAMES, FEATURE_VERSION, compute_indicators, feature_frame
+from core.bybit_api import interval_ms
+from train import candle_store
+
+DEFAULT_INTERVAL = "60"   # сигналы считаются на 1H
+
+
+def missing_signals(symbols: Optional[List[str]] = None) -> pd.DataFrame:
+    """Сигналы LONG/SHORT без фичей текущей версии: signal_id, ts, symbol, position."""
+    from db.database import connection
+
+    with connection() as conn:
+        rows = [dict(r) for r in conn.execute(
+            "SELECT s.signal_id, s.ts, s.symbol, s.position FROM signals s "
+            "LEFT JOIN signal_features f ON f.signal_id = s.signal_id AND f.version = ? "
+            "WHERE f.signal_id IS NULL AND s.position IN ('LONG', 'SHORT') AND s.ts IS NOT NULL",
+            (FEATURE_VERSION,),
+        ).fetchall()]
+    df = pd.DataFrame(rows, columns=["signal_id", "ts", "symbol", "position"])
+    if symbols:
+        df = df[df["symbol"].isin(symbols)]
+    return df
+
+
+def symbol_features(signals: pd.DataFrame, candles: pd.DataFrame, step: int) -> pd.DataFrame:
+    """Фичи сигналов одной монеты по последней закрытой к ts свече; без свечей или прогрева — NaN."""
+    ind = compute_indicators(candles.copy())
+    # ts сигнала — UTC ('YYYY-MM-DD HH:MM:SS'), свечи — мс UTC по открытию
+    ts = pd.to_datetime(signals["ts"], errors="coerce")
+    ts_ms = ts.values.astype("datetime64[ms]").astype("int64")
+    idx = np.searchsorted(ind["timestamp"].to_numpy() + step, ts_ms, side="right") - 1
+    ok = (idx >= 0) & ts.notna().to_numpy()
+    feats = pd.DataFrame(np.nan, index=signals.index, columns=FEATURE_NAMES)
+    if ok.any():
+        rows = ind.iloc[idx[ok]].reset_index(drop=True)
+        side = signals["position"][ok].reset_index(drop=True)
+        feats.loc[ok] = feature_frame(rows, side).to_numpy()
+    return feats
+
+
+def run(interval: str = DEFAULT_INTERVAL, symbols: Optional[List[str]] = None) -> Dict[str, int]:
+    from db.history import upsert_features
+    from db.database import transaction
+
+    todo = missing_signals(symbols)
+    step = interval_ms(interval)
+    stats = {"signals": len(todo), "filled": 0, "no_candles": 0, "no_history": 0}
+    for symbol, sig in todo.groupby("symbol"):
+        candles = candle_store.load(symbol, interval)
+        if candles.empty:
+            stats["no_candles"] += len(sig)
+            continue
+        feats = symbol_features(sig, candles, step)
+        good = feats.notna().all(axis=1)
+        stats["no_history"] += int((~good).sum())
+        with transaction() as c:
+            for i in feats.index[good]:
+                upsert_features({
+                    "signal_id": sig.at[i, "signal_id"],
+                    "ts": sig.at[i, "ts"],
+                    "version": FEATURE_VERSION,
+                    "features": {n: float(feats.at[i, n]) for n in FEATURE_NAMES},
+                }, cursor=c)
+        stats["filled"] += int(good.sum())
+    return stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Фичи для старых сигналов по сохранённым свечам")
+    p.add_argument("--interval", default=DEFAULT_INTERVAL, help="таймфрейм свечей в train/candle_store")
+    p.add_argument("--symbols", default="", help="через запятую; по умолчанию — все монеты с сигналами")
+    args = p.parse_args(argv)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] or None
+
+    from db.database import init_db
+    init_db()
+    stats = run(args.interval, symbols)
+    print(f"✅ Фичи восстановлены: {stats['filled']} из {stats['signals']} сигналов без фичей")
+    if stats["no_candles"]:
+        print(f"⚠️ Нет свечей {args.interval} в хранилище: {stats['no_candles']} сигналов "
+              f"(python -m train.backfill --interval {args.interval} --since ...)")
+    if stats["no_history"]:
+        print(f"⚠️ Мало истории для индикаторов до сигнала: {stats['no_history']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+# train/backtest.py — бэктест правил generate_signal по истории свечей
+#
+# Запуск из корня проекта (свечи 1H — train/backfill.py --interval 60):
+#   python -m train.backtest --since 2025-01-01 [--until 2026-01-01] [--symbols BTCUSDT,...]
+#                            [--fee 0.00055] [--slippage 0.0005] [--max-hold 720] [--model] [--workers N]
+#
+# Для каждой монеты индикаторы, кандидат направления, слагаемые скоринга и TP/SL
+# считаются сразу по всем барам теми же функциями, что в core/signal_generator
+# (candidate_sides, score_components, tp_sl_levels) и с теми же рабочими параметрами
+# (core/strategy_params.py). 4H-подтверждение — EMA по
+# 4H-свечам, собранным из 1H, с текущей незакрытой 4H-свечой, как у живого скана.
+# Новостного бонуса в истории нет.
+#
+# Выход — как check_trades_job: первая свеча после входа, задевшая TP или SL
+# (обе в одной свече — SL, гэп за уровень — по цене открытия). Ищется векторно
+# для всех баров-кандидатов сразу (train/labeler.first_hits). Потом короткий
+# проход по сигналам: на монете одна открытая сделка и не больше одного входа
+# в сутки (utils/used_tracker). Комиссия берётся с каждой стороны, проскальзывание —
+# на входе и выходе против нас.
+#
+# Сделки пишутся в CSV с колонками журнала сделок (db.history.TRADE_COLUMNS).
+# Подготовленные массивы (prepare_symbol) не зависят от весов и порога скоринга —
+# signal_mask() + take_trades() пересчитывают сделки для любых весов без пересчёта индикаторов.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.features import compute_indicators, feature_frame, to_matrix
+from core.risk_manager import DEFAULT_SETTINGS, tp_sl_levels
+from core.signal_generator import MIN_CANDLES, WEIGHTS, candidate_sides, score_components
+from core.strategy_params import load_params as load_strategy
+from db.history import TRADE_COLUMNS
+from train import candle_store
+from train.labeler import first_hits
+
+INTERVAL = "60"
+BAR_MS = 3_600_000
+DAY_MS = 86_400_000
+H4_BARS = 4                 # 1H-баров в 4H-свече
+FEE = 0.00055               # тейкер Bybit, доля с каждой стороны
+SLIPPAGE = 0.0005           # доля цены на вход и на выход
+MAX_HOLD = 720              # баров; дольше — закрываем по close (статус TIMEOUT)
+OUT_DIR = os.path.join("data", "backtest")
+
+COMPONENTS = list(WEIGHTS)
+TP, SL, TIMEOUT, OPEN = 1, -1, 2, 0
+
+
+class SymbolArrays(NamedTuple):
+    """Всё, что нужно для сделок монеты при любых весах: по барам-кандидатам в пределах периода."""
+    symbol: str
+    ts: np.ndarray          # int64, начало бара входа (мс)
+    side: np.ndarray        # int8: 1 LONG, -1 SHORT
+    comps: np.ndarray       # float32 [n, len(COMPONENTS)] — слагаемые скоринга
+    entry: np.ndarray
+    tp: np.ndarray
+    sl: np.ndarray
+    exit_ts: np.ndarray     # int64, начало бара выхода
+    exit_price: np.ndarray  # цена срабатывания без проскальзывания
+    status: np.ndarray      # int8: TP / SL / TIMEOUT / OPEN (история кончилась раньше)
+    nn_prob: np.ndarray     # float32, NaN — без модели
+
+
+# ---------- подготовка по монете ----------
+
+def _ema_last(values: np.ndarray, window: int) -> np.ndarray:
+    """EMA как у ta.EMAIndicator (adjust=False, NaN до window значений)."""
+    return pd.Series(values).ewm(span=window, adjust=False, min_periods=window).mean().to_numpy()
+
+
+def mtf_up(ind: pd.DataFrame) -> pd.Series:
+    """
+    4H EMA50 > EMA200 на момент каждого 1H-бара. Живой скан берёт 4H-свечи вместе с
+    текущей незакрытой — её close равен close текущего 1H-бара.
+    """
+    group = ind["timestamp"].to_numpy(dtype="int64") // (H4_BARS * BAR_MS)
+    closes = ind["close"].to_numpy()
+    last_in_group = np.r_[group[1:] != group[:-1], True]
+    h4_close = closes[last_in_group]               # закрытые 4H-свечи (последняя может быть неполной)
+    pos = np.cumsum(np.r_[0, last_in_group[:-1]])  # номер 4H-свечи у каждого 1H-бара
+    out = {}
+    for window in (50, 200):
+        alpha = 2.0 / (window + 1)
+        prev = np.r_[np.nan, _ema_last(h4_close, window)][pos]   # EMA по закрытым до текущей
+        ema = np.where(np.isnan(prev), np.nan, alpha * closes + (1 - alpha) * prev)
+        out[window] = np.where(pos + 1 >= window, ema, np.nan)
+    # как в generate_signal: меньше 60 4H-свечей — неизвестно, иначе сравнение (с NaN — False)
+    return pd.Series(np.where(pos + 1 >= 60, out[50] > out[200], np.nan), index=ind.index, dtype=object)
+
+
+def load_indicators(symbol: str, since_ms: int, until_ms: Optional[int] = None):
+    """
+    Индикаторы монеты с прогревом до since_ms; in_period — бары, на которых ищем сигналы,
+    sides — кандидат направления, mtf — 4H-тренд. None — мало истории.
+    """
+    warmup_ms = (MIN_CANDLES + 210 * H4_BARS) * BAR_MS   # прогрев EMA200 на 1H и на 4H
+    candles = candle_store.load(symbol, INTERVAL, since_ms - warmup_ms)
+    if len(candles) < MIN_CANDLES:
+        return None
+    ind = compute_indicators(candles.sort_values("timestamp").reset_index(drop=True).astype(float))
+    ind["timestamp"] = ind["timestamp"].astype("int64")
+    ts = ind["timestamp"].to_numpy()
+    in_period = (ts >= since_ms) & (np.arange(len(ind)) >= MIN_CANDLES - 1)
+    if until_ms:
+        in_period &= ts < until_ms
+    return ind, in_period, candidate_sides(ind), mtf_up(ind)
+
+
+def exits(ind: pd.DataFrame, idx: np.ndarray, side: str, tp: np.ndarray, sl: np.ndarray,
+          max_hold: int = MAX_HOLD):
+    """Бар выхода, статус и цена срабатывания для входов на барах idx."""
+    high, low, open_, close = (ind[c].to_numpy() for c in ("high", "low", "open", "close"))
+    first_tp, first_sl = first_hits(high, low, tp, sl, side, max_hold, idx)
+
+    status = np.full(len(idx), TIMEOUT, dtype=np.int8)
+    status[first_tp < first_sl] = TP
+    status[(first_sl <= first_tp) & (first_sl < max_hold)] = SL
+    k = np.minimum(np.minimum(first_tp, first_sl), max_hold - 1)   # бар выхода относительно входа - 1
+    exit_i = idx + 1 + k
+    beyond_end = exit_i >= len(ind)
+    exit_i = np.minimum(exit_i, len(ind) - 1)
+    status[(status == TIMEOUT) & beyond_end] = OPEN
+
+    o = open_[exit_i]
+    level = np.where(status == TP, tp, sl)
+    if side == "LONG":
+        gap = np.where(status == TP, o >= level, o <= level)
+    else:
+        gap = np.where(status == TP, o <= level, o >= level)
+    exit_price = np.where(status == TIMEOUT, close[exit_i], np.where(gap, o, level))
+    return exit_i, status, exit_price
+
+
+def prepare_symbol(symbol: str, since_ms: int, until_ms: Optional[int] = None, max_hold: int = MAX_HOLD,
+                   use_model: bool = False, params: Optional[Dict] = None) -> Optional[SymbolArrays]:
+    """params — параметры стратегии (по умолчанию рабочие из core/strategy_params.py)."""
+    loaded = load_indicators(symbol, since_ms, until_ms)
+    if loaded is None:
+        return None
+    ind, in_period, sides, mtf = loaded
+    params = params or load_strategy()
+    ts = ind["timestamp"].to_numpy()
+    close = ind["close"].to_numpy()
+    atr = np.nan_to_num(ind["atr"].to_numpy(), nan=0.0)   # как в generate_signal: нет ATR — 0
+
+    bundle = None
+    if use_model:
+        from core import model_registry
+        bundle = model_registry.current()
+
+    parts = []
+    for side, sign in (("LONG", 1), ("SHORT", -1)):
+        idx = np.flatnonzero(in_period & (sides == side).to_numpy())
+        if not len(idx):
+            continue
+        comps = score_components(ind, side, mtf, params["adx_min"], params["fib_lookback"])
+        comps = comps[COMPONENTS].to_numpy(dtype=np.float32)[idx]
+        tp, sl = tp_sl_levels(close[idx], atr[idx], side, params["pct_tp"], params["pct_sl"])
+        exit_i, status, exit_price = exits(ind, idx, side, tp, sl, max_hold)
+
+        nn = np.full(len(idx), np.nan, dtype=np.float32)
+        if bundle is not None and hasattr(bundle.model, "predict_proba"):
+            X = feature_frame(ind.iloc[idx], side)
+            ok = X.notna().all(axis=1).to_numpy()
+            if ok.any():
+                nn[ok] = bundle.model.predict_proba(bundle.scaler.transform(to_matrix(X[ok])))[:, -1]
+
+        parts.append(SymbolArrays(symbol, ts[idx], np.full(len(idx), sign, dtype=np.int8), comps,
+                                  close[idx], tp, sl, ts[exit_i], exit_price, status, nn))
+    if not parts:
+        return None
+    order = np.argsort(np.concatenate([p.ts for p in parts]), kind="stable")
+    return SymbolArrays(symbol, *(np.concatenate([getattr(p, f) for p in parts])[order]
+                                  for f in SymbolArrays._fields[1:]))
+
+
+# ---------- сделки при заданных весах ----------
+
+def signal_mask(a: SymbolArrays, weights: Dict[str, float] = None, threshold: Optional[float] = None,
+                prob_threshold: Optional[float] = None) -> np.ndarray:
+    """Бары, где generate_signal выдал бы сигнал (модель — если посчитана nn_prob)."""
+    weights = weights or load_strategy()["weights"]
+    threshold = load_strategy()["score_threshold"] if threshold is None else threshold
+    w = np.array([weights[c] for c in COMPONENTS], dtype=np.float32)
+    score = a.comps @ w
+    if prob_threshold is not None:
+        has = ~np.isnan(a.nn_prob)
+        pass_nn = ~has | (a.nn_prob >= prob_threshold)
+        bonus = np.where(has, 10.0 * (a.nn_prob - prob_threshold) / max(1e-6, 1 - prob_threshold), 0.0)
+        score = np.where(has, np.minimum(100.0, score + bonus), score)
+        return pass_nn & (score >= threshold)
+    return score >= threshold
+
+
+def take_trades(a: SymbolArrays, mask: np.ndarray) -> np.ndarray:
+    """
+    Индексы принятых сигналов: одна открытая сделка на монету и один вход в сутки.
+    После входа сразу прыгаем (searchsorted) к первому сигналу после выхода и после конца суток —
+    проход идёт по сделкам, а не по всем сигналам.
+    """
+    sel = np.flatnonzero(mask)
+    entry_ts = a.ts[sel] + BAR_MS
+    taken = []
+    k = 0
+    while k < len(sel):
+        i = sel[k]
+        if a.status[i] == OPEN:
+            k += 1
+            continue
+        taken.append(i)
+        day_end = (entry_ts[k] // DAY_MS + 1) * DAY_MS
+        k = int(np.searchsorted(entry_ts, max(a.exit_ts[i] + 1, day_end)))
+    return np.asarray(taken, dtype=np.int64)
+
+
+def trade_pnl(a: SymbolArrays, idx: np.ndarray, fee: float = FEE, slippage: float = SLIPPAGE):
+    """Цены исполнения и PnL % (без плеча, как _pnl_percent) с комиссией и проскальзыванием."""
+    sign = a.side[idx].astype(float)
+    entry_fill = a.entry[idx] * (1 + sign * slippage)
+    exit_fill = a.exit_price[idx] * (1 - sign * slippage)
+    gross = np.where(sign > 0, exit_fill / entry_fill - 1.0, entry_fill / exit_fill - 1.0)
+    return exit_fill, (gross - 2 * fee) * 100.0
+
+
+def _fmt_ts(ms) -> str:
+    return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def trade_rows(a: SymbolArrays, idx: np.ndarray, fee: float = FEE, slippage: float = SLIPPAGE) -> List[Dict]:
+    exit_fill, pnl = trade_pnl(a, idx, fee, slippage)
+    rows = []
+    for j, i in enumerate(idx):
+        entry, tp, sl = float(a.entry[i]), float(a.tp[i]), float(a.sl[i])
+        risk = abs(entry - sl) / entry * 100.0
+        opened = a.ts[i] + BAR_MS
+        rows.append({
+            "signal_id": f"{a.symbol}:{datetime.fromtimestamp(opened / 1000, tz=timezone.utc):%Y%m%d%H%M%S}",
+            "symbol": a.symbol,
+            "position": "LONG" if a.side[i] > 0 else "SHORT",
+            "entry": round(entry, 6), "tp": round(tp, 6), "sl": round(sl, 6),
+            "risk_pct": DEFAULT_SETTINGS["risk_pct"], "leverage": DEFAULT_SETTINGS["leverage"],
+            "rr_ratio": round(abs(tp - entry) / (abs(entry - sl) + 1e-9), 2),
+            "opened_at": _fmt_ts(opened),
+            "closed_at": _fmt_ts(a.exit_ts[i]),
+            "status": {TP: "TP", SL: "SL", TIMEOUT: "TIMEOUT"}[int(a.status[i])],
+            "closed_price": round(float(exit_fill[j]), 6),
+            "pnl_pct": round(float(pnl[j]), 4),
+            "rr_real": round(float(pnl[j]) / risk, 4) if risk else None,
+            "notes": "backtest",
+        })
+    return rows
+
+
+def summary(pnl: np.ndarray) -> Dict:
+    """Итоги по PnL сделок (в порядке закрытия): доля прибыльных, сумма, profit factor, просадка."""
+    if not len(pnl):
+        return {"trades": 0}
+    equity = np.cumsum(pnl)
+    drawdown = np.max(np.maximum.accumulate(np.r_[0.0, equity])[1:] - equity)
+    gains, losses = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+    return {
+        "trades": int(len(pnl)),
+        "win_rate": round(float((pnl > 0).mean()), 4),
+        "avg_pnl_pct": round(float(pnl.mean()), 4),
+        "total_pnl_pct": round(float(pnl.sum()), 2),
+        "profit_factor": round(float(gains / losses), 3) if losses else None,
+        "max_drawdown_pct": round(float(drawdown), 2),
+    }
+
+
+# ---------- запуск ----------
+
+def _prepare(args):
+    return prepare_symbol(*args)
+
+
+def prepare_all(symbols: List[str], since_ms: int, until_ms: Optional[int], max_hold: int = MAX_HOLD,
+                use_model: bool = False, workers: Optional[int] = None) -> List[SymbolArrays]:
+    """prepare_symbol по всем монетам на всех ядрах."""
+    jobs = [(s, since_ms, until_ms, max_hold, use_model) for s in symbols]
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        return [a for a in pool.map(_prepare, jobs, chunksize=4) if a is not None]
+
+
+def _ms(date: Optional[str]) -> Optional[int]:
+    if not date:
+        return None
+    return int(datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def run(since: str, until: Optional[str] = None, symbols: Optional[List[str]] = None,
+        fee: float = FEE, slippage: float = SLIPPAGE, max_hold: int = MAX_HOLD,
+        use_model: bool = False, workers: Optional[int] = None, out: Optional[str] = None) -> Dict:
+    symbols = symbols or candle_store.symbols(INTERVAL)
+    if not symbols:
+        print(f"❌ Нет свечей {INTERVAL} — сначала python -m train.backfill --interval {INTERVAL}")
+        return {}
+    started = time.monotonic()
+    arrays = prepare_all(symbols, _ms(since), _ms(until), max_hold, use_model, workers)
+    prepared = time.monotonic() - started
+
+    prob_threshold = None
+    if use_model:
+        from core import model_registry
+        bundle = model_registry.current()
+        prob_threshold = bundle.prob_threshold if bundle else None
+
+    rows = []
+    for a in arrays:
+        rows += trade_rows(a, take_trades(a, signal_mask(a, prob_threshold=prob_threshold)), fee, slippage)
+    df = pd.DataFrame(rows, columns=TRADE_COLUMNS).sort_values("closed_at")
+    stats = summary(df["pnl_pct"].to_numpy(dtype=float))
+    stats["by_side"] = {side: summary(g["pnl_pct"].to_numpy(dtype=float)) for side, g in df.groupby("position")}
+
+    out = out or os.path.join(OUT_DIR, f"trades_{datetime.now():%Y%m%d_%H%M%S}.csv")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    df.to_csv(out, index=False)
+    bars = sum(len(a.ts) for a in arrays)
+    print(f"✅ {len(arrays)} монет, {bars} баров-кандидатов, подготовка {prepared:.1f} с, "
+          f"всего {time.monotonic() - started:.1f} с")
+    print(f"📊 {stats}")
+    print(f"📄 Сделки: {out}")
+    return stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Бэктест правил generate_signal на истории 1H-свечей")
+    p.add_argument("--since", required=True, help="YYYY-MM-DD (UTC)")
+    p.add_argument("--until", default=None, help="YYYY-MM-DD (UTC), по умолчанию — до конца истории")
+    p.add_argument("--symbols", default="", help="через запятую; по умолчанию — все из хранилища свечей")
+    p.add_argument("--fee", type=float, default=FEE, help="комиссия с каждой стороны, доля")
+    p.add_argument("--slippage", type=float, default=SLIPPAGE, help="проскальзывание на вход и выход, доля")
+    p.add_argument("--max-hold", type=int, default=MAX_HOLD, help="баров до принудительного выхода")
+    p.add_argument("--model", action="store_true", help="фильтр активной моделью из реестра")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--out", default=None, help="CSV сделок (по умолчанию data/backtest/trades_<время>.csv)")
+    args = p.parse_args(argv)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] or None
+    stats = run(args.since, args.until, symbols, args.fee, args.slippage, args.max_hold,
+                args.model, args.workers, args.out)
+    return 0 if stats else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
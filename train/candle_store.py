@@ -0,0 +1,92 @@
+# train/candle_store.py — компактное хранилище свечей: один parquet-файл на монету
+#
+# data/candles/<interval>/<SYMBOL>.parquet — timestamp (ms) + OHLCV, по возрастанию, без дублей.
+# data/candles/<interval>/_state.json   — чекпоинты бэкфилла (train/backfill.py):
+#   {"BTCUSDT": {"oldest": ms, "newest": ms, "done": true}, ...}
+# Файл перезаписывается атомарно (tmp + replace), поэтому прерванная запись
+# не портит уже сохранённую историю.
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CANDLES_DIR = Path("data") / "candles"
+COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+_state_lock = threading.Lock()
+
+
+def _dir(interval: str) -> Path:
+    return CANDLES_DIR / str(interval)
+
+
+def _file(symbol: str, interval: str) -> Path:
+    return _dir(interval) / f"{symbol}.parquet"
+
+
+def to_frame(rows: List[List]) -> pd.DataFrame:
+    """Сырые свечи Bybit [ts, o, h, l, c, v, turnover] -> таблица COLUMNS."""
+    if not rows:
+        return pd.DataFrame({c: pd.Series(dtype="int64" if c == "timestamp" else "float64") for c in COLUMNS})
+    arr = np.asarray([r[:6] for r in rows], dtype="float64")
+    df = pd.DataFrame(arr, columns=COLUMNS)
+    df["timestamp"] = df["timestamp"].astype("int64")
+    return df
+
+
+def load(symbol: str, interval: str, since_ms: Optional[int] = None) -> pd.DataFrame:
+    path = _file(symbol, interval)
+    if not path.exists():
+        return to_frame([])
+    filters = [("timestamp", ">=", int(since_ms))] if since_ms is not None else None
+    return pd.read_parquet(path, filters=filters).reset_index(drop=True)
+
+
+def merge(symbol: str, interval: str, df: pd.DataFrame) -> int:
+    """Слить новые свечи с сохранёнными (дубли по timestamp — берём новые). Возвращает число добавленных."""
+    if df.empty:
+        return 0
+    old = load(symbol, interval)
+    out = pd.concat([old, df[COLUMNS]], ignore_index=True) if len(old) else df[COLUMNS]
+    out = out.drop_duplicates("timestamp", keep="last").sort_values("timestamp").reset_index(drop=True)
+
+    path = _file(symbol, interval)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    out.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, path)
+    return len(out) - len(old)
+
+
+def symbols(interval: str) -> List[str]:
+    d = _dir(interval)
+    return sorted(p.stem for p in d.glob("*.parquet")) if d.exists() else []
+
+
+# ---------- чекпоинты бэкфилла ----------
+
+def load_state(interval: str) -> Dict[str, Dict]:
+    try:
+        with open(_dir(interval) / "_state.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def update_state(interval: str, symbol: str, **fields) -> Dict:
+    """Обновить чекпоинт одной монеты (потокобезопасно, атомарная запись файла)."""
+    with _state_lock:
+        state = load_state(interval)
+        entry = state.setdefault(symbol, {})
+        entry.update(fields)
+        path = _dir(interval) / "_state.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = str(path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+        return dict(entry)
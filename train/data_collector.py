@@ -3,43 +3,52 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pandas as pd
-from ta.trend import EMAIndicator, MACD
-from ta.momentum import RSIIndicator
-from core.bybit_api import BybitAPI
+from core.features import FEATURE_NAMES, compute_indicators, feature_frame
+from train import candle_store
 
 SAVE_PATH = "./data/market_data.csv"
 SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "AVAXUSDT"]
 INTERVAL = "15"
-LIMIT = 300  # кол-во свечей на одну монету
+LIMIT = 300  # кол-во свечей на одну монету, если истории в хранилище нет
 
-api = BybitAPI()
+# История свечей — из хранилища train/candle_store.py (наполняется python -m train.backfill);
+# API дёргаем только для монет, которых там ещё нет.
+_api = None
+
+
+def _get_api():
+    global _api
+    if _api is None:
+        from core.bybit_api import BybitAPI
+        _api = BybitAPI()
+    return _api
+
+
+def load_candles(symbol: str) -> pd.DataFrame:
+    df = candle_store.load(symbol, INTERVAL)
+    if df.empty:
+        df = candle_store.to_frame(_get_api().get_ohlcv(symbol, interval=INTERVAL, limit=LIMIT))
+    return df.sort_values("timestamp").reset_index(drop=True)
 
-def compute_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    df["ema50"] = EMAIndicator(close=df["close"], window=50).ema_indicator()
-    df["ema200"] = EMAIndicator(close=df["close"], window=200).ema_indicator()
-    df["rsi"] = RSIIndicator(close=df["close"], window=14).rsi()
-    macd = MACD(close=df["close"], window_slow=26, window_fast=12, window_sign=9)
-    df["macd_line"] = macd.macd()
-    df["macd_signal"] = macd.macd_signal()
-    return df
 
 def process_symbol(symbol: str) -> pd.DataFrame:
-    ohlcv = api.get_ohlcv(symbol, interval=INTERVAL, limit=LIMIT)
-    if not ohlcv or len(ohlcv) < 50:
+    df = load_candles(symbol)
+    if len(df) < 50:
         print(f"⚠️ Недостаточно данных для {symbol}")
         return pd.DataFrame()
 
-    df = pd.DataFrame([row[:6] for row in ohlcv], columns=["timestamp", "open", "high", "low", "close", "volume"])
     df = df.astype(float)
+    # индикаторы и фичи — из общего реестра (те же, что у generate_signal)
+    feats = feature_frame(compute_indicators(df.copy()))
+    df = pd.concat([df, feats], axis=1)
     df["symbol"] = symbol
-    df = compute_indicators(df)
-    df.dropna(inplace=True)
+    df.dropna(subset=FEATURE_NAMES, inplace=True)
     return df
 
 def main():
     all_data = []
 
-    for symbol in SYMBOLS:
+    for symbol in candle_store.symbols(INTERVAL) or SYMBOLS:
         print(f"📥 Загрузка {symbol}...")
         df = process_symbol(symbol)
         if not df.empty:
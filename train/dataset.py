@@ -0,0 +1,285 @@
+# train/dataset.py — колоночный датасет (parquet, партиции по дням) для обучения
+#
+# data/dataset/<name>/day=YYYY-MM-DD/part-*.parquet
+#   signals  — сигналы (день по ts), trades — закрытые сделки (день по closed_at),
+#   features — фичи модели на момент сигнала (core/features.py, день по ts),
+#   market   — свечи с фичами из того же реестра и меткой (день по timestamp).
+# Запись только дописывает новые файлы; чтение берёт нужные колонки и
+# отсекает лишние дни по имени партиции, не открывая файлы.
+#
+# Перенос существующих данных: python -m train.dataset convert
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.features import FEATURE_NAMES, FEATURE_VERSION, compute_indicators, feature_frame
+
+DATASET_DIR = Path("data") / "dataset"
+STATE_FILE = DATASET_DIR / "_state.json"   # до какого seq история уже выгружена из БД
+
+_F, _S, _TS = pa.float64(), pa.string(), pa.timestamp("s")
+
+SCHEMAS: Dict[str, pa.Schema] = {
+    "signals": pa.schema([
+        ("signal_id", _S), ("ts", _TS), ("symbol", _S), ("position", _S),
+        ("entry", _F), ("sl", _F), ("tp", _F), ("score", _F), ("confidence", _F),
+        ("rr_ratio", _F), ("timeframe", _S), ("extras", _S),
+        ("leverage", _F), ("risk_pct", _F), ("quality", _S), ("seq", pa.int64()),
+    ]),
+    "trades": pa.schema([
+        ("signal_id", _S), ("symbol", _S), ("position", _S),
+        ("entry", _F), ("tp", _F), ("sl", _F), ("risk_pct", _F), ("leverage", _F), ("rr_ratio", _F),
+        ("opened_at", _TS), ("closed_at", _TS), ("status", _S),
+        ("closed_price", _F), ("pnl_pct", _F), ("rr_real", _F), ("notes", _S), ("seq", pa.int64()),
+    ]),
+    "features": pa.schema(
+        [("signal_id", _S), ("ts", _TS), ("version", pa.int32()), ("seq", pa.int64())]
+        + [(n, _F) for n in FEATURE_NAMES]
+    ),
+    "market": pa.schema(
+        [("timestamp", pa.int64()), ("open", _F), ("high", _F), ("low", _F), ("close", _F),
+         ("volume", _F), ("symbol", _S)]
+        + [(n, _F) for n in FEATURE_NAMES]
+        + [("label", pa.int8())]
+    ),
+}
+
+# колонка времени, по которой режутся дни
+TIME_COLUMN = {"signals": "ts", "trades": "closed_at", "features": "ts", "market": "timestamp"}
+
+_PARTITIONING = ds.partitioning(pa.schema([("day", _S)]), flavor="hive")
+
+
+def _path(name: str) -> Path:
+    return DATASET_DIR / name
+
+
+def _to_time(name: str, value) -> pa.Scalar:
+    """Граница периода в типе колонки времени датасета."""
+    t = pd.Timestamp(value)
+    if name == "market":
+        return pa.scalar(int(t.timestamp() * 1000), pa.int64())
+    return pa.scalar(t.to_pydatetime().replace(microsecond=0), _TS)
+
+
+def _typed(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    schema = SCHEMAS[name]
+    out = pd.DataFrame(index=df.index)
+    for field in schema:
+        col = df[field.name] if field.name in df.columns else pd.Series(None, index=df.index)
+        if pa.types.is_timestamp(field.type):
+            out[field.name] = pd.to_datetime(col, errors="coerce").dt.floor("s")
+        elif pa.types.is_floating(field.type):
+            out[field.name] = pd.to_numeric(col, errors="coerce").astype("float64")
+        elif pa.types.is_integer(field.type):
+            out[field.name] = pd.to_numeric(col, errors="coerce").astype("Int64")
+        else:
+            out[field.name] = col.where(col.notna(), None).map(lambda v: v if v is None else str(v))
+    return out
+
+
+# ---------- запись ----------
+
+def append(name: str, df: pd.DataFrame) -> int:
+    """Дописать строки в датасет (новый файл в каждой затронутой дневной партиции)."""
+    if df is None or df.empty:
+        return 0
+    df = _typed(name, df)
+    tcol = TIME_COLUMN[name]
+    df = df[df[tcol].notna()]
+    if df.empty:
+        return 0
+    if name == "market":
+        day = pd.to_datetime(df[tcol], unit="ms")
+    else:
+        day = df[tcol]
+    df = df.assign(day=day.dt.strftime("%Y-%m-%d"))
+
+    schema = SCHEMAS[name].append(pa.field("day", _S))
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=False)
+    ds.write_dataset(
+        table, _path(name), format="parquet", partitioning=_PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+# ---------- чтение ----------
+
+def read(name: str, columns: Optional[List[str]] = None,
+         since=None, until=None, signal_ids: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Строки датасета с временем в [since, until), только колонки `columns`.
+    Лишние дни отсекаются по партициям, остальное — фильтром по колонке времени.
+    signal_ids — оставить только эти сигналы/сделки.
+    """
+    path = _path(name)
+    cols = list(columns) if columns else SCHEMAS[name].names
+    if not path.exists():
+        return pd.DataFrame(columns=cols)
+
+    dataset = ds.dataset(path, format="parquet", partitioning=_PARTITIONING,
+                         schema=SCHEMAS[name].append(pa.field("day", _S)))
+    tcol = TIME_COLUMN[name]
+    flt = None
+    for bound, op in ((since, "ge"), (until, "lt")):
+        if bound is None:
+            continue
+        day = pd.Timestamp(bound).strftime("%Y-%m-%d")
+        day_expr = ds.field("day") >= day if op == "ge" else ds.field("day") <= day
+        t = _to_time(name, bound)
+        t_expr = ds.field(tcol) >= t if op == "ge" else ds.field(tcol) < t
+        expr = day_expr & t_expr
+        flt = expr if flt is None else flt & expr
+    if signal_ids is not None:
+        expr = ds.field("signal_id").isin(list(signal_ids))
+        flt = expr if flt is None else flt & expr
+    return dataset.to_table(columns=cols, filter=flt).to_pandas()
+
+
+def _dedup_last(df: pd.DataFrame, keep_seq: bool = False) -> pd.DataFrame:
+    """
+    Сигнал/сделка могли выгружаться повторно (перезакрытие) — берём версию с наибольшим
+    seq. Порядок файлов (part-<uuid>) случаен, поэтому «последняя прочитанная» не годится;
+    строки старых выгрузок без seq проигрывают любой новой. keep_seq — оставить колонку seq.
+    """
+    if df.empty or "signal_id" not in df.columns:
+        return df
+    if "seq" in df.columns:
+        df = df.sort_values("seq", na_position="first", kind="stable")
+    df = df.drop_duplicates("signal_id", keep="last")
+    return df if keep_seq else df.drop(columns=["seq"], errors="ignore")
+
+
+def training_frame(signal_columns: List[str], since=None) -> pd.DataFrame:
+    """
+    signals ⋈ trades по signal_id (как db.history.training_rows), только нужные колонки.
+    seq — номер изменения строки сделки (для чекпоинта переобучения; у старых выгрузок пуст).
+    """
+    trades = _dedup_last(read("trades", ["signal_id", "status", "closed_price", "pnl_pct", "closed_at", "seq"],
+                              since=since), keep_seq=True)
+    if trades.empty:
+        return pd.DataFrame(columns=list(signal_columns) + list(trades.columns))
+    cols = ["signal_id"] + [c for c in signal_columns if c not in ("signal_id", "seq")] + ["seq"]
+    ids = None if since is None else trades["signal_id"].tolist()
+    signals = _dedup_last(read("signals", cols, signal_ids=ids))
+    return signals.merge(trades, on="signal_id", how="inner").sort_values("closed_at").reset_index(drop=True)
+
+
+def feature_training_frame(since=None) -> pd.DataFrame:
+    """
+    Сделки с известным исходом + фичи, сохранённые в момент сигнала (текущей версии реестра).
+    Колонки: signal_id, position, pnl_pct, closed_at, seq + FEATURE_NAMES. Сигналы без фичей пропускаются.
+    """
+    df = training_frame(["position"], since=since)
+    if df.empty:
+        return pd.DataFrame(columns=["signal_id", "position", "pnl_pct", "closed_at", "seq"] + FEATURE_NAMES)
+    feats = _dedup_last(read("features", ["signal_id", "version", "seq"] + FEATURE_NAMES,
+                             signal_ids=df["signal_id"].tolist()))
+    feats = feats[feats["version"] == FEATURE_VERSION].drop(columns=["version"])
+    return df.merge(feats, on="signal_id", how="inner").reset_index(drop=True)
+
+
+# ---------- выгрузка истории из БД ----------
+
+def _load_state() -> Dict:
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_state(state: Dict):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = str(STATE_FILE) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, STATE_FILE)
+
+
+def _expand_features(rows: List[Dict]) -> List[Dict]:
+    """signal_features.features (JSON) -> колонки по реестру."""
+    out = []
+    for r in rows:
+        try:
+            feats = json.loads(r["features"]) if r.get("features") else {}
+        except ValueError:
+            feats = {}
+        out.append({"signal_id": r["signal_id"], "ts": r["ts"], "version": r["version"], "seq": r.get("seq"),
+                    **{n: feats.get(n) for n in FEATURE_NAMES}})
+    return out
+
+
+def sync_history() -> Dict[str, int]:
+    """
+    Дописать в датасет сигналы, сделки и фичи, изменившиеся в БД после прошлой выгрузки.
+    Отметка — seq (номер изменения строки, db/database._m5_change_seq), а не время строки:
+    сделка, закрытая задним числом, или дополненный сигнал выгружаются заново,
+    повторы схлопывает _dedup_last.
+    """
+    from db.database import connection
+
+    state = _load_state()
+    added = {}
+    for name, table, tcol in (("signals", "signals", "ts"), ("trades", "trades", "closed_at"),
+                              ("features", "signal_features", "ts")):
+        last = state.get(name)
+        if not isinstance(last, int):
+            last = 0   # нет отметки или старая (по времени) — выгружаем всё, дубли схлопнутся при чтении
+        with connection() as conn:
+            rows = [dict(r) for r in conn.execute(
+                f"SELECT * FROM {table} WHERE seq > ? ORDER BY seq", (last,)
+            ).fetchall()]
+        exported = [r for r in rows if r.get(tcol) is not None]
+        frame = pd.DataFrame(_expand_features(exported) if name == "features" else exported)
+        added[name] = append(name, frame)
+        if rows:
+            state[name] = rows[-1]["seq"]
+    _save_state(state)
+    return added
+
+
+# ---------- перенос существующих CSV ----------
+
+def market_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Свечи (timestamp, OHLCV, symbol[, label]) -> + фичи реестра, по каждой монете отдельно."""
+    parts = []
+    for _, g in df.sort_values("timestamp").groupby("symbol", sort=False):
+        g = compute_indicators(g.copy())
+        parts.append(pd.concat([g, feature_frame(g)], axis=1))
+    if not parts:
+        return df
+    out = pd.concat(parts)
+    return out.loc[:, ~out.columns.duplicated(keep="last")]
+
+def convert_csv(labeled_csv: str = os.path.join("train", "labeled_market_data.csv")) -> Dict[str, int]:
+    """
+    Разовый перенос: размеченные свечи из CSV + вся история сигналов/сделок.
+    signals_log.csv / trades_log.csv уже лежат в БД (миграция db/import_logs) —
+    берём их оттуда, чтобы не разбирать смешанные раскладки второй раз.
+    """
+    out = {}
+    if os.path.exists(labeled_csv):
+        out["market"] = append("market", market_features(pd.read_csv(labeled_csv)))
+    out.update(sync_history())
+    return out
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["convert"]:
+        from db.database import init_db
+        init_db()
+        print(f"✅ Конвертировано в {DATASET_DIR}: {convert_csv(*sys.argv[2:3])}")
+    else:
+        print("usage: python -m train.dataset convert [labeled_market_data.csv]")
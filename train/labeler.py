@@ -0,0 +1,178 @@
+# train/labeler.py — разметка истории свечей «тройным барьером»
+#
+# Для каждого бара: вход по close, TP/SL — по правилам generate_signal
+# (core/risk_manager.tp_sl_levels: 3.5% / 2 ATR и 1.5% / 1 ATR), дальше смотрим
+# следующие `horizon` баров — что задето первым:
+#   outcome =  1 — TP, -1 — SL, 0 — таймаут (ни один уровень за horizon баров).
+# Если TP и SL внутри одного бара — считаем SL (как trade_tracker без ленты сделок).
+# label = 1 только для TP — та же метка «успех сигнала», что у модели.
+#
+# Считается целиком в NumPy: окна high/low (sliding_window_view) сравниваются
+# с уровнями всех баров сразу, кусками по CHUNK_CELLS // horizon строк, чтобы не раздувать память.
+#
+# Запуск из корня проекта (свечи — из train/candle_store.py, см. train/backfill.py):
+#   python -m train.labeler [--interval 60] [--horizon 48] [--sides LONG,SHORT] [--symbols BTCUSDT,...]
+# Результат: data/labeled/<interval>/h<horizon>/<SYMBOL>.parquet (перезаписывается целиком).
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.features import FEATURE_NAMES, compute_indicators, feature_frame
+from core.risk_manager import tp_sl_levels
+from train import candle_store
+
+LABELED_DIR = Path("data") / "labeled"
+DEFAULT_INTERVAL = "60"   # стратегия работает на 1H
+DEFAULT_HORIZON = 48      # баров до таймаута (48 × 1H = двое суток)
+CHUNK_CELLS = 4_000_000   # ячеек окна на один проход: с index окна копируются (float64, ~32 МБ)
+
+TP, SL, TIMEOUT = 1, -1, 0
+
+
+def first_hits(high: np.ndarray, low: np.ndarray, tp: np.ndarray, sl: np.ndarray,
+               side: str, horizon: int, index: Optional[np.ndarray] = None):
+    """
+    Через сколько баров (0 — следующий бар) впервые задеты TP и SL; horizon — не задет.
+    tp/sl — уровни для баров index (по умолчанию для всех), окно — следующие horizon баров.
+    """
+    n = len(high)
+    full = index is None
+    index = np.arange(n) if full else np.asarray(index)
+    # окно i — бары i+1 … i+horizon; хвост добиваем NaN (сравнения с NaN ложны)
+    pad = np.full(horizon, np.nan)
+    win_high = sliding_window_view(np.concatenate([high[1:], pad]), horizon)
+    win_low = sliding_window_view(np.concatenate([low[1:], pad]), horizon)
+
+    m = len(index)
+    first_tp = np.full(m, horizon, dtype=np.int32)
+    first_sl = np.full(m, horizon, dtype=np.int32)
+    chunk = max(1, CHUNK_CELLS // horizon)   # строк за проход — чем длиннее окно, тем меньше
+    for s in range(0, m, chunk):
+        e = min(s + chunk, m)
+        rows = slice(s, e) if full else index[s:e]   # срез — без копии окон
+        if side == "LONG":
+            hit_tp = win_high[rows] >= tp[s:e, None]
+            hit_sl = win_low[rows] <= sl[s:e, None]
+        else:
+            hit_tp = win_low[rows] <= tp[s:e, None]
+            hit_sl = win_high[rows] >= sl[s:e, None]
+        any_tp, any_sl = hit_tp.any(axis=1), hit_sl.any(axis=1)
+        first_tp[s:e] = np.where(any_tp, hit_tp.argmax(axis=1), horizon)
+        first_sl[s:e] = np.where(any_sl, hit_sl.argmax(axis=1), horizon)
+    return first_tp, first_sl
+
+
+def triple_barrier(high: np.ndarray, low: np.ndarray, close: np.ndarray, atr: np.ndarray,
+                   side: str, horizon: int) -> Dict[str, np.ndarray]:
+    """
+    Исход входа на каждом баре. Возвращает массивы длины n:
+      outcome (int8), bars — через сколько баров задет уровень (horizon при таймауте),
+      ret — доход по направлению сделки на выходе (уровень или close через horizon),
+      valid — можно ли доверять исходу (есть ATR и либо уровень задет, либо хватило баров).
+    """
+    high, low, close = (np.asarray(a, dtype="float64") for a in (high, low, close))
+    atr = np.asarray(atr, dtype="float64")
+    n = len(close)
+    tp, sl = tp_sl_levels(close, atr, side)
+    first_tp, first_sl = first_hits(high, low, tp, sl, side, horizon)
+
+    outcome = np.full(n, TIMEOUT, dtype=np.int8)
+    outcome[first_tp < first_sl] = TP
+    outcome[(first_sl <= first_tp) & (first_sl < horizon)] = SL   # один бар — SL
+    bars = np.minimum(first_tp, first_sl) + 1
+
+    sign = 1.0 if side == "LONG" else -1.0
+    idx = np.arange(n)
+    timeout_close = np.full(n, np.nan)
+    timeout_close[: max(n - horizon, 0)] = close[horizon:]
+    exit_price = np.where(outcome == TP, tp, np.where(outcome == SL, sl, timeout_close))
+    ret = sign * (exit_price / close - 1.0)
+
+    valid = ~np.isnan(atr) & ((outcome != TIMEOUT) | (idx + horizon < n))
+    bars = np.where(outcome == TIMEOUT, horizon, bars).astype(np.int16)
+    return {"outcome": outcome, "bars": bars, "ret": ret, "valid": valid}
+
+
+def label_frame(candles: pd.DataFrame, horizon: int = DEFAULT_HORIZON,
+                sides: Iterable[str] = ("LONG", "SHORT")) -> pd.DataFrame:
+    """Свечи одной монеты (timestamp + OHLCV) -> строки: свеча, сторона, фичи реестра, исход и метка."""
+    ind = compute_indicators(candles.sort_values("timestamp").reset_index(drop=True).astype(float))
+    parts = []
+    for side in sides:
+        res = triple_barrier(ind["high"].values, ind["low"].values, ind["close"].values,
+                             ind["atr"].values, side, horizon)
+        part = pd.concat([ind[candle_store.COLUMNS], feature_frame(ind, side)], axis=1)
+        part["position"] = side
+        part["outcome"] = res["outcome"]
+        part["bars"] = res["bars"]
+        part["ret"] = res["ret"]
+        part["label"] = (res["outcome"] == TP).astype(np.int8)
+        parts.append(part[res["valid"]])
+    out = pd.concat(parts, ignore_index=True)
+    out["timestamp"] = out["timestamp"].astype("int64")
+    return out.dropna(subset=FEATURE_NAMES)
+
+
+def _dir(interval: str, horizon: int) -> Path:
+    return LABELED_DIR / str(interval) / f"h{horizon}"
+
+
+def label_symbol(symbol: str, interval: str = DEFAULT_INTERVAL, horizon: int = DEFAULT_HORIZON,
+                 sides: Iterable[str] = ("LONG", "SHORT")) -> int:
+    candles = candle_store.load(symbol, interval)
+    if len(candles) <= horizon:
+        return 0
+    df = label_frame(candles, horizon, sides)
+    df["symbol"] = symbol
+    path = _dir(interval, horizon) / f"{symbol}.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, path)
+    return len(candles)
+
+
+def load_labeled(interval: str = DEFAULT_INTERVAL, horizon: int = DEFAULT_HORIZON,
+                 columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Все размеченные строки для интервала и горизонта (пусто, если разметки ещё не было)."""
+    files = sorted(_dir(interval, horizon).glob("*.parquet"))
+    if not files:
+        return pd.DataFrame(columns=columns or [])
+    return pd.concat([pd.read_parquet(f, columns=columns) for f in files], ignore_index=True)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Разметка свечей тройным барьером (TP / SL / таймаут)")
+    p.add_argument("--interval", default=DEFAULT_INTERVAL)
+    p.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="баров до таймаута")
+    p.add_argument("--sides", default="LONG,SHORT")
+    p.add_argument("--symbols", default="", help="через запятую; по умолчанию — все из хранилища свечей")
+    args = p.parse_args(argv)
+
+    sides = [s.strip().upper() for s in args.sides.split(",") if s.strip()]
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] \
+        or candle_store.symbols(args.interval)
+    if not symbols:
+        print(f"❌ Нет свечей интервала {args.interval} — сначала python -m train.backfill")
+        return 1
+
+    started, bars = time.monotonic(), 0
+    for symbol in symbols:
+        bars += label_symbol(symbol, args.interval, args.horizon, sides)
+    elapsed = time.monotonic() - started
+    print(f"✅ Размечено {bars:,} баров × {len(sides)} стор. по {len(symbols)} монетам за {elapsed:.1f} с "
+          f"({bars / max(elapsed, 1e-9):,.0f} баров/с) -> {_dir(args.interval, args.horizon)}".replace(",", " "))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# train/model_search.py — подбор гиперпараметров модели и порога вероятности
+#
+# Запуск из корня проекта:
+#   python -m train.model_search [--source labeled|trades] [--horizon 48] [--splits 5]
+#                                [--workers N] [--max-rows 500000] [--save]
+# Кросс-валидация по времени: история делится на splits+1 блоков по времени,
+# фолд k учится на всём до блока k (минус embargo — горизонт разметки, чтобы
+# метки обучения не заглядывали в тест) и проверяется на блоке k.
+# Фолды (отмасштабированные матрицы) готовятся один раз и лежат в памяти воркеров;
+# конфигурации сетки считаются параллельно на всех ядрах. Конфигурация, которая
+# после PRUNE_AFTER фолдов заметно хуже лучшей на данный момент, снимается.
+# По out-of-fold вероятностям лучшей конфигурации строится таблица
+# precision/recall для каждого порога; отчёт — model/search_report.json,
+# --save записывает параметры и порог в model/model_params.json.
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.features import FEATURE_NAMES, to_matrix
+from core.model_params import DEFAULT_PARAMS, mlp_kwargs, save_params
+
+REPORT_PATH = os.path.join("model", "search_report.json")
+
+GRID = {
+    "hidden_layer_sizes": [[32], [64, 32], [128, 64], [64, 32, 16]],
+    "alpha": [1e-4, 1e-3, 1e-2],
+    "learning_rate_init": [1e-3, 3e-3],
+}
+THRESHOLDS = [round(t, 2) for t in np.arange(0.40, 0.905, 0.05)]
+N_SPLITS = 5
+MAX_ITER = 200
+PRUNE_AFTER = 2       # фолдов, после которых конфигурацию можно снять
+PRUNE_MARGIN = 0.02   # насколько средний AP может отставать от лучшего
+BETA = 0.5            # порог выбираем по F0.5 — точность важнее полноты
+MIN_RECALL = 0.05     # порог, отсекающий почти все сигналы, не берём
+
+
+class Fold(NamedTuple):
+    X_train: np.ndarray
+    y_train: np.ndarray
+    X_test: np.ndarray
+    y_test: np.ndarray
+
+
+# ---------- данные и фолды ----------
+
+def load_data(source: str, horizon: int, max_rows: Optional[int] = None):
+    """X (float32), y (0/1), t (время строки, int) — по возрастанию времени; embargo в уникальных метках времени."""
+    if source == "trades":
+        from train import dataset
+        df = dataset.feature_training_frame()
+        df["t"] = pd.to_datetime(df["closed_at"]).astype("int64")
+        df["label"] = (pd.to_numeric(df["pnl_pct"], errors="coerce").fillna(0.0) > 0).astype(int)
+        embargo = 0
+    else:
+        from train import labeler
+        df = labeler.load_labeled(labeler.DEFAULT_INTERVAL, horizon, ["timestamp", "label"] + FEATURE_NAMES)
+        df["t"] = df["timestamp"].astype("int64")
+        embargo = horizon
+    df = df.dropna(subset=FEATURE_NAMES + ["label"]).sort_values("t", kind="stable")
+    if max_rows:
+        df = df.tail(max_rows)   # самые свежие строки
+    X = to_matrix(df).to_numpy(dtype=np.float32)
+    return X, df["label"].to_numpy(dtype=np.int8), df["t"].to_numpy(), embargo
+
+
+def make_folds(X: np.ndarray, y: np.ndarray, t: np.ndarray, n_splits: int, embargo: int) -> List[Fold]:
+    from sklearn.preprocessing import StandardScaler
+
+    times = np.unique(t)
+    blocks = np.array_split(np.arange(len(times)), n_splits + 1)
+    folds = []
+    for block in blocks[1:]:
+        test_lo, test_hi = times[block[0]], times[block[-1]]
+        train_end = times[max(block[0] - embargo, 0)]
+        tr = t < train_end
+        te = (t >= test_lo) & (t <= test_hi)
+        if tr.sum() == 0 or te.sum() == 0 or len(np.unique(y[tr])) < 2:
+            continue
+        scaler = StandardScaler().fit(X[tr])
+        folds.append(Fold(scaler.transform(X[tr]).astype(np.float32), y[tr],
+                          scaler.transform(X[te]).astype(np.float32), y[te]))
+    return folds
+
+
+# ---------- воркеры ----------
+
+_FOLDS: List[Fold] = []
+_BEST = None   # mp.Value: лучший средний AP среди досчитанных конфигураций
+
+
+def _init(folds, best):
+    global _FOLDS, _BEST
+    if folds is not None:
+        _FOLDS = folds
+    _BEST = best
+    try:
+        # параллелимся процессами — BLAS внутри каждого в один поток
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def _evaluate(params: Dict) -> Dict:
+    from sklearn.exceptions import ConvergenceWarning
+    from sklearn.metrics import average_precision_score
+    from sklearn.neural_network import MLPClassifier
+
+    started = time.monotonic()
+    scores, probs = [], []
+    for k, fold in enumerate(_FOLDS, start=1):
+        model = MLPClassifier(**mlp_kwargs({**DEFAULT_PARAMS, **params}), max_iter=MAX_ITER, random_state=42)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", ConvergenceWarning)
+            model.fit(fold.X_train, fold.y_train)
+        p = model.predict_proba(fold.X_test)[:, -1]
+        probs.append(p.astype(np.float32))
+        scores.append(float(average_precision_score(fold.y_test, p)) if fold.y_test.any() else 0.0)
+        mean = float(np.mean(scores))
+        if PRUNE_AFTER <= k < len(_FOLDS) and mean < _BEST.value - PRUNE_MARGIN:
+            return {"params": params, "ap": mean, "folds": k, "pruned": True,
+                    "seconds": round(time.monotonic() - started, 1)}
+
+    with _BEST.get_lock():
+        _BEST.value = max(_BEST.value, mean)
+    return {"params": params, "ap": mean, "fold_ap": scores, "folds": len(scores), "pruned": False,
+            "seconds": round(time.monotonic() - started, 1), "probs": np.concatenate(probs)}
+
+
+def _pool(workers: int, folds: List[Fold]):
+    # fork: фолды наследуются от родителя без копирования по каждому воркеру
+    if "fork" in mp.get_all_start_methods():
+        ctx = mp.get_context("fork")
+        global _FOLDS
+        _FOLDS = folds
+        best = ctx.Value("d", -1.0)
+        return ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init, initargs=(None, best))
+    ctx = mp.get_context()
+    best = ctx.Value("d", -1.0)
+    return ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init, initargs=(folds, best))
+
+
+# ---------- пороги ----------
+
+def threshold_table(y: np.ndarray, p: np.ndarray, thresholds=THRESHOLDS) -> List[Dict]:
+    pos = max(int(y.sum()), 1)
+    rows = []
+    for th in thresholds:
+        pred = p >= th
+        tp = int((pred & (y == 1)).sum())
+        n = int(pred.sum())
+        precision = tp / n if n else 0.0
+        recall = tp / pos
+        f = (1 + BETA ** 2) * precision * recall / (BETA ** 2 * precision + recall) if tp else 0.0
+        rows.append({"threshold": th, "precision": round(precision, 4), "recall": round(recall, 4),
+                     "signals": n, "signal_rate": round(n / max(len(y), 1), 4), "f_beta": round(f, 4)})
+    return rows
+
+
+def best_threshold(table: List[Dict]) -> Dict:
+    ok = [r for r in table if r["recall"] >= MIN_RECALL] or table
+    return max(ok, key=lambda r: (r["f_beta"], r["precision"]))
+
+
+# ---------- запуск ----------
+
+def grid() -> List[Dict]:
+    keys = list(GRID)
+    return [dict(zip(keys, values)) for values in itertools.product(*(GRID[k] for k in keys))]
+
+
+def run(source="labeled", horizon=48, n_splits=N_SPLITS, workers=None,
+        max_rows=None, save=False) -> Optional[Dict]:
+    X, y, t, embargo = load_data(source, horizon, max_rows)
+    folds = make_folds(X, y, t, n_splits, embargo)
+    if not folds:
+        print(f"❌ Недостаточно данных для кросс-валидации ({len(y)} строк)")
+        return None
+    y_oof = np.concatenate([f.y_test for f in folds])
+    configs = grid()
+    workers = workers or os.cpu_count() or 1
+    rows = f"{len(y):,}".replace(",", " ")
+    print(f"🔎 {len(configs)} конфигураций × {len(folds)} фолдов, {rows} строк, {workers} процессов")
+
+    started = time.monotonic()
+    results = []
+    with _pool(workers, folds) as pool:
+        futures = [pool.submit(_evaluate, c) for c in configs]
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            mark = "✂️ снята" if r["pruned"] else "✅"
+            print(f"{mark} {r['params']} AP={r['ap']:.4f} ({r['folds']} фолд., {r['seconds']} с)")
+
+    done = sorted((r for r in results if not r["pruned"]), key=lambda r: -r["ap"])
+    best = done[0]
+    table = threshold_table(y_oof, best["probs"])
+    chosen = best_threshold(table)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source": source, "horizon": horizon, "rows": int(len(y)), "folds": len(folds),
+        "positive_rate": round(float(y_oof.mean()), 4),
+        "seconds": round(time.monotonic() - started, 1),
+        "best": {"params": best["params"], "ap": best["ap"], "fold_ap": best["fold_ap"],
+                 "prob_threshold": chosen["threshold"]},
+        "thresholds": table,
+        "configs": [{k: v for k, v in r.items() if k != "probs"} for r in sorted(results, key=lambda r: -r["ap"])],
+    }
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n🏆 Лучшая: {best['params']} AP={best['ap']:.4f} "
+          f"(снято {len(results) - len(done)} из {len(results)}, {report['seconds']} с)")
+    print(f"{'порог':>6} {'precision':>10} {'recall':>8} {'сигналов':>9} {'F0.5':>7}")
+    for r in table:
+        star = " ←" if r is chosen else ""
+        print(f"{r['threshold']:>6.2f} {r['precision']:>10.2%} {r['recall']:>8.2%} {r['signals']:>9} {r['f_beta']:>7.3f}{star}")
+    print(f"📄 Отчёт: {REPORT_PATH}")
+
+    if save:
+        save_params({**best["params"], "prob_threshold": chosen["threshold"]},
+                    searched_at=report["created_at"], cv_ap=round(best["ap"], 4))
+        print("💾 Параметры и порог записаны в model/model_params.json — переобучите модель")
+    return report
+
+
+def main(argv=None):
+    from train.labeler import DEFAULT_HORIZON
+
+    p = argparse.ArgumentParser(description="Подбор гиперпараметров и порога вероятности (CV по времени)")
+    p.add_argument("--source", choices=("labeled", "trades"), default="labeled",
+                   help="labeled — разметка истории (train/labeler.py), trades — закрытые сделки бота")
+    p.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    p.add_argument("--splits", type=int, default=N_SPLITS)
+    p.add_argument("--workers", type=int, default=None, help="по умолчанию — все ядра")
+    p.add_argument("--max-rows", type=int, default=None, help="взять только самые свежие N строк")
+    p.add_argument("--save", action="store_true", help="записать лучшие параметры в model/model_params.json")
+    args = p.parse_args(argv)
+    report = run(args.source, args.horizon, args.splits, args.workers, args.max_rows, args.save)
+    return 0 if report else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+# train/retrain_worker.py — само переобучение, в отдельном процессе
+#
+# Запускается из train/auto_retrain.py: python -m train.retrain_worker [--full]
+# По умолчанию дообучает модель на сделках, которых ещё нет в чекпоинте;
+# полностью переобучает, если чекпоинта нет, прошло FULL_RETRAIN_DAYS или --full.
+# В stdout пишет JSON-строки:
+#   {"type": "progress", "epoch": 12, "loss": 0.53}
+#   {"type": "done", "mode": "full"|"incremental", "acc": 0.61, "samples": 140, "epochs": 87,
+#    "version": "v0007", "promoted": true, "gate": "ok"}
+# Новая версия сохраняется в реестр core/model_registry.py и становится активной,
+# только если прошла проверки точности и задержки.
+#   {"type": "error", "message": "..."}
+import json
+import os
+import sys
+import warnings
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+MODEL_DIR    = Path("model")
+STATE_PATH   = MODEL_DIR / "retrain_state.json"   # чекпоинт: full_seq + сделки дообучения после него
+
+MIN_SAMPLES = 80       # минимум примеров для тренировки
+MAX_EPOCHS = 600       # как max_iter у прежнего fit()
+TOL = 1e-4             # критерий остановки — как у MLPClassifier по умолчанию
+N_ITER_NO_CHANGE = 10
+INCREMENTAL_EPOCHS = 5   # эпох partial_fit на новых сделках
+VAL_SHARE = 0.2          # самые свежие новые сделки — валидация дообучения
+MIN_VAL = 10             # меньше — не дообучаем: выставлять без проверки нельзя
+FULL_RETRAIN_DAYS = 7    # полное переобучение не реже раза в неделю
+
+# лимиты процесса (0 — без лимита)
+MEM_LIMIT_MB = int(os.getenv("RETRAIN_MEM_MB", "2048"))
+CPU_LIMIT_SEC = int(os.getenv("RETRAIN_CPU_SEC", "1800"))
+NICE = 10
+
+
+def emit(**msg):
+    sys.stdout.write(json.dumps(msg, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def apply_limits():
+    """Память/CPU/приоритет — чтобы обучение не мешало боту на той же машине."""
+    try:
+        import resource
+        if MEM_LIMIT_MB:
+            lim = MEM_LIMIT_MB * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (lim, lim))
+        if CPU_LIMIT_SEC:
+            resource.setrlimit(resource.RLIMIT_CPU, (CPU_LIMIT_SEC, CPU_LIMIT_SEC + 5))
+    except (ImportError, ValueError, OSError):
+        pass  # не Unix или лимиты не разрешены — обучаемся без них
+    try:
+        os.nice(NICE)
+    except (AttributeError, OSError):
+        pass
+
+
+def _features(df):
+    """Фичи, сохранённые в момент сигнала, — в порядке реестра core/features.py (без пересчёта)."""
+    from core.features import to_matrix
+    return to_matrix(df)
+
+
+def _load_state() -> dict:
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_state(state: dict):
+    tmp = str(STATE_PATH) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, STATE_PATH)
+
+
+def _publish(model, scaler, metrics: dict, parent: str = None) -> dict:
+    """Новая версия в реестр и попытка сделать её активной (проверки точности и задержки)."""
+    from core import model_registry
+
+    version = model_registry.register(model, scaler, metrics, parent=parent)
+    promoted, gate = model_registry.promote(version)
+    return {"version": version, "promoted": promoted, "gate": gate}
+
+
+def _labels(df):
+    import pandas as pd
+    # Метка класса из результата сделки
+    return (pd.to_numeric(df["pnl_pct"], errors="coerce").fillna(0.0) > 0.0).astype(int)
+
+
+def _seq(df):
+    """seq сделок; у строк старых выгрузок (без seq) — 0, т.е. «видела полная тренировка»."""
+    import pandas as pd
+    return pd.to_numeric(df["seq"], errors="coerce").fillna(0).astype("int64")
+
+
+def _checkpoint(state: dict, df, full: bool):
+    """
+    Запоминаем, какие сделки модель уже видела: после полного переобучения — отметку
+    full_seq (все сделки с seq до неё) и пустой consumed; дообучение дописывает в consumed
+    только свои сделки, так что список не растёт дольше FULL_RETRAIN_DAYS.
+    """
+    if full:
+        from core.features import FEATURE_VERSION
+        state["full_seq"] = int(_seq(df).max()) if len(df) else 0
+        state["consumed"] = []
+        state["last_full"] = datetime.now().isoformat(timespec="seconds")
+        state["feature_version"] = FEATURE_VERSION
+    else:
+        state["consumed"] = sorted(set(state.get("consumed", [])) | set(df["signal_id"].astype(str)))
+    state.pop("last_closed_at", None)   # чекпоинт старого формата
+    return state
+
+
+def _need_full(state: dict) -> str:
+    """Причина полного переобучения или '' — можно дообучить."""
+    from core import model_registry
+    if not model_registry.current_version():
+        return "нет модели в реестре"
+    if not state.get("last_full") or "full_seq" not in state:
+        return "нет чекпоинта"
+    from core.features import FEATURE_VERSION
+    if state.get("feature_version") != FEATURE_VERSION:
+        return "сменилась версия фичей"
+    age = datetime.now() - datetime.fromisoformat(state["last_full"])
+    if age.days >= FULL_RETRAIN_DAYS:
+        return f"плановое, раз в {FULL_RETRAIN_DAYS} дн."
+    return ""
+
+
+def train_full(state: dict, reason: str):
+    import numpy as np
+    from sklearn.exceptions import ConvergenceWarning
+    from sklearn.model_selection import train_test_split
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    from train import dataset
+
+    # 1) Сделки с известным исходом + фичи на момент сигнала — вся история
+    df = dataset.feature_training_frame()
+    df = df[_features(df).notna().all(axis=1)]
+    if len(df) < MIN_SAMPLES:
+        emit(type="error", message=f"Недостаточно примеров для переобучения: {len(df)} < {MIN_SAMPLES}")
+        return 2
+
+    # 2) Фичи и разбиение
+    y = _labels(df)
+    X = _features(df)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y.values, test_size=0.2, random_state=42, stratify=y.values
+    )
+
+    # 3) Скейлер и модель: эпохи крутим сами, чтобы отдавать прогресс
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled  = scaler.transform(X_test)
+
+    from core.model_params import mlp_kwargs
+    model = MLPClassifier(**mlp_kwargs(), max_iter=MAX_EPOCHS, random_state=42)
+    classes = np.unique(y_train)
+    best, stale, epoch = np.inf, 0, 0
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        for epoch in range(1, MAX_EPOCHS + 1):
+            model.partial_fit(X_train_scaled, y_train, classes=classes)
+            loss = float(model.loss_)
+            emit(type="progress", epoch=epoch, loss=round(loss, 6))
+            if loss > best - TOL:
+                stale += 1
+                if stale >= N_ITER_NO_CHANGE:
+                    break
+            else:
+                stale = 0
+            best = min(best, loss)
+
+    acc = float(model.score(X_test_scaled, y_test))
+    published = _publish(model, scaler, {"mode": "full", "acc": acc, "samples": len(df), "epochs": epoch})
+    if published["promoted"]:
+        _save_state(_checkpoint(state, df, full=True))
+    emit(type="done", mode="full", reason=reason, acc=acc, samples=len(df), epochs=epoch, **published)
+    return 0
+
+
+def train_incremental(state: dict):
+    """
+    Дообучение активной версии только на сделках, которых модель ещё не видела: скейлер
+    обновляет накопленные среднее/дисперсию (partial_fit), сеть делает несколько эпох
+    partial_fit. Самые свежие VAL_SHARE новых сделок в обучение не идут — на них
+    считается точность обновлённой модели для проверки перед выставлением; в чекпоинт
+    они тоже не попадают и войдут в обучение следующего запуска. Пока новых сделок
+    меньше, чем нужно для валидации, модель не трогаем — ждём, пока накопятся.
+    """
+    import copy
+    from sklearn.exceptions import ConvergenceWarning
+
+    from core import model_registry
+    from train import dataset
+
+    # новые — изменённые после полного переобучения (seq, а не closed_at: сделки, закрытые
+    # внутри бара, получают время бара) и ещё не взятые дообучением
+    df = dataset.feature_training_frame()
+    consumed = set(state.get("consumed", []))
+    df = df[(_seq(df) > state["full_seq"]) & ~df["signal_id"].astype(str).isin(consumed)]
+    df = df[_features(df).notna().all(axis=1)]
+    if df.empty:
+        emit(type="done", mode="incremental", acc=None, samples=0, epochs=0)
+        return 0
+
+    base = model_registry.load(model_registry.current_version())
+    # копии: объект из реестра не меняем, новая версия пишется отдельно
+    model, scaler = copy.deepcopy(base.model), copy.deepcopy(base.scaler)
+    y = _labels(df).values
+    X = _features(df)
+    if list(getattr(scaler, "feature_names_in_", [])) != list(X.columns) \
+            or getattr(model, "n_features_in_", None) != X.shape[1]:
+        return train_full(state, "набор фичей изменился")
+
+    n_val = int(len(df) * VAL_SHARE)
+    if n_val < MIN_VAL:
+        emit(type="done", mode="incremental", acc=None, samples=len(df), epochs=0,
+             promoted=False, gate=f"мало новых сделок для проверки: {len(df)}")
+        return 0
+    n_fit = len(df) - n_val
+    scaler.partial_fit(X[:n_fit])
+    X_scaled = scaler.transform(X)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        for epoch in range(1, INCREMENTAL_EPOCHS + 1):
+            model.partial_fit(X_scaled[:n_fit], y[:n_fit])
+            emit(type="progress", epoch=epoch, loss=round(float(model.loss_), 6))
+
+    acc = float(model.score(X_scaled[n_fit:], y[n_fit:]))
+    published = _publish(model, scaler, {"mode": "incremental", "acc": acc, "samples": len(df),
+                                         "epochs": INCREMENTAL_EPOCHS}, parent=base.version)
+    if published["promoted"]:
+        _save_state(_checkpoint(state, df.iloc[:n_fit], full=False))
+    emit(type="done", mode="incremental", acc=acc, samples=len(df), epochs=INCREMENTAL_EPOCHS, **published)
+    return 0
+
+
+def train(full: bool = False):
+    from db.database import init_db
+    from train import dataset
+
+    init_db()  # своё подключение к БД; схема уже есть, это только проверка версии
+
+    # дописываем свежую историю из БД в колоночный датасет
+    dataset.sync_history()
+
+    state = _load_state()
+    reason = "по запросу" if full else _need_full(state)
+    if reason:
+        return train_full(state, reason)
+    return train_incremental(state)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    apply_limits()
+    try:
+        return train(full="--full" in argv)
+    except MemoryError:
+        emit(type="error", message=f"Не хватило памяти (лимит {MEM_LIMIT_MB} МБ)")
+    except Exception as e:
+        emit(type="error", message=str(e))
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,33 @@
 import pandas as pd
 import os
-import joblib
+import sys
 from sklearn.neural_network import MLPClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 
-# 📥 Загружаем размеченные данные
-data_path = os.path.join(os.path.dirname(__file__), "labeled_market_data.csv")
-df = pd.read_csv(data_path)
-
-# 🎯 Определяем признаки и целевую переменную
-X = df.drop(["label", "symbol"], axis=1)
-y = df["label"]
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from core import model_registry
+from core.features import FEATURE_NAMES, to_matrix
+from core.model_params import mlp_kwargs
+from train import dataset, labeler
+
+# 📥 Загружаем размеченные данные: разметка тройным барьером (train/labeler.py),
+# иначе колоночный датасет, иначе CSV — если ещё не конвертировали
+HORIZON = int(os.getenv("LABEL_HORIZON", str(labeler.DEFAULT_HORIZON)))
+df = labeler.load_labeled(labeler.DEFAULT_INTERVAL, HORIZON)
+if df.empty:
+    df = dataset.read("market").dropna(subset=["label"])
+if df.empty:
+    data_path = os.path.join(os.path.dirname(__file__), "labeled_market_data.csv")
+    df = dataset.market_features(pd.read_csv(data_path))
+
+# 🎯 Признаки — из общего реестра core/features.py (те же, что на инференсе)
+df = df.dropna(subset=FEATURE_NAMES)
+if df.empty:
+    # старый CSV без прогрева индикаторов (EMA200 и т.п.) — фичи не считаются
+    sys.exit("❌ Нет размеченных свечей с полным набором фичей — разметьте историю (python -m train.backfill, затем python -m train.labeler)")
+X = to_matrix(df)
+y = df["label"].astype(int)
 
 # 🔁 Масштабируем данные
 scaler = StandardScaler()
@@ -21,18 +37,18 @@ X_scaled = scaler.fit_transform(X)
 X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
 
 # 🤖 Обучаем нейросеть
-model = MLPClassifier(hidden_layer_sizes=(64, 32), activation='relu', max_iter=500, random_state=42)
+# (гиперпараметры — model/model_params.json от train/model_search.py, иначе прежние (64, 32))
+model = MLPClassifier(**mlp_kwargs(), max_iter=500, random_state=42)
 model.fit(X_train, y_train)
 
 # 📊 Оцениваем точность
 acc = model.score(X_test, y_test)
 print(f"✅ Модель обучена! Точность на тесте: {acc:.2%}")
 
-# 💾 Сохраняем модель и scaler
-model_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "model"))
-os.makedirs(model_dir, exist_ok=True)
-
-joblib.dump(model, os.path.join(model_dir, "signal_model.pkl"))
-joblib.dump(scaler, os.path.join(model_dir, "scaler.pkl"))
-
-print("📁 Модель и scaler сохранены в папку /model")
+# 💾 Новая версия в реестр model/registry; активной станет, если пройдёт проверки
+version = model_registry.register(model, scaler, {"mode": "manual", "acc": float(acc), "samples": len(df)})
+promoted, gate = model_registry.promote(version)
+if promoted:
+    print(f"📁 Версия {version} сохранена и активна")
+else:
+    print(f"🚫 Версия {version} сохранена, но не выставлена: {gate}")
@@ -0,0 +1,369 @@
+# train/walk_forward.py — walk-forward подбор весов скоринга, порога и целей TP/SL
+#
+# Запуск из корня проекта (свечи 1H — train/backfill.py --interval 60):
+#   python -m train.walk_forward --since 2024-01-01 [--until ...] [--symbols BTCUSDT,...]
+#                                [--train-days 180] [--test-days 60] [--samples 400]
+#                                [--min-trades 30] [--workers N] [--save]
+#
+# Подбираются веса WEIGHTS, SCORE_THRESHOLD, порог ADX, окно фибо-свинга и цели
+# pct_tp / pct_sl (core/strategy_params.py). История режется на скользящие окна:
+# параметры выбираются на train-окне (наибольший суммарный PnL при не меньше
+# min-trades сделок), проверяются на следующем test-окне; test-окна идут встык,
+# их сделки склеиваются в out-of-sample результат. Последнее окно — train до конца
+# истории: выбранные на нём параметры и есть рекомендация (--save записывает их).
+#
+# Всё, что не зависит от параметров, считается один раз (train/backtest.py):
+# индикаторы, кандидат направления, слагаемые скоринга, ADX, фибо-оценки для каждого
+# окна из сетки и выходы сделок для каждой пары TP/SL из сетки. Массивы по всем
+# монетам лежат в shared memory и открываются воркерами без копирования — кандидат
+# параметров стоит одного прохода скоринга (матричное умножение + порог + отбор сделок).
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.risk_manager import tp_sl_levels
+from core.signal_generator import fib_scores, score_components
+from core.strategy_params import load_params, save_params
+from train import backtest, candle_store
+
+REPORT_PATH = os.path.join("model", "walk_forward_report.json")
+
+# постоянные слагаемые (0/1 при любых параметрах); adx и fib пересчитываются под кандидата
+FIXED = ["trend", "macd", "rsi", "vwap", "volume", "bb", "mtf"]
+EXIT_KEYS = ("exit_ts", "exit_price", "status")   # [пара TP/SL, бар]
+
+SEARCH = {
+    "weights": {
+        "macd": [5, 10, 15, 20], "adx": [0, 5, 10, 15], "rsi": [0, 5, 10, 15],
+        "vwap": [0, 5, 10, 15], "volume": [0, 5, 10, 15], "bb": [0, 5, 10],
+        "fib": [0, 5, 10, 15], "mtf": [0, 5, 10],
+    },   # trend у кандидата всегда 1 — его вес только сдвигает порог, не трогаем
+    "score_threshold": [65, 70, 75, 80, 85],
+    "adx_min": [14, 18, 22, 26],
+    "fib_lookback": [120, 180, 240],
+    "pct_tp": [0.025, 0.035, 0.05],
+    "pct_sl": [0.01, 0.015, 0.02],
+}
+SAMPLES = 400
+TRAIN_DAYS = 180
+TEST_DAYS = 60
+MIN_TRADES = 30
+
+
+def grids(base: Dict) -> Dict[str, List]:
+    """Сетка поиска + текущие значения (их выходы тоже нужны — текущие параметры идут кандидатом №0)."""
+    return {k: sorted(set(SEARCH[k]) | {base[k]}) for k in ("adx_min", "fib_lookback", "pct_tp", "pct_sl")}
+
+
+# ---------- подготовка (один раз) ----------
+
+def prepare_grid(symbol: str, since_ms: int, until_ms: Optional[int], max_hold: int,
+                 lookbacks: List[int], targets: List[Tuple[float, float]]) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Массивы монеты по барам-кандидатам: слагаемые FIXED, ADX, фибо для каждого окна lookbacks
+    и выходы для каждой пары (pct_tp, pct_sl) из targets.
+    """
+    loaded = backtest.load_indicators(symbol, since_ms, until_ms)
+    if loaded is None:
+        return None
+    ind, in_period, sides, mtf = loaded
+    ts = ind["timestamp"].to_numpy()
+    close = ind["close"].to_numpy()
+    adx = ind["adx"].to_numpy()
+    atr = np.nan_to_num(ind["atr"].to_numpy(), nan=0.0)
+
+    parts = []
+    for side, sign in (("LONG", 1), ("SHORT", -1)):
+        idx = np.flatnonzero(in_period & (sides == side).to_numpy())
+        if not len(idx):
+            continue
+        part = {
+            "ts": ts[idx],
+            "side": np.full(len(idx), sign, dtype=np.int8),
+            "fixed": score_components(ind, side, mtf)[FIXED].to_numpy(dtype=np.float32)[idx],
+            "adx": np.nan_to_num(adx[idx], nan=-1.0).astype(np.float32),   # NaN >= порога — ложь
+            "fib": np.column_stack([fib_scores(ind, side, lb)[idx] for lb in lookbacks]).astype(np.float32),
+            "entry": close[idx],
+        }
+        exit_ts, exit_price, status = [], [], []
+        for pct_tp, pct_sl in targets:
+            tp, sl = tp_sl_levels(close[idx], atr[idx], side, pct_tp, pct_sl)
+            exit_i, st, px = backtest.exits(ind, idx, side, tp, sl, max_hold)
+            exit_ts.append(ts[exit_i])
+            exit_price.append(px)
+            status.append(st)
+        part.update(exit_ts=np.stack(exit_ts), exit_price=np.stack(exit_price), status=np.stack(status))
+        parts.append(part)
+    if not parts:
+        return None
+    order = np.argsort(np.concatenate([p["ts"] for p in parts]), kind="stable")
+    out = {}
+    for key in parts[0]:
+        if key in EXIT_KEYS:
+            out[key] = np.concatenate([p[key] for p in parts], axis=1)[:, order]
+        else:
+            out[key] = np.concatenate([p[key] for p in parts])[order]
+    return out
+
+
+def _prepare(args):
+    return args[0], prepare_grid(*args)
+
+
+def prepare_all(symbols, since_ms, until_ms, max_hold, lookbacks, targets, workers) -> Tuple[Dict, List]:
+    """Массивы всех монет подряд + границы монет [(symbol, start, end)]."""
+    jobs = [(s, since_ms, until_ms, max_hold, lookbacks, targets) for s in symbols]
+    chunks, bounds, pos = [], [], 0
+    with ProcessPoolExecutor(workers) as pool:
+        for symbol, arrays in pool.map(_prepare, jobs, chunksize=4):
+            if arrays is None:
+                continue
+            n = len(arrays["ts"])
+            chunks.append(arrays)
+            bounds.append((symbol, pos, pos + n))
+            pos += n
+    if not chunks:
+        return {}, []
+    data = {}
+    for key in chunks[0]:
+        axis = 1 if key in EXIT_KEYS else 0
+        data[key] = np.concatenate([c[key] for c in chunks], axis=axis)
+    return data, bounds
+
+
+# ---------- shared memory ----------
+
+def _share(data: Dict[str, np.ndarray]):
+    """Скопировать массивы в shared memory. Возвращает блоки (закрыть и удалить в конце) и описание для воркеров."""
+    blocks, spec = [], {}
+    for key, arr in data.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        spec[key] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, spec
+
+
+_DATA: Dict[str, np.ndarray] = {}
+_BLOCKS: List[shared_memory.SharedMemory] = []   # держим открытыми, пока жив воркер
+_CTX: Dict = {}
+
+
+def _init(spec, context):
+    global _DATA
+    _DATA = {}
+    for key, (name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _BLOCKS.append(shm)
+        _DATA[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    _CTX.update(context)
+    try:
+        # параллелимся процессами — BLAS внутри каждого в один поток
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+# ---------- оценка кандидата ----------
+
+def trades(params: Dict, data: Dict[str, np.ndarray], bounds: List,
+           ctx: Dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Время входа, время закрытия и PnL % всех сделок при параметрах params (по времени входа)."""
+    w = params["weights"]
+    score = data["fixed"] @ np.array([w[c] for c in FIXED], dtype=np.float32)
+    score += w["adx"] * (data["adx"] >= params["adx_min"])
+    score += w["fib"] * data["fib"][:, ctx["lookbacks"].index(params["fib_lookback"])]
+    mask = score >= params["score_threshold"]
+    k = ctx["targets"].index((params["pct_tp"], params["pct_sl"]))
+
+    entry_ts, exit_ts, pnl = [], [], []
+    for symbol, s, e in bounds:
+        a = backtest.SymbolArrays(symbol, data["ts"][s:e], data["side"][s:e], None, data["entry"][s:e],
+                                  None, None, data["exit_ts"][k, s:e], data["exit_price"][k, s:e],
+                                  data["status"][k, s:e], None)
+        idx = backtest.take_trades(a, mask[s:e])
+        if len(idx):
+            entry_ts.append(a.ts[idx] + backtest.BAR_MS)
+            exit_ts.append(a.exit_ts[idx] + backtest.BAR_MS)   # исход известен по закрытию бара выхода
+            pnl.append(backtest.trade_pnl(a, idx, ctx["fee"], ctx["slippage"])[1])
+    if not pnl:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    entry_ts, exit_ts, pnl = np.concatenate(entry_ts), np.concatenate(exit_ts), np.concatenate(pnl)
+    order = np.argsort(entry_ts, kind="stable")
+    return entry_ts[order], exit_ts[order], pnl[order]
+
+
+def _evaluate(params: Dict) -> List[Tuple[float, int, np.ndarray]]:
+    """
+    По каждому окну: (цель на train, сделок на train, PnL сделок test).
+    В train — только сделки, закрытые до начала test: вход в конце train с выходом
+    внутри test видел бы цены test-периода.
+    """
+    entry_ts, exit_ts, pnl = trades(params, _DATA, _CTX["bounds"], _CTX)
+    out = []
+    for train_lo, train_hi, test_hi in _CTX["windows"]:
+        tr = pnl[(entry_ts >= train_lo) & (exit_ts <= train_hi)]
+        te = pnl[(entry_ts >= train_hi) & (entry_ts < test_hi)]
+        objective = float(tr.sum()) if len(tr) >= _CTX["min_trades"] else float("-inf")
+        out.append((objective, len(tr), te.astype(np.float32)))
+    return out
+
+
+# ---------- окна и кандидаты ----------
+
+def make_windows(start_ms: int, end_ms: int, train_days: int, test_days: int) -> List[Tuple[int, int, int]]:
+    """(начало train, конец train = начало test, конец test); последнее окно — train до конца истории, без test."""
+    train, test = train_days * backtest.DAY_MS, test_days * backtest.DAY_MS
+    windows, t = [], start_ms
+    while t + train + test <= end_ms:
+        windows.append((t, t + train, t + train + test))
+        t += test
+    windows.append((max(start_ms, end_ms - train), end_ms, end_ms))
+    return windows
+
+
+def sample_params(base: Dict, n: int, seed: int) -> List[Dict]:
+    """Кандидат №0 — текущие параметры, остальные — случайные точки сетки SEARCH (без повторов)."""
+    rng = np.random.default_rng(seed)
+    out, seen = [base], {json.dumps(base, sort_keys=True)}
+    for _ in range(n * 20):
+        if len(out) >= n:
+            break
+        p = {k: SEARCH[k][rng.integers(len(SEARCH[k]))] for k in SEARCH if k != "weights"}
+        p = {k: float(v) if k.startswith("pct") else int(v) for k, v in p.items()}
+        p["weights"] = {"trend": base["weights"]["trend"],
+                        **{c: int(v[rng.integers(len(v))]) for c, v in SEARCH["weights"].items()}}
+        key = json.dumps(p, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            out.append(p)
+    return out
+
+
+# ---------- запуск ----------
+
+def run(since: str, until: Optional[str] = None, symbols: Optional[List[str]] = None,
+        train_days: int = TRAIN_DAYS, test_days: int = TEST_DAYS, samples: int = SAMPLES,
+        min_trades: int = MIN_TRADES, fee: float = backtest.FEE, slippage: float = backtest.SLIPPAGE,
+        max_hold: int = backtest.MAX_HOLD, workers: Optional[int] = None, seed: int = 42,
+        save: bool = False) -> Optional[Dict]:
+    symbols = symbols or candle_store.symbols(backtest.INTERVAL)
+    if not symbols:
+        print(f"❌ Нет свечей {backtest.INTERVAL} — сначала python -m train.backfill --interval {backtest.INTERVAL}")
+        return None
+    workers = workers or os.cpu_count() or 1
+    base = load_params()
+    g = grids(base)
+    lookbacks = g["fib_lookback"]
+    targets = [(tp, sl) for tp in g["pct_tp"] for sl in g["pct_sl"]]
+
+    started = time.monotonic()
+    data, bounds = prepare_all(symbols, backtest._ms(since), backtest._ms(until), max_hold,
+                               lookbacks, targets, workers)
+    if not bounds:
+        print("❌ Мало истории для бэктеста")
+        return None
+    prepared = time.monotonic() - started
+    windows = make_windows(int(data["ts"].min()), int(data["ts"].max()) + backtest.BAR_MS, train_days, test_days)
+    candidates = sample_params(base, samples, seed)
+    size = sum(a.nbytes for a in data.values()) / 2 ** 20
+    print(f"🔎 {len(bounds)} монет, {len(data['ts'])} баров-кандидатов ({size:.0f} МБ, подготовка {prepared:.1f} с); "
+          f"{len(candidates)} кандидатов × {len(windows)} окон, {workers} процессов")
+
+    context = {"bounds": bounds, "windows": windows, "lookbacks": lookbacks, "targets": targets,
+               "fee": fee, "slippage": slippage, "min_trades": min_trades}
+    blocks, spec = _share(data)
+    del data
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init, initargs=(spec, context)) as pool:
+            results = list(pool.map(_evaluate, candidates, chunksize=max(1, len(candidates) // (workers * 4))))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    searched = time.monotonic() - started - prepared
+
+    report_windows, oos, baseline = [], [], []
+    for w, (train_lo, train_hi, test_hi) in enumerate(windows):
+        best = max(range(len(candidates)), key=lambda c: results[c][w][0])
+        objective, n_train, test_pnl = results[best][w]
+        baseline.append(results[0][w][2])
+        oos.append(test_pnl)
+        report_windows.append({
+            "train": [backtest._fmt_ts(train_lo)[:10], backtest._fmt_ts(train_hi)[:10]],
+            "test_period": [backtest._fmt_ts(train_hi)[:10], backtest._fmt_ts(test_hi)[:10]] if test_hi > train_hi else None,
+            "candidate": best, "params": candidates[best],
+            "train_trades": n_train, "train_pnl_pct": round(objective, 2) if np.isfinite(objective) else None,
+            "test": backtest.summary(test_pnl) if test_hi > train_hi else None,
+        })
+        if test_hi > train_hi:
+            print(f"🪟 {report_windows[-1]['train'][0]}…{report_windows[-1]['test_period'][1]}: №{best}, "
+                  f"train {n_train} сд. {objective:+.1f}%, test {backtest.summary(test_pnl)}")
+
+    final = report_windows[-1]
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "since": since, "until": until, "symbols": len(bounds), "candidates": len(candidates),
+        "train_days": train_days, "test_days": test_days, "min_trades": min_trades,
+        "fee": fee, "slippage": slippage, "seconds": round(time.monotonic() - started, 1),
+        "out_of_sample": backtest.summary(np.concatenate(oos)),
+        "out_of_sample_current": backtest.summary(np.concatenate(baseline)),
+        "recommended": final["params"] if final["train_pnl_pct"] is not None else None,
+        "windows": report_windows,
+    }
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n📊 Out-of-sample (подбор по окнам): {report['out_of_sample']}")
+    print(f"📊 Out-of-sample (текущие параметры): {report['out_of_sample_current']}")
+    print(f"⏱ подготовка {prepared:.1f} с, поиск {searched:.1f} с "
+          f"({searched / max(len(candidates), 1) * 1000:.0f} мс на кандидата по всем окнам)")
+    print(f"🏆 Рекомендация (последние {train_days} дн.): {report['recommended']}")
+    print(f"📄 Отчёт: {REPORT_PATH}")
+
+    if save:
+        if report["recommended"] is None:
+            print(f"⚠️ На последнем окне ни один кандидат не набрал {min_trades} сделок — параметры не записаны")
+        else:
+            save_params(report["recommended"], searched_at=report["created_at"],
+                        out_of_sample=report["out_of_sample"])
+            print("💾 Параметры записаны в model/strategy_params.json — generate_signal подхватит их сам")
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Walk-forward подбор весов скоринга, порога и TP/SL")
+    p.add_argument("--since", required=True, help="YYYY-MM-DD (UTC)")
+    p.add_argument("--until", default=None, help="YYYY-MM-DD (UTC), по умолчанию — до конца истории")
+    p.add_argument("--symbols", default="", help="через запятую; по умолчанию — все из хранилища свечей")
+    p.add_argument("--train-days", type=int, default=TRAIN_DAYS)
+    p.add_argument("--test-days", type=int, default=TEST_DAYS)
+    p.add_argument("--samples", type=int, default=SAMPLES, help="сколько наборов параметров проверить")
+    p.add_argument("--min-trades", type=int, default=MIN_TRADES, help="минимум сделок на train-окне")
+    p.add_argument("--fee", type=float, default=backtest.FEE)
+    p.add_argument("--slippage", type=float, default=backtest.SLIPPAGE)
+    p.add_argument("--max-hold", type=int, default=backtest.MAX_HOLD)
+    p.add_argument("--workers", type=int, default=None, help="по умолчанию — все ядра")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--save", action="store_true", help="записать рекомендацию в model/strategy_params.json")
+    args = p.parse_args(argv)
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] or None
+    report = run(args.since, args.until, symbols, args.train_days, args.test_days, args.samples,
+                 args.min_trades, args.fee, args.slippage, args.max_hold, args.workers, args.seed, args.save)
+    return 0 if report else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,11 @@
-import csv
-import os
 from datetime import datetime
 from typing import Dict, Any
 
-SIGNALS_FILE = "signals_log.csv"   # у тебя уже есть — сохраним формат
-TRADES_FILE  = "trades_log.csv"    # новая таблица исходов
+from core.features import FEATURE_VERSION
+from db.log_sink import log_sink
 
+# Поля строк датасета (хранятся в таблицах signals / trades, см. db/history.py;
+# пишутся через буфер db/log_sink)
 FIELDS_SIGNALS = [
     "signal_id","ts","symbol","position","entry","sl","tp",
     "score","confidence","rr_ratio","timeframe","extras"
@@ -15,22 +15,30 @@ FIELDS_TRADES = [
     "result","pnl_pct","rr_real","notes"
 ]
 
-def _ensure(path: str, fields):
-    new = not os.path.exists(path)
-    f = open(path, "a", newline="", encoding="utf-8")
-    if new:
-        csv.DictWriter(f, fieldnames=fields).writeheader()
-    return f
-
 def log_signal_row(row: Dict[str, Any]):
-    f = _ensure(SIGNALS_FILE, FIELDS_SIGNALS)
-    with f:
-        csv.DictWriter(f, fieldnames=FIELDS_SIGNALS).writerow(row)
+    log_sink.write("signals", {k: row.get(k) for k in FIELDS_SIGNALS})
 
 def log_trade_row(row: Dict[str, Any]):
-    f = _ensure(TRADES_FILE, FIELDS_TRADES)
-    with f:
-        csv.DictWriter(f, fieldnames=FIELDS_TRADES).writerow(row)
+    log_sink.write("trades", {
+        "signal_id": row.get("signal_id"),
+        "symbol": row.get("symbol"),
+        "opened_at": row.get("opened_at"),
+        "closed_at": row.get("closed_at"),
+        "closed_price": row.get("close_price"),
+        "status": row.get("notes") or row.get("result"),
+        "pnl_pct": row.get("pnl_pct"),
+        "rr_real": row.get("rr_real"),
+        "notes": row.get("notes"),
+    })
+
+def log_features(signal_id: str, features: Dict[str, float], ts=None):
+    """Фичи модели на момент сигнала — при переобучении берутся отсюда, без пересчёта."""
+    log_sink.write("features", {
+        "signal_id": signal_id,
+        "ts": ts or datetime.utcnow(),
+        "version": FEATURE_VERSION,
+        "features": features,
+    })
 
 def make_signal_id(symbol: str) -> str:
     return f"{symbol}:{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
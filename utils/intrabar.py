@@ -0,0 +1,82 @@
+# utils/intrabar.py — какой уровень (TP или SL) задет первым внутри свечей с прошлой проверки
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+BAR_MS = 60_000  # минутные свечи
+
+# компактная свеча: (start_ms, open, high, low)
+Bar = Tuple[int, float, float, float]
+# (status, trigger_price, trigger_ts_ms)
+Touch = Tuple[str, float, int]
+
+
+def compact_bars(raw: Sequence[Sequence]) -> List[Bar]:
+    """Bybit kline [start, open, high, low, close, ...] -> [(start, open, high, low)] по возрастанию."""
+    bars = [(int(c[0]), float(c[1]), float(c[2]), float(c[3])) for c in raw]
+    bars.sort()
+    return bars
+
+
+def _hits(trade: Dict, high: float, low: float) -> Tuple[bool, bool]:
+    tp, sl = float(trade["tp"]), float(trade["sl"])
+    if trade["position"] == "LONG":
+        return high >= tp, low <= sl
+    return low <= tp, high >= sl
+
+
+def _fill_price(trade: Dict, status: str, open_: float) -> float:
+    """Цена срабатывания: сам уровень, а если свеча открылась уже за ним (гэп) — цена открытия."""
+    level = float(trade["tp"] if status == "TP" else trade["sl"])
+    long_ = trade["position"] == "LONG"
+    if status == "TP":
+        beyond = open_ >= level if long_ else open_ <= level
+    else:
+        beyond = open_ <= level if long_ else open_ >= level
+    return open_ if beyond else level
+
+
+def _resolve_by_ticks(trade: Dict, bar_start: int, ticks: List[Dict], since_ms: int = 0) -> Optional[Touch]:
+    """Идём по тикам ленты внутри этой минуты, начиная с since_ms."""
+    inside = [t for t in ticks if max(bar_start, since_ms) <= t["time"] < bar_start + BAR_MS]
+    if not inside:
+        return None
+    for t in inside:
+        hit_tp, hit_sl = _hits(trade, t["price"], t["price"])
+        if hit_tp:
+            return "TP", t["price"], t["time"]
+        if hit_sl:
+            return "SL", t["price"], t["time"]
+    return None
+
+
+def first_touch(trade: Dict, bars: List[Bar], since_ms: int,
+                get_ticks: Optional[Callable[[], List[Dict]]] = None,
+                opened_ms: Optional[int] = None) -> Optional[Touch]:
+    """
+    Первое касание TP/SL в свечах, заканчивающихся после since_ms.
+    Если в одной свече задеты оба — уточняем по тикам (get_ticks, лениво),
+    а когда лента эту минуту уже не покрывает — считаем, что первым был SL.
+    Минута входа (в ней лежит opened_ms) начинается раньше сделки — её high/low
+    могут быть ценами до входа. По ней верим только тикам после opened_ms; без них
+    свечу пропускаем, касание поймают следующие. Свечу прошлой проверки берём
+    целиком: тогда касаний в ней не было, значит, новое случилось уже после.
+    """
+    for start, open_, high, low in bars:
+        if start + BAR_MS <= since_ms:
+            continue
+        hit_tp, hit_sl = _hits(trade, high, low)
+        if opened_ms is not None and start < opened_ms < start + BAR_MS:
+            if (hit_tp or hit_sl) and get_ticks:
+                touch = _resolve_by_ticks(trade, start, get_ticks(), opened_ms)
+                if touch:
+                    return touch
+            continue
+        if hit_tp and hit_sl:
+            touch = _resolve_by_ticks(trade, start, get_ticks()) if get_ticks else None
+            if touch:
+                return touch
+            return "SL", _fill_price(trade, "SL", open_), start
+        if hit_tp:
+            return "TP", _fill_price(trade, "TP", open_), start
+        if hit_sl:
+            return "SL", _fill_price(trade, "SL", open_), start
+    return None
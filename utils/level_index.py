@@ -0,0 +1,63 @@
+# utils/level_index.py — индекс уровней TP/SL одной монеты (отсортированные массивы + bisect)
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Tuple
+
+# (уровень, signal_id) — signal_id нужен, чтобы уровни-дубли различались и удалялись точно
+_Level = Tuple[float, str]
+
+
+def _discard(arr: List[_Level], item: _Level):
+    i = bisect_left(arr, item)
+    if i < len(arr) and arr[i] == item:
+        del arr[i]
+
+
+class LevelIndex:
+    """
+    Четыре отсортированных массива уровней:
+      LONG  TP срабатывает при price >= tp  -> префикс long_tp  до bisect_right(price)
+      LONG  SL срабатывает при price <= sl  -> суффикс long_sl  от bisect_left(price)
+      SHORT TP срабатывает при price <= tp  -> суффикс short_tp от bisect_left(price)
+      SHORT SL срабатывает при price >= sl  -> префикс short_sl до bisect_right(price)
+    Проверка тика — O(log n + число сработавших) вместо обхода всех сделок.
+    """
+    def __init__(self):
+        self.long_tp: List[_Level] = []
+        self.long_sl: List[_Level] = []
+        self.short_tp: List[_Level] = []
+        self.short_sl: List[_Level] = []
+
+    def _arrays(self, position: str):
+        if position == "LONG":
+            return self.long_tp, self.long_sl
+        return self.short_tp, self.short_sl
+
+    def add(self, trade: Dict):
+        sid = trade["signal_id"]
+        tp_arr, sl_arr = self._arrays(trade["position"])
+        insort(tp_arr, (float(trade["tp"]), sid))
+        insort(sl_arr, (float(trade["sl"]), sid))
+
+    def remove(self, trade: Dict):
+        sid = trade["signal_id"]
+        tp_arr, sl_arr = self._arrays(trade["position"])
+        _discard(tp_arr, (float(trade["tp"]), sid))
+        _discard(sl_arr, (float(trade["sl"]), sid))
+
+    def __len__(self) -> int:
+        return len(self.long_tp) + len(self.short_tp)
+
+    def crossed(self, price: float) -> Dict[str, str]:
+        """signal_id -> 'TP' | 'SL' для всех сделок, чьи уровни задеты ценой. TP в приоритете."""
+        hits: Dict[str, str] = {}
+        # порог (price, "") < (price, любой sid) — bisect по одной цене
+        lo, hi = (price, ""), (price, "\U0010ffff")
+        for _, sid in self.long_tp[:bisect_right(self.long_tp, hi)]:
+            hits[sid] = "TP"
+        for _, sid in self.short_tp[bisect_left(self.short_tp, lo):]:
+            hits[sid] = "TP"
+        for _, sid in self.long_sl[bisect_left(self.long_sl, lo):]:
+            hits.setdefault(sid, "SL")
+        for _, sid in self.short_sl[:bisect_right(self.short_sl, hi)]:
+            hits.setdefault(sid, "SL")
+        return hits
@@ -1,31 +1,23 @@
-import csv
-import os
 from datetime import datetime
 
-LOG_FILE = "signals_log.csv"
+from db.log_sink import log_sink
 
 def log_signal(signal: dict):
-    file_exists = os.path.isfile(LOG_FILE)
-
-    with open(LOG_FILE, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        
-        # Заголовки при первом создании файла
-        if not file_exists:
-            writer.writerow([
-                "datetime", "symbol", "position", "entry", "tp", "sl",
-                "leverage", "risk", "rr_ratio", "quality"
-            ])
-        
-        writer.writerow([
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            signal.get("symbol"),
-            signal.get("position"),
-            signal.get("entry"),
-            signal.get("tp"),
-            signal.get("sl"),
-            signal.get("leverage", ""),
-            signal.get("risk", ""),
-            signal.get("rr_ratio", ""),
-            signal.get("quality", "")
-        ])
+    """Дополняет строку сигнала в таблице signals торговыми полями (плечо, риск, качество)."""
+    row = {
+        "signal_id": signal.get("signal_id"),
+        "symbol": signal.get("symbol"),
+        "position": signal.get("position"),
+        "entry": signal.get("entry"),
+        "tp": signal.get("tp"),
+        "sl": signal.get("sl"),
+        "leverage": signal.get("leverage"),
+        "risk_pct": signal.get("risk_pct", signal.get("risk")),
+        "rr_ratio": signal.get("rr_ratio"),
+        "quality": signal.get("quality"),
+    }
+    if not row["signal_id"]:
+        # сигнал без id (не из auto_signal_job) — заводим свою строку
+        row["signal_id"] = f"{signal.get('symbol')}:{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        row["ts"] = datetime.utcnow()
+    log_sink.write("signals", row)
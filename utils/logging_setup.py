@@ -1,12 +1,112 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+# LOG_FORMAT=json — JSON-строки (по умолчанию), text — старый человекочитаемый формат
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# частые события (на каждую монету) — не больше RATE_BURST штук за RATE_WINDOW сек
+# на одно имя события; сколько выкинули — допишем полем suppressed в следующее
+RATE_BURST = int(os.getenv("LOG_RATE_BURST", "30"))
+RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+
+_STD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись: время, уровень, логгер, сообщение + поля из extra."""
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in record.__dict__.items():
+            if k not in _STD_ATTRS and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает записи с полем `event` (ниже ERROR): не больше `burst` за `window` сек
+    на каждое имя события. Обычные сообщения и ошибки не трогаем.
+    """
+    def __init__(self, burst: int = RATE_BURST, window: float = RATE_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._state = {}  # event -> [window_start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or record.levelno >= logging.ERROR:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            st = self._state.get(event)
+            if st is None or now - st[0] >= self.window:
+                suppressed = st[2] if st else 0
+                st = self._state[event] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if st[1] >= self.burst:
+                st[2] += 1
+                return False
+            st[1] += 1
+            return True
+
+
+def log_event(logger: logging.Logger, event: str, msg: str = "", level: int = logging.INFO, **fields):
+    """Структурное событие: имя + поля, без склейки строк на горячем пути."""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg or event, extra={"event": event, **fields})
+
 
 def setup_logging():
-    # Базовая настройка — показываем всё с INFO и выше
-    logging.basicConfig(
-        level=logging.INFO,  # <--- раньше было WARNING
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        datefmt="%H:%M:%S",
-    )
+    """
+    Корневой логгер пишет только в очередь (QueueHandler) — вызывающий код не ждёт stdout.
+    Форматирование и вывод — в отдельном потоке QueueListener. Повторный вызов ничего не делает.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if LOG_FORMAT == "text":
+        formatter = logging.Formatter(
+            "%(asctime)s | %(levelname)s | %(name)s | %(message)s", datefmt="%H:%M:%S"
+        )
+    else:
+        formatter = JsonFormatter()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    q = queue.SimpleQueue()
+    qh = logging.handlers.QueueHandler(q)
+    qh.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(qh)
+    root.setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
 
     # Наши логи — INFO (чтобы видеть весь процесс)
     for name in ["app", "core", "core.signal_generator"]:
@@ -18,3 +118,11 @@ def setup_logging():
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("pybit").setLevel(logging.WARNING)
+
+
+def stop_logging():
+    """Дописать очередь и остановить поток вывода (при остановке бота)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
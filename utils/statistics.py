@@ -3,19 +3,21 @@ import pandas as pd
 import os
 from datetime import datetime, timedelta
 
-TRADES_FILE  = "trades_log.csv"    # новый формат из trade_tracker
+from db.history import count_trades, iter_trades
+from utils.stats_rollup import stats_rollup
+
 SIGNALS_FILE = "signals_log.csv"   # устаревший (если вдруг есть)
 
 def _load_trades_df() -> pd.DataFrame:
     """
-    Пробуем загрузить trades_log.csv (новый формат).
-    Если его нет — пробуем signals_log.csv (старый формат) и приводим к общему виду.
+    Пробуем загрузить сделки из таблицы trades (новый формат).
+    Если их нет — пробуем signals_log.csv (старый формат) и приводим к общему виду.
     Возвращаем DF с колонками: closed_at (datetime), pnl_pct (float), status (str)
     и дополнительной инфой.
     """
     # 1) Новый формат
-    if os.path.exists(TRADES_FILE):
-        df = pd.read_csv(TRADES_FILE)
+    if count_trades() > 0:
+        df = pd.DataFrame(list(iter_trades()))
         # ожидаемые поля: signal_id,symbol,position,entry,tp,sl,risk_pct,leverage,rr_ratio,
         #                 opened_at,closed_at,status,closed_price,pnl_pct
         # Парсим даты
@@ -62,6 +64,17 @@ def calculate_statistics(period: str = "day") -> dict:
     """
     Статистика по закрытым сделкам за период: day / week / month
     """
+    # Новый формат — берём готовые дневные агрегаты, файл не перечитываем
+    if stats_rollup.available():
+        days = {"day": 1, "week": 7, "month": 30}.get(period, 7)
+        agg = stats_rollup.query(days)
+        return {
+            "signals": agg["count"],
+            "positive": agg["wins"],
+            "negative": agg["losses"],
+            "profit_percent": round(agg["sum_pnl"], 2),
+        }
+
     df = _load_trades_df()
     if df.empty:
         return {"signals": 0, "positive": 0, "negative": 0, "profit_percent": 0.0}
@@ -0,0 +1,186 @@
+# utils/stats_rollup.py — агрегаты по закрытым сделкам (по дням и по монетам)
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, time, timedelta
+from typing import Dict, Optional
+
+from db.history import count_trades, iter_trades, trade_changes
+from db.log_sink import log_sink
+
+ROLLUP_FILE = "stats_rollup.json"
+
+_FIELDS = ("count", "wins", "losses", "sum_pnl", "sum_rr")
+
+
+def _empty() -> Dict:
+    return {"count": 0, "wins": 0, "losses": 0, "sum_pnl": 0.0, "sum_rr": 0.0}
+
+def _add(bucket: Dict, pnl: float, rr: float, k: int = 1):
+    """Добавить (k=1) или вычесть (k=-1) одну сделку из корзины."""
+    bucket["count"] += k
+    bucket["wins"] += k if pnl > 0 else 0
+    bucket["losses"] += k if pnl < 0 else 0
+    bucket["sum_pnl"] += k * pnl
+    bucket["sum_rr"] += k * rr
+
+def _parse_dt(val):
+    """ISO или '%Y-%m-%d %H:%M:%S'."""
+    if not val:
+        return None
+    try:
+        return datetime.fromisoformat(str(val))
+    except Exception:
+        try:
+            return datetime.strptime(str(val), "%Y-%m-%d %H:%M:%S")
+        except Exception:
+            return None
+
+def _safe_float(v, default=0.0):
+    try:
+        return float(v)
+    except Exception:
+        return default
+
+
+class StatsRollup:
+    """
+    Держит по каждому дню (и по каждой монете внутри дня) счётчики:
+    count / wins / losses / sum_pnl / sum_rr.
+    Вклад каждой сделки запомнен по signal_id: перезакрытая или заново
+    импортированная сделка сначала вычитает старый вклад, потом добавляет новый.
+    Новые и изменённые строки берём из trades по seq (db/database._m5_change_seq)
+    после каждой записи; состояние лежит в ROLLUP_FILE вместе с последним seq.
+    Если сделок в БД стало не столько, сколько у нас (удаляли мимо нас), — пересобираем.
+    """
+    def __init__(self, path: str = ROLLUP_FILE):
+        self.path = path
+        self._days: Optional[Dict[str, Dict]] = None
+        self._ids: Dict[str, Optional[list]] = {}   # signal_id -> [день, монета, pnl, rr] | None
+        self._seq = 0
+        self._lock = threading.RLock()
+
+    # ---------- загрузка / сохранение ----------
+
+    def _load(self):
+        if self._days is not None:
+            return
+        data = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                data = None
+        if not (isinstance(data, dict) and "seq" in data and "ids" in data):
+            self.rebuild()   # нет файла или старый формат (по числу сделок)
+            return
+        self._days, self._ids, self._seq = data.get("days", {}), data["ids"], int(data["seq"])
+        changed = self._catch_up()
+        if len(self._ids) != count_trades():
+            self.rebuild()
+        elif changed:
+            self._save()
+
+    def _save(self):
+        data = {"seq": self._seq, "days": self._days, "ids": self._ids}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def rebuild(self):
+        """Полный пересчёт из таблицы trades (только при первом запуске/рассинхроне)."""
+        with self._lock:
+            self._days, self._ids, self._seq = {}, {}, 0
+            self._catch_up()
+            self._save()
+
+    # ---------- обновление ----------
+
+    def _catch_up(self) -> bool:
+        """Применить строки trades, изменившиеся после нашего seq."""
+        rows = trade_changes(self._seq)
+        for row in rows:
+            self._apply(row)
+            self._seq = max(self._seq, int(row["seq"] or 0))
+        return bool(rows)
+
+    def _bump(self, contribution: list, k: int):
+        day_key, symbol, pnl, rr = contribution
+        day = self._days.setdefault(day_key, {**_empty(), "symbols": {}})
+        sym = day["symbols"].setdefault(symbol, _empty())
+        for bucket in (day, sym):
+            _add(bucket, pnl, rr, k)
+
+    def _apply(self, row: Dict):
+        old = self._ids.pop(row["signal_id"], None)
+        if old:
+            self._bump(old, -1)
+        dt = _parse_dt(row.get("closed_at"))
+        new = [dt.date().isoformat(), row.get("symbol", "") or "",
+               _safe_float(row.get("pnl_pct")), _safe_float(row.get("rr_ratio"))] if dt else None
+        self._ids[row["signal_id"]] = new
+        if new:
+            self._bump(new, 1)
+
+    def add_trade(self, row: Dict):
+        """Вызывается после записи сделки в таблицу trades."""
+        self.add_trades([row])
+
+    def add_trades(self, rows):
+        """
+        Хук log_sink: пачка сделок уже закоммичена в trades. Сами строки не
+        применяем — берём из БД всё, что изменилось после нашего seq (в т.ч.
+        слитые с прежней строкой поля и записи мимо буфера).
+        """
+        with self._lock:
+            if self._days is None:
+                self._load()
+            elif self._catch_up():
+                self._save()
+
+    # ---------- запросы ----------
+
+    def available(self) -> bool:
+        """Есть таблица trades — агрегаты верные, даже если сделок ещё нет (тогда нули)."""
+        with self._lock:
+            try:
+                self._load()
+            except sqlite3.OperationalError:
+                return False   # схемы ещё нет — пусть отвечает старый формат
+            return True
+
+    def query(self, days: int, symbol: Optional[str] = None) -> Dict:
+        """
+        Скользящее окно: сделки, закрытые за последние days × 24 ч. Полные дни —
+        из корзин, самый старый (неполный) день — дочитываем из БД по индексу closed_at.
+        """
+        with self._lock:
+            self._load()
+            out = _empty()
+            now = datetime.now()
+            days = max(0, int(days))
+            for i in range(days):
+                day = self._days.get((now.date() - timedelta(days=i)).isoformat())
+                if not day:
+                    continue
+                bucket = day if symbol is None else day["symbols"].get(symbol)
+                if not bucket:
+                    continue
+                for k in _FIELDS:
+                    out[k] += bucket[k]
+            if days:
+                since = now - timedelta(days=days)
+                edge = datetime.combine(since.date() + timedelta(days=1), time())
+                for row in iter_trades(since, edge):
+                    if symbol is None or (row.get("symbol") or "") == symbol:
+                        _add(out, _safe_float(row.get("pnl_pct")), _safe_float(row.get("rr_ratio")))
+            return out
+
+
+# создаём глобальный экземпляр
+stats_rollup = StatsRollup()
+# сделки пишутся через буфер — агрегаты обновляем, когда строки уже в БД
+log_sink.after_write("trades", stats_rollup.add_trades)
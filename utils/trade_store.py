@@ -0,0 +1,192 @@
+# utils/trade_store.py — открытые сделки в памяти + append-only журнал на диске
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.level_index import LevelIndex
+
+SNAPSHOT_FILE = "open_trades.json"      # полный снимок (формат прежний — список сделок)
+JOURNAL_FILE  = "open_trades.journal"   # JSON-lines: {"op": "add"|"remove", ...}
+COMPACT_EVERY = 200                     # после стольких записей в журнал — новый снимок
+
+
+class TradeStore:
+    """
+    Открытые сделки держим в памяти с индексами по signal_id, по symbol
+    и по уровням TP/SL внутри монеты (utils/level_index).
+    Каждая мутация — одна строка в журнале (без перезаписи всего файла);
+    раз в COMPACT_EVERY операций журнал сворачивается в снимок.
+    При старте: снимок + проигрывание журнала.
+    """
+    def __init__(self, snapshot: str = SNAPSHOT_FILE, journal: str = JOURNAL_FILE,
+                 compact_every: int = COMPACT_EVERY):
+        self.snapshot = snapshot
+        self.journal = journal
+        self.compact_every = compact_every
+        self._by_id: Optional[Dict[str, Dict]] = None
+        self._by_symbol: Dict[str, Dict[str, Dict]] = {}
+        self._levels: Dict[str, LevelIndex] = {}
+        self._journal_ops = 0
+        self._lock = threading.RLock()
+
+    # ---------- индексы ----------
+
+    def _index_add(self, trade: Dict):
+        sid = trade["signal_id"]
+        self._index_remove(sid)
+        self._by_id[sid] = trade
+        self._by_symbol.setdefault(trade.get("symbol", ""), {})[sid] = trade
+        try:
+            self._levels.setdefault(trade.get("symbol", ""), LevelIndex()).add(trade)
+        except (KeyError, TypeError, ValueError):
+            pass  # битые уровни — сделка просто не попадёт в проверку TP/SL
+
+    def _index_remove(self, sid: str) -> Optional[Dict]:
+        trade = self._by_id.pop(sid, None)
+        if trade is not None:
+            bucket = self._by_symbol.get(trade.get("symbol", ""))
+            if bucket is not None:
+                bucket.pop(sid, None)
+                if not bucket:
+                    self._by_symbol.pop(trade.get("symbol", ""), None)
+            levels = self._levels.get(trade.get("symbol", ""))
+            if levels is not None:
+                try:
+                    levels.remove(trade)
+                except (KeyError, TypeError, ValueError):
+                    pass
+                if not levels:
+                    self._levels.pop(trade.get("symbol", ""), None)
+        return trade
+
+    # ---------- загрузка ----------
+
+    def _read_snapshot(self) -> List[Dict]:
+        if not os.path.exists(self.snapshot):
+            return []
+        try:
+            with open(self.snapshot, "r", encoding="utf-8") as f:
+                txt = f.read().strip()
+            data = json.loads(txt) if txt else []
+        except Exception:
+            return []
+        if isinstance(data, dict):
+            # старый формат {sid: trade}
+            return list(data.values())
+        return data if isinstance(data, list) else []
+
+    def _replay_journal(self) -> int:
+        if not os.path.exists(self.journal):
+            return 0
+        n = 0
+        with open(self.journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    # недописанная последняя строка после падения — пропускаем
+                    continue
+                if rec.get("op") == "add" and isinstance(rec.get("trade"), dict):
+                    self._index_add(rec["trade"])
+                elif rec.get("op") == "remove":
+                    self._index_remove(rec.get("signal_id"))
+                n += 1
+        return n
+
+    def _ensure_loaded(self):
+        if self._by_id is not None:
+            return
+        self._by_id = {}
+        self._by_symbol = {}
+        self._levels = {}
+        for t in self._read_snapshot():
+            if isinstance(t, dict) and t.get("signal_id"):
+                self._index_add(t)
+        self._journal_ops = self._replay_journal()
+
+    # ---------- запись ----------
+
+    def _append(self, rec: Dict):
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._journal_ops += 1
+        if self._journal_ops >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Снимок всех открытых сделок атомарно, затем обнуляем журнал."""
+        with self._lock:
+            self._ensure_loaded()
+            tmp = self.snapshot + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(list(self._by_id.values()), f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.snapshot)
+            open(self.journal, "w", encoding="utf-8").close()
+            self._journal_ops = 0
+
+    # ---------- public api ----------
+
+    def add(self, trade: Dict):
+        with self._lock:
+            self._ensure_loaded()
+            self._index_add(trade)
+            self._append({"op": "add", "trade": trade})
+
+    def remove(self, signal_id: str) -> Optional[Dict]:
+        """Убирает сделку и возвращает её (None — не было такой)."""
+        with self._lock:
+            self._ensure_loaded()
+            trade = self._index_remove(signal_id)
+            if trade is not None:
+                self._append({"op": "remove", "signal_id": signal_id})
+            return trade
+
+    def get(self, signal_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_id.get(signal_id)
+
+    def by_symbol(self, symbol: str) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_symbol.get(symbol, {}).values())
+
+    def crossed(self, symbol: str, price: float) -> List[Tuple[Dict, str]]:
+        """Сделки монеты, чьи TP/SL задеты ценой: [(trade, 'TP'|'SL'), ...]."""
+        with self._lock:
+            self._ensure_loaded()
+            levels = self._levels.get(symbol)
+            if levels is None:
+                return []
+            return [(self._by_id[sid], status) for sid, status in levels.crossed(price).items()
+                    if sid in self._by_id]
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_symbol)
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_id.values())
+
+    def replace_all(self, trades: List[Dict]):
+        with self._lock:
+            self._by_id = {}
+            self._by_symbol = {}
+            self._levels = {}
+            for t in trades:
+                if isinstance(t, dict) and t.get("signal_id"):
+                    self._index_add(t)
+            self.compact()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._by_id)
+
+
+# создаём глобальный экземпляр
+trade_store = TradeStore()
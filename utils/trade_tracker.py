@@ -1,46 +1,28 @@
 # utils/trade_tracker.py
-import json
-import os
+import logging
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional
 
-OPEN_TRADES_FILE = "open_trades.json"
-TRADES_LOG_FILE  = "trades_log.csv"
+from db.log_sink import log_sink
+from utils.intrabar import BAR_MS, compact_bars, first_touch
+import utils.stats_rollup  # noqa: F401 — подписывает агрегаты на запись сделок
+from utils.logging_setup import log_event
+from utils.trade_store import trade_store, SNAPSHOT_FILE as OPEN_TRADES_FILE
 
-
-# ---------- low-level io ----------
-
-def _read_json(path: str):
-    if not os.path.exists(path):
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            txt = f.read().strip()
-            if not txt:
-                return None
-            return json.loads(txt)
-    except Exception:
-        return None
-
-def _write_json(path: str, data) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+logger = logging.getLogger("app.trades")
 
 
 # ---------- open trades store ----------
+# Сами сделки живут в utils/trade_store: память + журнал, open_trades.json — снимок.
 
 def load_open_trades() -> List[Dict]:
     """Возвращает список открытых сделок. Гарантирует список."""
-    data = _read_json(OPEN_TRADES_FILE)
-    if isinstance(data, list):
-        return data
-    if isinstance(data, dict):
-        # на всякий случай поддержим старый формат, но лучше очистить файл
-        return list(data.values())
-    return []
+    return trade_store.all()
 
 def save_open_trades(trades: List[Dict]) -> None:
-    _write_json(OPEN_TRADES_FILE, trades)
+    """Полная замена набора открытых сделок (сразу пишет снимок)."""
+    trade_store.replace_all(trades)
 
 
 # ---------- helpers ----------
@@ -66,7 +48,6 @@ def add_open_trade(signal: Dict) -> None:
     Требует уникальный signal_id (мы его проставляем в bot.py).
     Если по этому signal_id уже существует — заменяем (защита от дублей).
     """
-    trades = load_open_trades()
     sid = _ensure_signal_id(signal)
 
     # Собираем компактную запись
@@ -83,37 +64,19 @@ def add_open_trade(signal: Dict) -> None:
         "opened_at": _now_str(),
     }
 
-    # Уберём любой старый элемент с тем же signal_id
-    trades = [t for t in trades if t.get("signal_id") != sid]
-    trades.append(item)
-    save_open_trades(trades)
+    # старый элемент с тем же signal_id заменяется
+    trade_store.add(item)
 
 def get_open_trade(signal_id: str) -> Optional[Dict]:
-    for t in load_open_trades():
-        if t.get("signal_id") == signal_id:
-            return t
-    return None
+    return trade_store.get(signal_id)
 
 def remove_open_trade(signal_id: str) -> None:
-    trades = load_open_trades()
-    trades = [t for t in trades if t.get("signal_id") != signal_id]
-    save_open_trades(trades)
+    trade_store.remove(signal_id)
 
 
 def _append_trade_log(row: Dict) -> None:
-    """Пишем факт закрытия в trades_log.csv (с заголовком при первом запуске)."""
-    header_needed = not os.path.exists(TRADES_LOG_FILE)
-    with open(TRADES_LOG_FILE, "a", encoding="utf-8") as f:
-        if header_needed:
-            f.write(
-                "signal_id,symbol,position,entry,tp,sl,risk_pct,leverage,rr_ratio,opened_at,"
-                "closed_at,status,closed_price,pnl_pct\n"
-            )
-        f.write(
-            f"{row['signal_id']},{row['symbol']},{row['position']},{row['entry']},{row['tp']},{row['sl']},"
-            f"{row['risk_pct']},{row['leverage']},{row['rr_ratio']},{row['opened_at']},"
-            f"{row['closed_at']},{row['status']},{row['closed_price']},{row['pnl_pct']}\n"
-        )
+    """Ставим факт закрытия в очередь записи в таблицу trades (агрегаты обновятся после коммита)."""
+    log_sink.write("trades", row)
 
 
 def _pnl_percent(position: str, entry: float, price: float) -> float:
@@ -128,18 +91,18 @@ def _pnl_percent(position: str, entry: float, price: float) -> float:
         return (entry / price - 1.0) * 100.0
 
 
-def close_trade(signal_id, status, closed_price) -> Optional[Dict]:
+def close_trade(signal_id, status, closed_price, closed_at: Optional[datetime] = None,
+                notes: Optional[str] = None) -> Optional[Dict]:
     """
     Закрывает сделку по signal_id.
     status: 'TP' | 'SL' | 'MANUAL'
+    closed_at: время срабатывания (по умолчанию — сейчас)
     Возвращает строку-лог (dict) или None, если не нашли сделку.
     """
-    trade = get_open_trade(signal_id)
+    trade = trade_store.remove(signal_id)
     if not trade:
         return None
 
-    remove_open_trade(signal_id)
-
     pnl_pct = round(_pnl_percent(trade["position"], trade["entry"], float(closed_price)), 4)
 
     row = {
@@ -153,10 +116,11 @@ def close_trade(signal_id, status, closed_price) -> Optional[Dict]:
         "leverage": trade["leverage"],
         "rr_ratio": trade["rr_ratio"],
         "opened_at": trade["opened_at"],
-        "closed_at": _now_str(),
+        "closed_at": closed_at.strftime("%Y-%m-%d %H:%M:%S") if closed_at else _now_str(),
         "status": status,                  # TP/SL/MANUAL
         "closed_price": float(closed_price),
         "pnl_pct": pnl_pct,
+        "notes": notes,
     }
     _append_trade_log(row)
     return row
@@ -165,46 +129,92 @@ def close_trade(signal_id, status, closed_price) -> Optional[Dict]:
 def check_open_trades(get_price_func) -> None:
     """
     Проверяем открытые сделки на TP/SL и закрываем по signal_id.
-    get_price_func(symbol) -> float
+    get_price_func(symbol) -> float — вызывается один раз на монету.
     """
-    trades = load_open_trades()
-    if not trades:
-        return
-
-    still_open: List[Dict] = []
-    for t in trades:
+    for symbol in trade_store.symbols():
         try:
-            symbol   = t["symbol"]
-            side     = t["position"]
-            entry    = float(t["entry"])
-            tp       = float(t["tp"])
-            sl       = float(t["sl"])
-            sid      = t["signal_id"]
-
             price = float(get_price_func(symbol) or 0.0)
-            if price <= 0:
-                # если котировки нет — оставим открытую
-                still_open.append(t)
-                continue
-
-            hit_tp = (price >= tp) if side == "LONG" else (price <= tp)
-            hit_sl = (price <= sl) if side == "LONG" else (price >= sl)
-
-            if hit_tp:
-                row = close_trade(sid, status="TP", closed_price=price)
-                print(f"✅ TP достигнут по {symbol} (signal_id={sid}, price={price})")
-                continue
-            if hit_sl:
-                row = close_trade(sid, status="SL", closed_price=price)
-                print(f"❌ SL сработал по {symbol} (signal_id={sid}, price={price})")
-                continue
-
-            # иначе оставляем открытую
-            still_open.append(t)
-
         except Exception as e:
-            # на всякий случай не теряем сделку при ошибке
-            print(f"⚠️ check_open_trades error on {t}: {e}")
-            still_open.append(t)
+            log_event(logger, "trades.no_price", level=logging.WARNING, symbol=symbol, error=str(e))
+            continue
+        if price <= 0:
+            # если котировки нет — оставим открытые
+            continue
+
+        # индекс уровней отдаёт только задетые сделки
+        for t, status in trade_store.crossed(symbol, price):
+            sid = t["signal_id"]
+            try:
+                close_trade(sid, status=status, closed_price=price)
+                log_event(logger, "trades.closed", symbol=symbol, signal_id=sid, status=status, price=price)
+            except Exception as e:
+                # на всякий случай не теряем сделку при ошибке
+                logger.error("check_open_trades error", extra={"event": "trades.error", "signal_id": sid, "error": str(e)})
 
-    save_open_trades(still_open)
+
+# ---------- intrabar ----------
+
+# symbol -> момент последней проверки (ms). В памяти: после рестарта начнём
+# с открытия самой старой сделки монеты — лишний раз, но ничего не пропустим.
+_last_check_ms: Dict[str, int] = {}
+
+
+def _opened_ms(trade: Dict) -> int:
+    try:
+        return int(datetime.strptime(trade["opened_at"], "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+    except Exception:
+        return int(time.time() * 1000) - BAR_MS
+
+
+def check_open_trades_intrabar(get_candles_func, get_ticks_func=None) -> None:
+    """
+    Проверка TP/SL по high/low минутных свечей с прошлой проверки, одним запросом на монету.
+    get_candles_func(symbol, start_ms) -> Bybit kline [[start, open, high, low, close, ...], ...]
+    get_ticks_func(symbol) -> [{"time": ms, "price": float}, ...] — только если в одной
+    свече задеты и TP, и SL.
+    Закрываем по цене и времени фактического срабатывания.
+    """
+    for symbol in trade_store.symbols():
+        trades = trade_store.by_symbol(symbol)
+        if not trades:
+            continue
+        now_ms = int(time.time() * 1000)
+        last = _last_check_ms.get(symbol, 0)
+        since = {t["signal_id"]: max(_opened_ms(t), last) for t in trades}
+        start = min(since.values()) // BAR_MS * BAR_MS
+        try:
+            bars = compact_bars(get_candles_func(symbol, start))
+        except Exception as e:
+            log_event(logger, "trades.no_candles", level=logging.WARNING, symbol=symbol, error=str(e))
+            continue
+        if not bars:
+            continue
+
+        ticks_cache: Dict[str, List[Dict]] = {}
+
+        def get_ticks():
+            if get_ticks_func is None:
+                return []
+            if "ticks" not in ticks_cache:
+                try:
+                    ticks_cache["ticks"] = get_ticks_func(symbol)
+                except Exception:
+                    ticks_cache["ticks"] = []
+            return ticks_cache["ticks"]
+
+        for t in trades:
+            sid = t["signal_id"]
+            try:
+                touch = first_touch(t, bars, since[sid], get_ticks, _opened_ms(t))
+                if not touch:
+                    continue
+                status, price, ts_ms = touch
+                close_trade(sid, status=status, closed_price=price,
+                            closed_at=datetime.fromtimestamp(ts_ms / 1000), notes="intrabar")
+                log_event(logger, "trades.closed", symbol=symbol, signal_id=sid, status=status,
+                          price=price, at_ms=ts_ms, mode="intrabar")
+            except Exception as e:
+                # на всякий случай не теряем сделку при ошибке
+                logger.error("check_open_trades error", extra={"event": "trades.error", "signal_id": sid, "error": str(e)})
+
+        _last_check_ms[symbol] = now_ms